@@ -15,4 +15,6 @@ from .async_pool_executor import AsyncPoolExecutor
 from .bounded_threadpoolexcutor import BoundedThreadPoolExecutor
 from .custom_threadpool_executor import CustomThreadPoolExecutor
 from .flexible_thread_pool import FlexibleThreadPool
+from .hybrid_process_pool import HybridProcessPool
+from .multi_loop_async_pool_executor import MultiLoopAsyncPoolExecutor
 from .pool_commons import ConcurrentPoolBuilder
\ No newline at end of file
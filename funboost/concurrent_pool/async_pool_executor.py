@@ -2,9 +2,12 @@ import sys
 
 import atexit
 import asyncio
+import queue
 import threading
 import time
 import traceback
+import typing
+from collections import deque
 from threading import Thread
 
 from funboost.concurrent_pool.base_pool_type import FunboostBaseConcurrentPool
@@ -51,6 +54,12 @@ if sys.platform == "darwin":  # mac 上会出错
 class AsyncPoolExecutorLtPy310(FunboostFileLoggerMixin,FunboostBaseConcurrentPool):
     """
     使api和线程池一样，最好的性能做法是submit也弄成 async def，生产和消费在同一个线程同一个loop一起运行，但会对调用链路的兼容性产生破坏，从而调用方式不兼容线程池。
+
+    现在两种提交方式都有:
+    别的线程调用 submit ，任务先放入线程安全的 deque ，一批任务只需要一次 call_soon_threadsafe 唤醒loop把它们转移到 asyncio.Queue ，
+    不再是每条任务一次 run_coroutine_threadsafe 并等待 future 结果的跨线程往返。
+    在本池的loop里面运行的代码(例如消费者的 _async_shedual_task)使用 await asubmit ，池满时候只是await，不阻塞loop。
+    两种方式共用一个C实现的 queue.SimpleQueue 作为容量令牌，池中排队的任务最多 size 个，满了 submit 阻塞，和以前一样。
     """
 
     def __init__(self, size, loop=None):
@@ -62,7 +71,8 @@ class AsyncPoolExecutorLtPy310(FunboostFileLoggerMixin,FunboostBaseConcurrentPoo
         self._size = size
         self.loop = loop or asyncio.new_event_loop()
         self._sem = asyncio.Semaphore(self._size, loop=self.loop)
-        self._queue = asyncio.Queue(maxsize=size, loop=self.loop)
+        self._queue = asyncio.Queue(loop=self.loop)
+        self._init_handoff()
         self._lock = threading.Lock()
         t = Thread(target=self._start_loop_in_new_thread, daemon=True)
         # t.setDaemon(True)  # 设置守护线程是为了有机会触发atexit，使程序自动结束，不用手动调用shutdown
@@ -84,16 +94,70 @@ class AsyncPoolExecutorLtPy310(FunboostFileLoggerMixin,FunboostBaseConcurrentPoo
                 else:
                     time.sleep(0.01)
 
-    def submit(self, func, *args, **kwargs):
-        future = asyncio.run_coroutine_threadsafe(self._produce(func, *args, **kwargs), self.loop)  # 这个 run_coroutine_threadsafe 方法也有缺点，消耗的性能巨大。
-        future.result()  # 阻止过快放入，放入超过队列大小后，使submit阻塞。
+    def _init_handoff(self):
+        self._free_slots = queue.SimpleQueue()
+        for _ in range(self._size):
+            self._free_slots.put(None)
+        self._pending_tasks = deque()  # 别的线程submit的任务，等待loop批量转移到 self._queue
+        self._is_drain_scheduled = False
+        self._slot_released_event = None  # type: typing.Optional[asyncio.Event]
+        self._asubmit_waiter_num = 0
 
-    async def _produce(self, func, *args, **kwargs):
-        await self._queue.put((func, args, kwargs))
+    def submit(self, func, *args, **kwargs):
+        """在别的线程中调用，不能在本池的loop中调用，loop中使用 await asubmit"""
+        self._free_slots.get()  # 阻止过快放入，放入超过队列大小后，使submit阻塞。
+        self._handoff((func, args, kwargs))
+
+    def submit_nowait(self, func, args: tuple = (), kwargs: dict = None) -> bool:
+        """池满了不等待，返回False。多个池之间选择一个不满的池时候使用。任何线程都可以调用。"""
+        try:
+            self._free_slots.get_nowait()
+        except queue.Empty:
+            return False
+        self._handoff((func, args, kwargs or {}))
+        return True
+
+    def _handoff(self, task: tuple):
+        self._pending_tasks.append(task)
+        if not self._is_drain_scheduled:
+            self._is_drain_scheduled = True
+            self.loop.call_soon_threadsafe(self._drain_pending_tasks)
+
+    def submit_many(self, func, args_list: typing.Iterable[tuple]):
+        """批量提交同一个函数的多组入参，不需要每条任务唤醒一次loop。"""
+        for args in args_list:
+            self.submit(func, *args)
+
+    def _drain_pending_tasks(self):
+        # 先清除标志再转移，转移期间新放入的任务要么在这次被转移，要么submit会重新唤醒loop。
+        self._is_drain_scheduled = False
+        pending_tasks = self._pending_tasks
+        while pending_tasks:
+            self._queue.put_nowait(pending_tasks.popleft())
+
+    async def asubmit(self, func, *args, **kwargs):
+        """在本池的loop中提交任务，池满时候 await 等待有任务开始运行，不阻塞loop。"""
+        while True:
+            try:
+                self._free_slots.get_nowait()
+                break
+            except queue.Empty:
+                if self._slot_released_event is None:
+                    self._slot_released_event = asyncio.Event()
+                self._slot_released_event.clear()
+                self._asubmit_waiter_num += 1
+                try:
+                    await self._slot_released_event.wait()
+                finally:
+                    self._asubmit_waiter_num -= 1
+        self._queue.put_nowait((func, args, kwargs))
 
     async def _consume(self):
         while True:
             func, args, kwargs = await self._queue.get()
+            self._free_slots.put(None)
+            if self._asubmit_waiter_num:
+                self._slot_released_event.set()
             if isinstance(func, str) and func.startswith('stop'):
                 # self.logger.debug(func)
                 break
@@ -139,7 +203,8 @@ class AsyncPoolExecutorGtPy310(AsyncPoolExecutorLtPy310):
         self._size = size
         self.loop = loop or asyncio.new_event_loop()
         self._sem = asyncio.Semaphore(self._size, )
-        self._queue = asyncio.Queue(maxsize=size, )
+        self._queue = asyncio.Queue()
+        self._init_handoff()
         self._lock = threading.Lock()
         t = Thread(target=self._start_loop_in_new_thread, daemon=True)
         # t.setDaemon(True)  # 设置守护线程是为了有机会触发atexit，使程序自动结束，不用手动调用shutdown
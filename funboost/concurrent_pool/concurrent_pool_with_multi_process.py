@@ -1,55 +1,37 @@
 import time
-import multiprocessing
-import threading
 import asyncio
-from funboost.core.loggers import FunboostFileLoggerMixin
-import atexit
 import os
-import typing
-from funboost.concurrent_pool.custom_threadpool_executor import CustomThreadpoolExecutor
 
 from funboost.concurrent_pool.async_pool_executor import AsyncPoolExecutor
+from funboost.concurrent_pool.flexible_thread_pool import FlexibleThreadPool
+from funboost.concurrent_pool.hybrid_process_pool import HybridProcessPool
 
 
-class ConcurrentPoolWithProcess(FunboostFileLoggerMixin):
-    def _start_a_pool(self, pool_class, max_works):
-        pool = pool_class(max_works)
-        while True:
-            func, args, kwargs = self._multi_process_queue.get()  # 结束可以放None，然后这里判断，终止。或者joinable queue
-            print(func, args, kwargs)
-            pool.submit(func, *args, **kwargs)
+class ConcurrentPoolWithProcess(HybridProcessPool):
+    """
+    以前这里是一个所有进程共用一个 multiprocessing.Queue 并且不返回结果的演示，现在是 HybridProcessPool ，保留原来的类名和入参顺序。
+    """
 
-    def __init__(self, pool_class: typing.Type = CustomThreadpoolExecutor, max_works=500, process_num=1):
-        self._multi_process_queue = multiprocessing.Queue(100)
-        for _ in range(process_num):
-            multiprocessing.Process(target=self._start_a_pool, args=(pool_class, max_works), daemon=False).start()
-
-    # noinspection PyUnusedLocal
-    def _queue_call_back(self, result):
-        self._multi_process_queue.task_done()
-
-    def submit(self, func, *args, **kwargs):
-        self._multi_process_queue.put((func, args, kwargs))
-
-    def shutdown(self, wait=True):
-        pass
+    def __init__(self, pool_class=FlexibleThreadPool, max_works=500, process_num=1):
+        super().__init__(max_workers=max_works, process_num=process_num, pool_class=pool_class)
 
 
 def test_f(x):
     time.sleep(1)
     print(x * 10, os.getpid())
+    return x * 10
 
 
 async def async_f(x):
     await asyncio.sleep(1)
-    print(x * 10)
+    print(x * 10, os.getpid())
+    return x * 10
 
 
 if __name__ == '__main__':
     pool = ConcurrentPoolWithProcess(AsyncPoolExecutor, 20, 2)
-    # pool = GeventPoolExecutor(200,)
+    # pool = ConcurrentPoolWithProcess(FlexibleThreadPool, 20, 2)
 
-    # time.sleep(15)
-    for i in range(1000):
-        time.sleep(0.1)
-        pool.submit(async_f, i)
+    futures = [pool.submit(async_f, i) for i in range(1000)]
+    print(sum(f.result() for f in futures))
+    pool.shutdown()
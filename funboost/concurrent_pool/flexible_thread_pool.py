@@ -13,6 +13,8 @@ import inspect
 import os
 import queue
 import threading
+import typing
+from collections import deque
 from functools import wraps
 
 from funboost.concurrent_pool import FunboostBaseConcurrentPool
@@ -20,34 +22,60 @@ from funboost.core.loggers import FunboostFileLoggerMixin, LoggerLevelSetterMixi
 
 
 class FlexibleThreadPool(FunboostFileLoggerMixin, LoggerLevelSetterMixin, FunboostBaseConcurrentPool):
+    """
+    每条任务的提交和运行都不加锁:
+    任务队列是C实现的 queue.SimpleQueue ，再用另一个预先放入 work_queue_maxsize 个令牌的 SimpleQueue 当作信号量，限制任务队列大小，队列满了submit阻塞。
+    空闲线程数量是 _idle_thread_tokens 的长度，deque 的 append 和 pop 在GIL下是原子操作。
+    只有队列中等待的任务比空闲线程多时候才加锁判断开新线程，只有线程空闲超时时候才加锁判断线程是否结束。
+    """
     KEEP_ALIVE_TIME = 10
     MIN_WORKERS = 2
 
-    def __init__(self, max_workers: int = None,work_queue_maxsize=10):
-        self.work_queue = queue.Queue(work_queue_maxsize)
+    def __init__(self, max_workers: int = None, work_queue_maxsize=10):
+        self.work_queue = queue.SimpleQueue()
+        self._work_queue_free_slots = queue.SimpleQueue()
+        for _ in range(work_queue_maxsize):
+            self._work_queue_free_slots.put(None)
         self.max_workers = max_workers
         self._threads_num = 0
-        self.threads_free_count = 0
-        self._lock_compute_start_thread = threading.Lock()
-        self._lock_compute_threads_free_count = threading.Lock()
+        self._idle_thread_tokens = deque()
         self._lock_for_adjust_thread = threading.Lock()
-        self._lock_for_judge_threads_free_count = threading.Lock()
         self.pool_ident = id(self)
         # self.asyncio_loop = asyncio.new_event_loop()
 
-    def _change_threads_free_count(self, change_num):
-        with self._lock_compute_threads_free_count:
-            self.threads_free_count += change_num
+    @property
+    def threads_free_count(self):
+        return len(self._idle_thread_tokens)
 
-    def _change_threads_start_count(self, change_num):
-        with self._lock_compute_start_thread:
-            self._threads_num += change_num
+    def _adjust_thread(self):
+        if len(self._idle_thread_tokens) < self.work_queue.qsize() and self._threads_num < self.max_workers:
+            with self._lock_for_adjust_thread:
+                if self._threads_num < self.max_workers:
+                    self._threads_num += 1
+                    _KeepAliveTimeThread(self).start()
 
-    def submit(self, func, *args, **kwargs):
-        self.work_queue.put([func, args, kwargs])
+    def _judge_idle_thread_should_stop(self) -> bool:
+        """线程空闲超时后调用，调用前这个线程已经不算在空闲线程中了"""
         with self._lock_for_adjust_thread:
-            if self.threads_free_count <= self.MIN_WORKERS and self._threads_num < self.max_workers:
-                _KeepAliveTimeThread(self).start()
+            # 先减少空闲线程再检查队列，和submit的先放入任务再检查空闲线程顺序相反，不会出现任务放入了但是没有线程运行。
+            if len(self._idle_thread_tokens) >= self.MIN_WORKERS and self.work_queue.empty():
+                self._threads_num -= 1
+                return True
+            return False
+
+    def submit(self, func, *args, **kwargs):
+        self._work_queue_free_slots.get()
+        self.work_queue.put((func, args, kwargs))
+        self._adjust_thread()
+
+    def submit_many(self, func, args_list: typing.Iterable[tuple]):
+        """批量提交同一个函数的多组入参，args_list 的每个元素是一组位置参数元组。"""
+        work_queue = self.work_queue
+        work_queue_free_slots = self._work_queue_free_slots
+        for args in args_list:
+            work_queue_free_slots.get()
+            work_queue.put((func, args, {}))
+            self._adjust_thread()
 
 
 class FlexibleThreadPoolMinWorkers0(FlexibleThreadPool):
@@ -76,15 +104,28 @@ def _get_thread_local_loop() -> asyncio.AbstractEventLoop:
     return tl.asyncio_loop
 
 
+_func__is_coroutine_function_map = {}
+
+
+def is_coroutine_function_cached(func) -> bool:
+    """inspect.iscoroutinefunction 比较慢，按函数缓存结果，绑定方法按 __func__ 缓存。"""
+    key = getattr(func, '__func__', func)
+    try:
+        return _func__is_coroutine_function_map[key]
+    except KeyError:
+        pass
+    except TypeError:  # 不能hash的可调用对象
+        return inspect.iscoroutinefunction(func)
+    result = inspect.iscoroutinefunction(func)
+    if len(_func__is_coroutine_function_map) > 10000:  # 防止每次都是新生成的闭包或者partial对象时候缓存一直增长
+        _func__is_coroutine_function_map.clear()
+    _func__is_coroutine_function_map[key] = result
+    return result
+
+
 def run_sync_or_async_fun(func, *args, **kwargs):
-    fun_is_asyncio = inspect.iscoroutinefunction(func)
-    if fun_is_asyncio:
-        loop = _get_thread_local_loop()
-        try:
-            return loop.run_until_complete(func(*args, **kwargs))
-        finally:
-            pass
-            # loop.close()
+    if is_coroutine_function_cached(func):
+        return _get_thread_local_loop().run_until_complete(func(*args, **kwargs))
     else:
         return func(*args, **kwargs)
 
@@ -106,32 +147,31 @@ class _KeepAliveTimeThread(threading.Thread, metaclass=FunboostMetaTypeFileLogge
     def run(self) -> None:
         # 可以设置 LogManager('_KeepAliveTimeThread').preset_log_level(logging.INFO) 来屏蔽下面的话,见文档6.17.b
         self.logger.debug(f'新启动线程 {self.ident} ')
-        self.pool._change_threads_free_count(1)
-        self.pool._change_threads_start_count(1)
+        pool = self.pool
+        work_queue = pool.work_queue
+        work_queue_free_slots = pool._work_queue_free_slots
+        idle_thread_tokens = pool._idle_thread_tokens
         while 1:
+            idle_thread_tokens.append(None)
             try:
-                func, args, kwargs = self.pool.work_queue.get(block=True, timeout=self.pool.KEEP_ALIVE_TIME)
+                func, args, kwargs = work_queue.get(block=True, timeout=pool.KEEP_ALIVE_TIME)
             except queue.Empty:
-                with self.pool._lock_for_judge_threads_free_count:
-                    # print(self.pool.threads_free_count)
-                    if self.pool.threads_free_count > self.pool.MIN_WORKERS:
-                        # 可以设置 LogManager('_KeepAliveTimeThread').preset_log_level(logging.INFO) 来屏蔽下面的话,见文档6.17.b
-                        self.logger.debug(f'停止线程 {self._ident}, 触发条件是 {self.pool.pool_ident} 线程池中的 {self.ident} 线程 超过 {self.pool.KEEP_ALIVE_TIME} 秒没有任务，线程池中不在工作状态中的线程数量是 {self.pool.threads_free_count}，超过了指定的最小核心数量 {self.pool.MIN_WORKERS}')  # noqa
-                        self.pool._change_threads_free_count(-1)
-                        self.pool._change_threads_start_count(-1)
-                        break  # 退出while 1，即是结束。
-                    else:
-                        continue
-            self.pool._change_threads_free_count(-1)
+                idle_thread_tokens.pop()
+                if pool._judge_idle_thread_should_stop():
+                    # 可以设置 LogManager('_KeepAliveTimeThread').preset_log_level(logging.INFO) 来屏蔽下面的话,见文档6.17.b
+                    self.logger.debug(f'停止线程 {self._ident}, 触发条件是 {pool.pool_ident} 线程池中的 {self.ident} 线程 超过 {pool.KEEP_ALIVE_TIME} 秒没有任务，线程池中不在工作状态中的线程数量是 {pool.threads_free_count}，超过了指定的最小核心数量 {pool.MIN_WORKERS}')  # noqa
+                    break  # 退出while 1，即是结束。
+                continue
+            idle_thread_tokens.pop()
+            work_queue_free_slots.put(None)
             try:
-                fun = sync_or_async_fun_deco(func)
-                fun(*args, **kwargs)
+                if is_coroutine_function_cached(func):
+                    _get_thread_local_loop().run_until_complete(func(*args, **kwargs))
+                else:
+                    func(*args, **kwargs)
             except BaseException as exc:
                 self.logger.exception(f'函数 {func.__name__} 中发生错误，错误原因是 {type(exc)} {exc} ')
-            self.pool._change_threads_free_count(1)
-
-
-
+            del func, args, kwargs  # 空闲等待时候不要一直引用上一个任务的入参
 
 
 if __name__ == '__main__':
@@ -0,0 +1,301 @@
+"""
+多进程 叠加 线程池/asyncio池 的混合并发池，可以作为 specify_concurrent_pool 使用，io和cpu混合型的函数可以突破GIL用满多核。
+
+以前的 ConcurrentPoolWithProcess 只是演示，所有进程抢同一个 multiprocessing.Queue，每个任务都要经过这个队列的锁，
+并且submit不返回结果，函数成功失败都不知道。
+
+HybridProcessPool 的结构:
+  每个子进程里面运行一个 FlexibleThreadPool 或者 AsyncPoolExecutor MultiLoopAsyncPoolExecutor (pool_class)，每个子进程和当前进程之间有自己的两个单向管道，
+  当前进程为每个子进程维护一个本地待发送队列，submit 把任务放入负担最小的子进程的本地队列，
+  每个子进程最多只有 max_workers + prefetch_num 个已发送但还没完成的任务，多余的任务留在当前进程的本地队列中。
+  某个子进程空闲了而自己的本地队列已经空了，就从积压最多的其他子进程的本地队列尾部偷一半任务(work-stealing)，
+  所以某个子进程被慢任务拖住时候，它积压的任务会被其他子进程运行，不会一直等待。
+  任务和结果都是批量发送的，submit 返回 concurrent.futures.Future ，可以拿到函数的结果或异常。
+  子进程意外退出后，它正在运行的任务报错，并自动重新启动一个子进程，本地队列中还没发送的任务不受影响。
+
+函数和入参要能pickle，所以要用模块顶层定义的函数。
+作为消费者的 specify_concurrent_pool 时候，消费者的 _run 方法在子进程中运行，提交的是模块级别的函数、队列名和拉取消息的消费者的标识，
+子进程按队列名找到同一个消费者(见 base_consumer._run_consumer_in_other_process)，用拉取消息的消费者的标识确认消费和保存结果，
+按消费者标识命名 unack zset/list 的中间件(例如 REDIS_ACK_ABLE RedisBrpopLpush)确认的是拉取消息的消费者的 unack 记录。
+rabbitmq kafka(手动commit) nsq pulsar 等要用拉取消息的连接或消息对象确认消费的中间件不能使用，消费者实例化时候会报错，
+cpu密集型函数在这些中间件可以使用 ConcurrentModeEnum.PROCESS 并发模式。
+"""
+import inspect
+import itertools
+import multiprocessing
+import os
+import pickle
+import threading
+import typing
+from collections import deque
+from concurrent.futures import Future
+
+from funboost.concurrent_pool.async_pool_executor import AsyncPoolExecutorLtPy310
+from funboost.concurrent_pool.base_pool_type import FunboostBaseConcurrentPool
+from funboost.concurrent_pool.flexible_thread_pool import FlexibleThreadPool, run_sync_or_async_fun
+from funboost.concurrent_pool.multi_loop_async_pool_executor import MultiLoopAsyncPoolExecutor
+from funboost.core.loggers import FunboostFileLoggerMixin
+
+
+def _dumps_result(task_seq: int, is_success: bool, result) -> bytes:
+    try:
+        return pickle.dumps((task_seq, is_success, result), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return pickle.dumps((task_seq, False, RuntimeError(f'函数的结果或异常不能pickle序列化传回主进程 {type(e)} {e}')))
+
+
+class _ResponseSender:
+    """子进程中把运行结果攒批发回主进程，繁忙时候一次发送很多个结果。"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._is_closed = False
+        self._thread = threading.Thread(target=self._send_forever, daemon=True)
+        self._thread.start()
+
+    def put(self, task_seq: int, is_success: bool, result):
+        item = _dumps_result(task_seq, is_success, result)
+        with self._cond:
+            self._buffer.append(item)
+            self._cond.notify()
+
+    def _send_forever(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._is_closed:
+                    self._cond.wait()
+                if not self._buffer:
+                    return
+                items = list(self._buffer)
+                self._buffer.clear()
+            self._conn.send_bytes(pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def close(self):
+        with self._cond:
+            self._is_closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def _run_task(sender: _ResponseSender, task_seq: int, payload: bytes):
+    try:
+        func, args, kwargs = pickle.loads(payload)
+        sender.put(task_seq, True, run_sync_or_async_fun(func, *args, **kwargs))
+    except BaseException as e:
+        sender.put(task_seq, False, e)
+
+
+async def _arun_task(sender: _ResponseSender, task_seq: int, payload: bytes):
+    try:
+        func, args, kwargs = pickle.loads(payload)
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        sender.put(task_seq, True, result)
+    except BaseException as e:
+        sender.put(task_seq, False, e)
+
+
+def _hybrid_worker_main(request_conn, response_conn, pool_class, max_workers: int, parent_pid: int):
+    pool = pool_class(max_workers)
+    runner = _arun_task if issubclass(pool_class, (AsyncPoolExecutorLtPy310, MultiLoopAsyncPoolExecutor)) else _run_task
+    sender = _ResponseSender(response_conn)
+    while True:
+        if not request_conn.poll(1):
+            if os.getppid() != parent_pid:  # 主进程已经退出了
+                break
+            continue
+        try:
+            data = request_conn.recv_bytes()
+        except EOFError:
+            break
+        tasks = pickle.loads(data)
+        if tasks is None:  # 主进程 shutdown 时候已经等待了全部任务完成
+            break
+        for task_seq, payload in tasks:
+            pool.submit(runner, sender, task_seq, payload)
+    sender.close()
+    os._exit(0)  # 线程池的常驻线程不是守护线程，正常退出会一直等待它们。
+
+
+class _HybridWorker:
+    def __init__(self, index: int):
+        self.index = index
+        self.local_task_deque = deque()  # 还没发送给子进程的任务，自己从左边取，别的子进程从右边偷
+        self.inflight_task_seq_set = set()  # 已经发送给子进程还没返回结果的任务
+        self.lock_for_send = threading.Lock()
+        self.process = None  # type: typing.Optional[multiprocessing.Process]
+        self.request_conn = None
+        self.response_conn = None
+
+
+class HybridProcessPool(FunboostFileLoggerMixin, FunboostBaseConcurrentPool):
+    def __init__(self, max_workers: int = 100, process_num: int = None, pool_class: typing.Type = FlexibleThreadPool,
+                 prefetch_num: int = None, max_send_batch_size: int = 100):
+        """
+        :param max_workers: 每个子进程中的线程池/asyncio池的并发数量。
+        :param process_num: 子进程数量，默认是cpu核数。
+        :param pool_class: 子进程中使用的并发池，FlexibleThreadPool 或者 AsyncPoolExecutor 等 构造函数第一个入参是并发数量的池。
+        :param prefetch_num: 每个子进程除了正在运行的任务，最多再预先发送多少个任务，默认等于 max_workers 。
+        :param max_send_batch_size: 每次最多发送多少个任务给一个子进程。
+        """
+        self.max_workers = max_workers
+        self.process_num = process_num or os.cpu_count() or 1
+        self.pool_class = pool_class
+        self.prefetch_num = max_workers if prefetch_num is None else prefetch_num
+        self.max_send_batch_size = max_send_batch_size
+        self._inflight_max_num_per_worker = self.max_workers + self.prefetch_num
+        self._local_task_max_num = self.process_num * max(self.max_workers, 10)  # 本地队列满了 submit 阻塞，和线程池的有界队列一样。
+        self._cond = threading.Condition()
+        self._local_task_num = 0
+        self._task_seq_counter = itertools.count()
+        self._task_seq__future_map = {}  # type: typing.Dict[int,Future]
+        self._workers = [_HybridWorker(i) for i in range(self.process_num)]
+        self._pid = os.getpid()
+        self._is_started = False
+        self._is_shutdown = False
+
+    def _start(self):
+        """第一次submit时候才启动子进程，spawn方式的子进程重新导入用户模块时候，模块级别实例化的池不会再启动子进程。"""
+        with self._cond:
+            if self._is_started:
+                return
+            for worker in self._workers:
+                self._start_worker_process(worker)
+                threading.Thread(target=self._feed_forever, args=(worker,), daemon=True,
+                                 name=f'hybrid_process_pool_feed--{worker.index}').start()
+                threading.Thread(target=self._read_forever, args=(worker,), daemon=True,
+                                 name=f'hybrid_process_pool_read--{worker.index}').start()
+            self._is_started = True
+
+    def _start_worker_process(self, worker: _HybridWorker):
+        request_conn_child, request_conn = multiprocessing.Pipe(duplex=False)
+        response_conn, response_conn_child = multiprocessing.Pipe(duplex=False)
+        worker.process = multiprocessing.Process(target=_hybrid_worker_main,
+                                                 args=(request_conn_child, response_conn_child, self.pool_class, self.max_workers, os.getpid()),
+                                                 daemon=True, name=f'funboost_hybrid_process_pool--{worker.index}')
+        worker.process.start()
+        request_conn_child.close()  # 主进程关闭子进程那一端，子进程退出后主进程读取结果时候才能收到EOF
+        response_conn_child.close()
+        worker.request_conn = request_conn
+        worker.response_conn = response_conn
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        if not self._is_started:
+            self._start()
+        if self._pid != os.getpid():
+            raise RuntimeError('HybridProcessPool 不能在fork出来的子进程中使用，请在子进程中重新实例化')
+        if self._is_shutdown:
+            raise RuntimeError('HybridProcessPool 已经 shutdown 了')
+        payload = pickle.dumps((func, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)  # 在调用线程序列化，不能pickle的函数和入参在这里直接报错
+        future = Future()
+        with self._cond:
+            while self._local_task_num >= self._local_task_max_num:
+                self._cond.wait()
+            task_seq = next(self._task_seq_counter)
+            self._task_seq__future_map[task_seq] = future
+            worker = min(self._workers, key=lambda w: len(w.local_task_deque) + len(w.inflight_task_seq_set))
+            worker.local_task_deque.append((task_seq, payload))
+            self._local_task_num += 1
+            self._cond.notify_all()
+        return future
+
+    def submit_many(self, func, args_list: typing.Iterable[tuple]):
+        for args in args_list:
+            self.submit(func, *args)
+
+    def _take_batch(self, worker: _HybridWorker, max_num: int) -> list:
+        """调用方持有 self._cond 。先取自己的本地队列，自己的空了就从积压最多的子进程的本地队列尾部偷一半。"""
+        batch = []
+        local_task_deque = worker.local_task_deque
+        while local_task_deque and len(batch) < max_num:
+            batch.append(local_task_deque.popleft())
+        if not batch:
+            victim = max(self._workers, key=lambda w: len(w.local_task_deque))
+            steal_num = min(max_num, (len(victim.local_task_deque) + 1) // 2)
+            for _ in range(steal_num):
+                batch.append(victim.local_task_deque.pop())
+        return batch
+
+    def _feed_forever(self, worker: _HybridWorker):
+        while True:
+            with self._cond:
+                while True:
+                    if self._is_shutdown:
+                        return
+                    free_num = self._inflight_max_num_per_worker - len(worker.inflight_task_seq_set)
+                    if free_num > 0 and self._local_task_num:
+                        batch = self._take_batch(worker, min(free_num, self.max_send_batch_size))
+                        if batch:
+                            break
+                    self._cond.wait(1)
+                for task_seq, _ in batch:
+                    worker.inflight_task_seq_set.add(task_seq)
+                self._local_task_num -= len(batch)
+                request_conn = worker.request_conn
+                self._cond.notify_all()
+            try:
+                with worker.lock_for_send:
+                    request_conn.send_bytes(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL))
+            except (OSError, ValueError) as e:  # 子进程退出了，这批任务在 inflight_task_seq_set 中，由读取线程重启子进程时候设置为失败
+                self.logger.warning(f'发送任务到第 {worker.index} 个子进程失败 {type(e)} {e}')
+
+    def _read_forever(self, worker: _HybridWorker):
+        while True:
+            try:
+                data = worker.response_conn.recv_bytes()
+            except (EOFError, OSError):
+                if self._is_shutdown:
+                    return
+                self._restart_worker(worker)
+                continue
+            results = [pickle.loads(item) for item in pickle.loads(data)]
+            with self._cond:
+                futures = []
+                for task_seq, _, _ in results:
+                    worker.inflight_task_seq_set.discard(task_seq)
+                    futures.append(self._task_seq__future_map.pop(task_seq, None))
+                self._cond.notify_all()
+            for (_, is_success, result), future in zip(results, futures):
+                if future is None:
+                    continue
+                if is_success:
+                    future.set_result(result)
+                else:
+                    self.logger.error(f'HybridProcessPool 子进程中运行函数出错 {type(result)} {result}')
+                    future.set_exception(result)
+
+    def _restart_worker(self, worker: _HybridWorker):
+        with self._cond:
+            futures = [self._task_seq__future_map.pop(task_seq, None) for task_seq in worker.inflight_task_seq_set]
+            worker.inflight_task_seq_set.clear()
+            old_pid = worker.process.pid
+            worker.request_conn.close()
+            worker.response_conn.close()
+            self._start_worker_process(worker)
+            self._cond.notify_all()
+        self.logger.critical(f'HybridProcessPool 第 {worker.index} 个子进程 {old_pid} 意外退出了，{len(futures)} 个任务运行失败，重新启动子进程')
+        for future in futures:
+            if future is not None:
+                future.set_exception(RuntimeError('运行任务的子进程意外退出了'))
+
+    def shutdown(self, wait=True):
+        if not self._is_started or self._is_shutdown:
+            return
+        with self._cond:
+            if wait:
+                while self._local_task_num or any(w.inflight_task_seq_set for w in self._workers):
+                    self._cond.wait(1)
+            self._is_shutdown = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            try:
+                with worker.lock_for_send:
+                    worker.request_conn.send_bytes(pickle.dumps(None))
+            except (OSError, ValueError):
+                pass
+        if wait:
+            for worker in self._workers:
+                worker.process.join()
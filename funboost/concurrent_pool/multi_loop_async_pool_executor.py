@@ -0,0 +1,126 @@
+"""
+多个事件循环的asyncio并发池。
+
+AsyncPoolExecutor 只有一个loop运行在一个线程中，协程很多时候这个loop的调度本身就会用满一个核(例如aiohttp爬虫每秒几千个请求)。
+MultiLoopAsyncPoolExecutor 启动 loop_num 个 AsyncPoolExecutor ，每个都有自己的loop和线程，任务分片到这些loop中运行:
+  默认轮流放入，某个loop的池满了就放入下一个不满的loop，都满了才阻塞等待。
+  也可以传 shard_key_func ，按分片键(例如消息的task_id，见 shard_key_by_task_id)的稳定哈希固定放入某个loop，同一个键总是在同一个loop中运行。
+  use_uvloop=True 时候每个loop都使用uvloop(需要 pip install uvloop，不支持windows)。
+
+多个线程中的loop仍然共用GIL，ssl socket 压缩解压 uvloop的http解析 这些释放GIL的工作可以在多个核上并行，
+纯python代码很多的协程要用满多核，可以使用多进程，例如 HybridProcessPool(pool_class=MultiLoopAsyncPoolExecutor) 或者 multi_process_consume。
+
+不同loop中的协程不能共用和loop绑定的对象(例如 aiohttp.ClientSession)，这种对象要在每个loop中各自创建，
+可以用 asyncio.get_running_loop() 作为字典的键缓存每个loop自己的对象，或者通过 loops 入参给每个分片指定自己的loop。
+"""
+import asyncio
+import itertools
+import typing
+import zlib
+
+from funboost.concurrent_pool.async_helper import simple_run_in_executor
+from funboost.concurrent_pool.async_pool_executor import AsyncPoolExecutor
+from funboost.concurrent_pool.base_pool_type import FunboostBaseConcurrentPool
+from funboost.core.loggers import FunboostFileLoggerMixin
+
+
+def shard_key_by_task_id(func, args: tuple, kwargs: dict):
+    """消费者提交的是 consumer._async_run(kw)，按消息的task_id分片。"""
+    kw = args[0] if args else kwargs.get('kw')
+    try:
+        return kw['body']['extra']['task_id']
+    except (TypeError, KeyError):
+        return None
+
+
+class MultiLoopAsyncPoolExecutor(FunboostFileLoggerMixin, FunboostBaseConcurrentPool):
+    def __init__(self, size, loop_num: int = None, loops: typing.List[asyncio.AbstractEventLoop] = None,
+                 shard_key_func: typing.Callable[[typing.Callable, tuple, dict], typing.Hashable] = None, use_uvloop: bool = False):
+        """
+        :param size: 所有loop加起来同时并发运行的协程任务数量，平均分给每个loop。
+        :param loop_num: loop数量，默认是2，传了 loops 时候等于 len(loops)。
+        :param loops: 给每个分片指定loop，和 AsyncPoolExecutor 的 loop 入参一样，每个分片一个。
+        :param shard_key_func: 入参是 (func, args, kwargs) ，返回分片键，返回None的任务轮流放入。不传就是全部轮流放入。
+        :param use_uvloop: 新建的loop使用uvloop。
+        """
+        if loops:
+            loop_num = len(loops)
+        self.loop_num = loop_num or 2
+        self._size = size
+        size_per_loop = max(1, -(-size // self.loop_num))
+        if not loops:
+            loops = [self._new_loop(use_uvloop) for _ in range(self.loop_num)]
+        self.shards = [AsyncPoolExecutor(size_per_loop, loop=loop) for loop in loops]
+        self.loop = loops[0]  # 和 AsyncPoolExecutor 一样有 loop 属性，消费者的 _async_shedual_task 运行在第一个loop中
+        self._loop__shard_map = {shard.loop: shard for shard in self.shards}
+        self._shard_key_func = shard_key_func
+        self._round_robin_counter = itertools.count()
+
+    @staticmethod
+    def _new_loop(use_uvloop: bool) -> asyncio.AbstractEventLoop:
+        if use_uvloop:
+            import uvloop  # pip install uvloop
+            return uvloop.new_event_loop()
+        return asyncio.new_event_loop()
+
+    def _get_shard_by_key(self, func, args, kwargs) -> typing.Optional[AsyncPoolExecutor]:
+        if self._shard_key_func is None:
+            return None
+        key = self._shard_key_func(func, args, kwargs)
+        if key is None:
+            return None
+        return self.shards[zlib.crc32(str(key).encode()) % self.loop_num]  # 不用hash()，python每次启动字符串的hash值不一样
+
+    def _iter_shards_round_robin(self) -> typing.List[AsyncPoolExecutor]:
+        start = next(self._round_robin_counter) % self.loop_num
+        return self.shards[start:] + self.shards[:start]
+
+    def submit(self, func, *args, **kwargs):
+        shard = self._get_shard_by_key(func, args, kwargs)
+        if shard is not None:
+            shard.submit(func, *args, **kwargs)
+            return
+        shards = self._iter_shards_round_robin()
+        for shard in shards:
+            if shard.submit_nowait(func, args, kwargs):
+                return
+        shards[0].submit(func, *args, **kwargs)  # 全部都满了，阻塞等待轮到的那个
+
+    def submit_many(self, func, args_list: typing.Iterable[tuple]):
+        for args in args_list:
+            self.submit(func, *args)
+
+    async def asubmit(self, func, *args, **kwargs):
+        """在任意一个分片的loop中调用，池满时候不阻塞loop"""
+        shard = self._get_shard_by_key(func, args, kwargs)
+        shards = [shard] if shard is not None else self._iter_shards_round_robin()
+        for shard in shards:
+            if shard.submit_nowait(func, args, kwargs):
+                return
+        current_shard = self._loop__shard_map.get(asyncio.get_running_loop())
+        if current_shard is not None and (current_shard is shards[0] or len(shards) > 1):  # 按分片键只能放入 shards[0]，轮流放入时候可以放入当前loop自己的分片
+            await current_shard.asubmit(func, *args, **kwargs)
+        else:  # 要放入别的loop并且那个loop满了，在线程中阻塞等待，不阻塞当前loop
+            await simple_run_in_executor(shards[0].submit, func, *args, **kwargs)
+
+    def shutdown(self):
+        for shard in self.shards:
+            shard.shutdown()
+
+
+if __name__ == '__main__':
+    import os
+    import threading
+    import time
+
+    async def f(x):
+        await asyncio.sleep(0.1)
+        if x % 1000 == 0:
+            print(x, threading.get_ident(), os.getpid())
+
+    pool = MultiLoopAsyncPoolExecutor(2000, loop_num=4)
+    t1 = time.time()
+    for i in range(20000):
+        pool.submit(f, i)
+    pool.shutdown()
+    print(time.time() - t1)
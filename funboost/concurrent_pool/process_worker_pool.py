@@ -0,0 +1,261 @@
+"""
+ConcurrentModeEnum.PROCESS 并发模式使用的多进程工作池。
+
+以前想利用多核只能 multi_process_consume 启动多个完全独立的消费者，每个进程都有自己的中间件连接 心跳 日志，
+ConcurrentPoolWithProcess 也只是一个没有使用的演示。
+
+PROCESS 模式只有当前进程连接中间件拉取消息，控频 过滤 重试 确认消费 保存结果 都仍然在当前进程的线程池中进行，
+只有消费函数本身的运行被分发到工作进程，工作进程之间不共享任何东西(shared-nothing)，各自一次运行一个函数，
+cpu密集型的消费函数可以用满所有核，中间件连接数量不会随进程数量增加。
+
+当前进程和每个工作进程之间是两个共享内存环形缓冲区(请求和结果各一个)，
+环形缓冲区由固定大小的槽组成，用两个进程间信号量表示空槽数量和已写入槽数量，大消息自动拆成多个连续的槽。
+函数入参和结果用pickle传递。工作进程意外退出后，它正在运行和排队的任务报错(会按消费者的重试配置重试)，并自动重新启动一个工作进程。
+"""
+import asyncio
+import atexit
+import itertools
+import multiprocessing
+import os
+import pickle
+import struct
+import threading
+import typing
+from multiprocessing import shared_memory
+
+from funboost.core.loggers import FunboostFileLoggerMixin
+
+_SLOT_HEAD = struct.Struct('<IB')  # 本槽内容长度, 是否是这条消息的最后一个槽
+
+
+class ShmRingBuffer:
+    """单生产者单消费者的共享内存环形缓冲区，同一端有多个线程时候由调用方加锁。"""
+
+    def __init__(self, slot_num: int = 64, slot_size: int = 64 * 1024):
+        self.slot_num = slot_num
+        self.slot_size = slot_size
+        self._shm = shared_memory.SharedMemory(create=True, size=slot_num * slot_size)
+        self._shm_name = self._shm.name
+        self._is_owner = True
+        self._written_slot_sem = multiprocessing.Semaphore(0)
+        self._empty_slot_sem = multiprocessing.Semaphore(slot_num)
+        self._index = 0  # 写入端和读取端各自在自己的进程中维护自己的位置
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        state['_is_owner'] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        try:
+            self._shm = shared_memory.SharedMemory(name=self._shm_name, track=False)  # python3.13+
+        except TypeError:
+            self._shm = shared_memory.SharedMemory(name=self._shm_name)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')  # 共享内存由创建它的消费者进程 unlink，工作进程不登记，否则退出时候报泄露警告。
+
+    def write(self, data: bytes, is_peer_alive: typing.Callable[[], bool] = None):
+        buf = self._shm.buf
+        chunk_size = self.slot_size - _SLOT_HEAD.size
+        data_len = len(data)
+        pos = 0
+        while True:
+            while not self._empty_slot_sem.acquire(timeout=1):
+                if is_peer_alive is not None and not is_peer_alive():
+                    raise RuntimeError('环形缓冲区的读取进程已经退出')
+            chunk_len = min(chunk_size, data_len - pos)
+            is_last = pos + chunk_len >= data_len
+            offset = self._index * self.slot_size
+            _SLOT_HEAD.pack_into(buf, offset, chunk_len, is_last)
+            buf[offset + _SLOT_HEAD.size:offset + _SLOT_HEAD.size + chunk_len] = data[pos:pos + chunk_len]
+            self._index = (self._index + 1) % self.slot_num
+            self._written_slot_sem.release()
+            pos += chunk_len
+            if is_last:
+                return
+
+    def read(self, timeout: float = None, is_peer_alive: typing.Callable[[], bool] = None) -> typing.Optional[bytes]:
+        """读取一条完整的消息，timeout 时间内没有消息返回None。"""
+        buf = self._shm.buf
+        chunks = []
+        while True:
+            if not chunks:
+                if not self._written_slot_sem.acquire(timeout=timeout):
+                    return None
+            else:  # 已经读了一部分，等待剩下的槽，除非写入进程在写了一半时候退出了。
+                while not self._written_slot_sem.acquire(timeout=1):
+                    if is_peer_alive is not None and not is_peer_alive():
+                        return None
+            offset = self._index * self.slot_size
+            chunk_len, is_last = _SLOT_HEAD.unpack_from(buf, offset)
+            chunks.append(bytes(buf[offset + _SLOT_HEAD.size:offset + _SLOT_HEAD.size + chunk_len]))
+            self._index = (self._index + 1) % self.slot_num
+            self._empty_slot_sem.release()
+            if is_last:
+                return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def close(self):
+        self._shm.close()
+        if self._is_owner:
+            self._shm.unlink()
+
+
+def _build_function_run_in_worker(queue_name: str):
+    from funboost.core.lazy_impoter import funboost_lazy_impoter
+    from funboost.concurrent_pool.flexible_thread_pool import sync_or_async_fun_deco
+    boost_params = funboost_lazy_impoter.BoostersManager.get_boost_params(queue_name)
+    function_run = boost_params.consuming_function
+    if asyncio.iscoroutinefunction(function_run):
+        function_run = sync_or_async_fun_deco(function_run)
+    if boost_params.consumin_function_decorator is not None:
+        function_run = boost_params.consumin_function_decorator(function_run)
+    return function_run
+
+
+def _worker_main(queue_name: str, request_ring: ShmRingBuffer, response_ring: ShmRingBuffer, parent_pid: int):
+    function_run = _build_function_run_in_worker(queue_name)
+
+    def is_parent_alive():
+        return os.getppid() == parent_pid
+
+    while True:
+        data = request_ring.read(timeout=1, is_peer_alive=is_parent_alive)
+        if data is None:
+            if not is_parent_alive():  # 消费者进程已经退出了
+                return
+            continue
+        task = pickle.loads(data)
+        if task is None:
+            return
+        task_seq, function_kwargs = task
+        try:
+            response = (task_seq, True, function_run(**function_kwargs))
+        except BaseException as e:
+            response = (task_seq, False, e)
+        try:
+            payload = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            payload = pickle.dumps((task_seq, False, RuntimeError(f'函数的结果或异常不能pickle序列化传回消费者进程 {type(e)} {e}')))
+        try:
+            response_ring.write(payload, is_parent_alive)
+        except RuntimeError:  # 消费者进程已经退出，没有进程读取结果了，结果缓冲区写满后不能一直等待
+            return
+
+
+class _TaskWaiter:
+    __slots__ = ('event', 'is_success', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.is_success = False
+        self.result = None
+
+
+class _WorkerHandle:
+    def __init__(self, index: int):
+        self.index = index
+        self.lock_for_write = threading.Lock()
+        self.pending_task_seq_set = set()
+        self.process = None  # type: typing.Optional[multiprocessing.Process]
+        self.request_ring = None  # type: typing.Optional[ShmRingBuffer]
+        self.response_ring = None  # type: typing.Optional[ShmRingBuffer]
+        self.response_thread = None  # type: typing.Optional[threading.Thread]
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class ProcessWorkerPool(FunboostFileLoggerMixin):
+    def __init__(self, queue_name: str, process_num: int = None, slot_num: int = 64, slot_size: int = 64 * 1024):
+        self.queue_name = queue_name
+        self.process_num = process_num or os.cpu_count() or 1
+        self.slot_num = slot_num
+        self.slot_size = slot_size
+        self._task_seq_counter = itertools.count()
+        self._task_seq__waiter_map = {}  # type: typing.Dict[int,_TaskWaiter]
+        self._is_shutdown = False
+        self._is_closed = False
+        self._workers = [_WorkerHandle(i) for i in range(self.process_num)]
+        for worker in self._workers:
+            self._start_worker(worker)
+            worker.response_thread = threading.Thread(target=self._read_responses_forever, args=(worker,), daemon=True,
+                                                      name=f'process_worker_pool_response--{queue_name}--{worker.index}')
+            worker.response_thread.start()
+        atexit.register(self.shutdown)  # 非守护线程都结束后才运行atexit，这时候已经没有任务在运行了，停止工作进程并删除共享内存。
+
+    def _start_worker(self, worker: _WorkerHandle):
+        worker.request_ring = ShmRingBuffer(self.slot_num, self.slot_size)
+        worker.response_ring = ShmRingBuffer(self.slot_num, self.slot_size)
+        worker.process = multiprocessing.Process(target=_worker_main, args=(self.queue_name, worker.request_ring, worker.response_ring, os.getpid()),
+                                                 daemon=True, name=f'funboost_process_worker--{self.queue_name}--{worker.index}')
+        worker.process.start()
+
+    def _restart_worker(self, worker: _WorkerHandle):
+        with worker.lock_for_write:
+            if self._is_shutdown:
+                return
+            self.logger.critical(f'队列 {self.queue_name} 的第 {worker.index} 个工作进程 {worker.process.pid} 意外退出了，'
+                                 f'{len(worker.pending_task_seq_set)} 个任务运行失败，重新启动工作进程')
+            for task_seq in list(worker.pending_task_seq_set):
+                self._set_result(task_seq, False, RuntimeError('运行任务的工作进程意外退出了'))
+            worker.pending_task_seq_set.clear()
+            worker.request_ring.close()
+            worker.response_ring.close()
+            self._start_worker(worker)
+
+    def _set_result(self, task_seq: int, is_success: bool, result):
+        waiter = self._task_seq__waiter_map.pop(task_seq, None)
+        if waiter is not None:
+            waiter.is_success = is_success
+            waiter.result = result
+            waiter.event.set()
+
+    def _read_responses_forever(self, worker: _WorkerHandle):
+        while True:
+            data = worker.response_ring.read(timeout=1, is_peer_alive=worker.is_alive)
+            if data is None:
+                if self._is_shutdown:
+                    return
+                if not worker.is_alive():
+                    self._restart_worker(worker)
+                continue
+            task_seq, is_success, result = pickle.loads(data)
+            worker.pending_task_seq_set.discard(task_seq)
+            self._set_result(task_seq, is_success, result)
+
+    def run(self, **function_kwargs):
+        """在消费者的线程池中调用，阻塞直到工作进程运行完函数，返回函数结果或者抛出函数的异常。"""
+        worker = min(self._workers, key=lambda w: len(w.pending_task_seq_set))
+        task_seq = next(self._task_seq_counter)
+        waiter = _TaskWaiter()
+        self._task_seq__waiter_map[task_seq] = waiter
+        data = pickle.dumps((task_seq, function_kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            with worker.lock_for_write:
+                worker.pending_task_seq_set.add(task_seq)
+                worker.request_ring.write(data, worker.is_alive)
+        except BaseException:
+            worker.pending_task_seq_set.discard(task_seq)
+            self._task_seq__waiter_map.pop(task_seq, None)
+            raise
+        waiter.event.wait()
+        if waiter.is_success:
+            return waiter.result
+        raise waiter.result
+
+    def shutdown(self, wait=True):
+        if not self._is_shutdown:
+            self._is_shutdown = True
+            for worker in self._workers:
+                with worker.lock_for_write:
+                    if worker.is_alive():
+                        worker.request_ring.write(pickle.dumps(None), worker.is_alive)
+        if wait and not self._is_closed:
+            self._is_closed = True
+            for worker in self._workers:
+                worker.process.join()
+                worker.response_thread.join()  # 读取结果的线程最多1秒发现已经shutdown，等它退出后才能关闭共享内存。
+                worker.request_ring.close()
+                worker.response_ring.close()
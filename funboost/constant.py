@@ -88,6 +88,21 @@ class ConcurrentModeEnum:
     ASYNC = 'async'  # asyncio并发，适用于async def定义的函数。
     SINGLE_THREAD = 'single_thread'  # 如果你不想并发，不想预先从消息队列中间件拉取消息到python程序的内存queue队列缓冲中，那么就适合使用此并发模式。
     SOLO = SINGLE_THREAD
+    PROCESS = 'process'  # 当前进程拉取消息和控频确认消费，消费函数分发到多个工作进程运行，适合cpu密集型函数，工作进程数量由 process_pool_worker_num 设置。
+
+
+class RateLimiterKindEnum:
+    DEFAULT = 'default'  # 原来的控频方式，qps大于20时候是按每秒计数，每秒开头会突发。
+    TOKEN_BUCKET = 'token_bucket'  # 令牌桶，任何qps下都匀速，可以通过 rate_limiter_burst 允许少量突发。
+    GCRA = 'gcra'  # 通用信元速率算法，效果等价于令牌桶，只需要保存一个时间戳。
+    REDIS_DISTRIBUTED_GCRA = 'redis_distributed_gcra'  # 基于redis lua脚本的分布式GCRA，qps是全局总qps，不依赖心跳统计的活跃消费者数量，扩缩容时候全局频率也是准确的。
+
+
+class SerializerEnum:
+    JSON = 'json'  # 默认, orjson 序列化成字符串, 任何中间件和任何语言的消费者都能解析.
+    ORJSON_BYTES = 'orjson_bytes'  # orjson 序列化成 bytes, 支持二进制的中间件(例如kafka)直接发送bytes,省去str和bytes来回转换,消息内容仍然是json.
+    MSGPACK = 'msgpack'  # 需要 pip install msgpack, 比json更小更快,支持bytes类型的入参.
+    PICKLE5 = 'pickle5'  # pickle协议5, numpy数组等大对象使用带外缓冲区零拷贝, 支持任意python对象入参, 只能python消费, 中间件必须可信.
 
 
 # is_fsdf_remote_run = 0
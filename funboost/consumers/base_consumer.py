@@ -36,6 +36,7 @@ from funboost.core.loggers import develop_logger
 
 from funboost.core.func_params_model import BoosterParams, PublisherParams, BaseJsonAbleModel
 from funboost.core.serialization import Serialization
+from funboost.core.rate_limiter import build_rate_limiter
 from funboost.core.task_id_logger import TaskIdLogger
 from funboost.constant import FunctionKind
 
@@ -52,6 +53,7 @@ from funboost.funboost_config_deafult import FunboostCommonConfig
 from funboost.concurrent_pool.single_thread_executor import SoloExecutor
 
 from funboost.core.function_result_status_saver import ResultPersistenceHelper, FunctionResultStatus, RunStatus
+from funboost.core.consume_metrics import ConsumeMetricsAccumulator
 
 from funboost.core.helper_funs import delete_keys_and_return_new_dict, get_publish_time, MsgGenerater
 
@@ -65,8 +67,9 @@ from func_timeout import func_set_timeout  # noqa
 
 from funboost.concurrent_pool.custom_threadpool_executor import check_not_monkey
 from funboost.concurrent_pool.flexible_thread_pool import FlexibleThreadPool, sync_or_async_fun_deco
+from funboost.concurrent_pool.hybrid_process_pool import HybridProcessPool
 # from funboost.concurrent_pool.concurrent_pool_with_multi_process import ConcurrentPoolWithProcess
-from funboost.consumers.redis_filter import RedisFilter, RedisImpermanencyFilter
+from funboost.consumers.redis_filter import RedisFilter, RedisImpermanencyFilter, RedisFilterWithBloom, RedisImpermanencyFilterWithBloom
 from funboost.factories.publisher_factotry import get_publisher
 
 from funboost.utils import decorators, time_util, redis_manager
@@ -90,6 +93,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
     time_interval_for_check_do_not_run_time = 60
     BROKER_KIND = None
     BROKER_EXCLUSIVE_CONFIG_DEFAULT = {}  # 每种中间件的概念有所不同，用户可以从 broker_exclusive_config 中传递该种中间件特有的配置意义参数。
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = False  # 确认消费要用到当前进程拉取消息的连接 消息对象 或者进程内的状态，这种中间件不能在别的进程中运行 _run (HybridProcessPool)。
 
     @property
     @decorators.synchronized
@@ -157,14 +161,18 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         # self._do_task_filtering = consumer_params.do_task_filtering
         # self.consumer_params.is_show_message_get_from_broker = consumer_params.is_show_message_get_from_broker
         self._redis_filter_key_name = f'filter_zset:{consumer_params.queue_name}' if consumer_params.task_filtering_expire_seconds else f'filter_set:{consumer_params.queue_name}'
-        filter_class = RedisFilter if consumer_params.task_filtering_expire_seconds == 0 else RedisImpermanencyFilter
+        if consumer_params.task_filtering_use_local_bloom_filter:
+            filter_class = RedisFilterWithBloom if consumer_params.task_filtering_expire_seconds == 0 else RedisImpermanencyFilterWithBloom
+        else:
+            filter_class = RedisFilter if consumer_params.task_filtering_expire_seconds == 0 else RedisImpermanencyFilter
         self._redis_filter = filter_class(self._redis_filter_key_name, consumer_params.task_filtering_expire_seconds)
+        self._reset_filter_values_buffer()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_filter_values_buffer)  # fork的子进程没有父进程的批量添加线程，要重新启动。
+        atexit.register(self._bulk_add_filter_values)  # 比 join_shedual_task_thread 先注册，退出时候在它之后运行，缓冲中的过滤值同步写入redis。
 
         self._unit_time_for_count = 10  # 每隔多少秒计数，显示单位时间内执行多少次，暂时固定为10秒。
-        self._execute_task_times_every_unit_time = 0  # 每单位时间执行了多少次任务。
-        self._lock_for_count_execute_task_times_every_unit_time = Lock()
-        self._current_time_for_execute_task_times_every_unit_time = time.time()
-        self._consuming_function_cost_time_total_every_unit_time = 0
+        self._consume_metrics = ConsumeMetricsAccumulator()  # 每个线程无锁记录执行次数和耗时，后台线程每 _unit_time_for_count 秒汇总一次。
         self._last_execute_task_time = time.time()  # 最近一次执行任务的时间。
 
         self._last_show_remaining_execution_time = 0
@@ -189,6 +197,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         self._redis_key_pause_flag = f'funboost_pause_flag:{self.queue_name}'
 
         # 控频要用到的成员变量
+        self._rate_limiter = build_rate_limiter(self.consumer_params.rate_limiter_kind, self.consumer_params.rate_limiter_burst, self.queue_name)
         self._last_submit_task_timestamp = 0
         self._last_start_count_qps_timestamp = time.time()
         self._has_execute_times_in_recent_second = 0
@@ -220,6 +229,14 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         self._has_start_delay_task_scheduler = False
         self._consuming_function_is_asyncio = inspect.iscoroutinefunction(self.consuming_function)
         self.custom_init()
+        self._func_to_submit = self._run  # 放入并发池的函数
+        if isinstance(self.consumer_params.specify_concurrent_pool, HybridProcessPool):
+            if self.IS_ACK_BOUND_TO_CONSUMER_INSTANCE:
+                raise ValueError(f'{self.__class__.__name__} 确认消费要用到当前进程拉取消息的连接或消息对象，不能使用 HybridProcessPool 作为 specify_concurrent_pool ，'
+                                 f'cpu密集型函数请使用 ConcurrentModeEnum.PROCESS 并发模式')
+            # 消费者有中间件连接和锁，不能pickle，发送到子进程的是模块级别的函数和队列名，子进程按队列名找到同一个消费者，使用当前消费者的标识确认消费。
+            run_in_other_process = _async_run_consumer_in_other_process if consumer_params.concurrent_mode == ConcurrentModeEnum.ASYNC else _run_consumer_in_other_process
+            self._func_to_submit = functools.partial(run_in_other_process, self.queue_name, self.consumer_identification)
         # develop_logger.warning(consumer_params._log_filename)
         # self.publisher_params = PublisherParams(queue_name=consumer_params.queue_name, consuming_function=consumer_params.consuming_function,
         #                                         broker_kind=self.BROKER_KIND, log_level=consumer_params.log_level,
@@ -348,6 +365,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
             os._exit(4444)  # noqa
         self.logger.info(f'开始消费 {self._queue_name} 中的消息')
         self._result_persistence_helper = ResultPersistenceHelper(self.consumer_params.function_result_status_persistance_conf, self.queue_name)
+        self._build_execution_pipeline()
 
         self._distributed_consumer_statistics = DistributedConsumerStatistics(self)
         if self.consumer_params.is_send_consumer_hearbeat_to_redis:
@@ -355,11 +373,14 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
             self.logger.warning(f'启动了分布式环境 使用 redis 的键 hearbeat:{self._queue_name} 统计活跃消费者 ，当前消费者唯一标识为 {self.consumer_identification}')
 
         self.keep_circulating(60, block=False, daemon=False)(self.check_heartbeat_and_message_count)()  # 间隔时间最好比self._unit_time_for_count小整数倍，不然日志不准。
+        self.keep_circulating(self._unit_time_for_count, block=False, daemon=True)(self._report_execute_task_times)()
         if self.consumer_params.is_support_remote_kill_task:
             kill_remote_task.RemoteTaskKiller(self.queue_name, None).start_cycle_kill_task()
             self.consumer_params.is_show_message_get_from_broker = True  # 方便用户看到从消息队列取出来的消息的task_id,然后使用task_id杀死运行中的消息。
         if self.consumer_params.do_task_filtering:
             self._redis_filter.delete_expire_filter_task_cycle()  # 这个默认是RedisFilter类，是个pass不运行。所以用别的消息中间件模式，不需要安装和配置redis。
+            if self.consumer_params.task_filtering_use_local_bloom_filter:
+                self._redis_filter.start_bloom_sync_cycle()
         if self.consumer_params.schedule_tasks_on_main_thread:
             self.keep_circulating(1, daemon=False)(self._shedual_task)()
         else:
@@ -416,7 +437,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         extra_params = {'task_id': task_id, 'publish_time': round(time.time(), 4),
                         'publish_time_format': time.strftime('%Y-%m-%d %H:%M:%S')}
         """
-        msg = Serialization.to_dict(msg)
+        msg = Serialization.to_dict(msg, self.consumer_params.serializer)  # 非json序列化的消息按帧头自动选择编解码器。
         # 以下是清洗补全字段.
         if 'extra' not in msg:
             msg['extra'] = {'is_auto_fill_extra': True}
@@ -425,11 +446,12 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
             extra['task_id'] = MsgGenerater.generate_task_id(self._queue_name)
         if 'publish_time' not in extra:
             extra['publish_time'] = MsgGenerater.generate_publish_time()
-        if 'publish_time_format':
-            extra['publish_time_format'] = MsgGenerater.generate_publish_time_format()
+        if 'publish_time_format' not in extra:
+            extra['publish_time_format'] = MsgGenerater.generate_publish_time_format(
+                extra['publish_time'] if isinstance(extra['publish_time'], (int, float)) else None)
         return msg
 
-    def _submit_task(self, kw):
+    def _wait_for_continue_when_pause(self):
         while 1:  # 这一块的代码为支持暂停消费。
             # print(self._pause_flag)
             if self._pause_flag == 1:
@@ -439,18 +461,131 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                     self._last_show_pause_log_time = time.time()
             else:
                 break
-        kw['body'] = self.convert_msg_before_run(kw['body'])
-        self._print_message_get_from_broker(kw['body'])
+
+    def _submit_task(self, kw):
+        self._submit_tasks([kw])
+
+    def _submit_tasks(self, kw_list: typing.List[dict]):
+        """
+        批量提交从中间件一次拉取到的多条消息。暂停判断、不运行时间段判断每批只做一次，
+        不控频时整批消息一次性放入并发池，减少调度线程中逐条消息的python开销。
+        _submit_task 是这个方法只有一条消息的情况。
+        """
+        if not kw_list:
+            return
+        self._wait_for_continue_when_pause()
         if self._judge_is_daylight():
-            self._requeue(kw)
+            for kw in kw_list:
+                kw['body'] = self.convert_msg_before_run(kw['body'])
+                self._requeue(kw)
             time.sleep(self.time_interval_for_check_do_not_run_time)
             return
-        function_only_params = delete_keys_and_return_new_dict(kw['body'], )
-        if self._get_priority_conf(kw, 'do_task_filtering') and self._redis_filter.check_value_exists(
-                function_only_params):  # 对函数的参数进行检查，过滤已经执行过并且成功的任务。
-            self.logger.warning(f'redis的 [{self._redis_filter_key_name}] 键 中 过滤任务 {kw["body"]}')
-            self._confirm_consume(kw)
+        kw_list_to_run = self._prepare_kw_list_to_run(kw_list)
+        if not kw_list_to_run:
+            return
+        concurrent_pool = self.concurrent_pool
+        if not self.consumer_params.qps:  # 不需要控频，整批放入并发池。
+            submit_many = getattr(concurrent_pool, 'submit_many', None)  # 用户指定的 specify_concurrent_pool 不一定有 submit_many 方法。
+            if submit_many is not None:
+                submit_many(self._func_to_submit, [(kw,) for kw in kw_list_to_run])
+            else:
+                for kw in kw_list_to_run:
+                    concurrent_pool.submit(self._func_to_submit, kw)
+            return
+        for kw in kw_list_to_run:
+            concurrent_pool.submit(self._func_to_submit, kw)
+            if self.consumer_params.is_using_distributed_frequency_control and not (
+                    self._rate_limiter is not None and self._rate_limiter.IS_DISTRIBUTED):  # 如果是需要分布式控频。
+                active_num = self._distributed_consumer_statistics.active_consumer_num
+                self._frequency_control(self.consumer_params.qps / active_num, self._msg_schedule_time_intercal * active_num)
+            else:
+                self._frequency_control(self.consumer_params.qps, self._msg_schedule_time_intercal)
+
+    def _prepare_kw_list_to_run(self, kw_list: typing.List[dict]) -> typing.List[dict]:
+        for kw in kw_list:
+            if isinstance(kw['body'], (str, bytes)):
+                kw['raw_body'] = kw['body']  # 保留原始消息字符串，入参有嵌套可变对象时候重新解析一份给消费函数用，不用deepcopy。
+            kw['body'] = self.convert_msg_before_run(kw['body'])
+            self._print_message_get_from_broker(kw['body'])
+        kw_list = self._filter_tasks(kw_list)
+        return [kw for kw in kw_list if self._prepare_task_before_run(kw)]
+
+    async def _async_shedual_task(self):
+        """
+        中间件客户端本身是asyncio的消费者可以重写这个方法，ASYNC 并发模式下直接在并发池的loop中拉取消息，
+        用 await self._async_submit_tasks 放入并发池，不需要额外的线程，也不会每条消息跨线程一次。
+        没有重写的消费者仍然在线程中运行 _shedual_task 。
+        """
+        raise NotImplementedError
+
+    async def _async_submit_tasks(self, kw_list: typing.List[dict]):
+        """
+        _async_shedual_task 中调用，和 _submit_tasks 的处理一样，放入并发池时候 await asubmit ，池满时候不阻塞loop。
+        暂停消费 指定时间段不运行 控频 这些可能休眠的情况，整批放到线程中按 _submit_tasks 处理。
+        其余情况消息的预处理也在线程中进行，因为消息自己的 extra 中可以指定任务过滤(访问redis)和延时运行(启动apscheduler 确认消费)，
+        不看完消息不知道会不会阻塞，一批消息只跨线程一次。
+        """
+        if not kw_list:
             return
+        if (self._pause_flag == 1 or self.consumer_params.is_do_not_run_by_specify_time_effect
+                or self.consumer_params.qps):
+            await simple_run_in_executor(self._submit_tasks, kw_list)
+            return
+        kw_list_to_run = await simple_run_in_executor(self._prepare_kw_list_to_run, kw_list)
+        concurrent_pool = self.concurrent_pool
+        for kw in kw_list_to_run:
+            await concurrent_pool.asubmit(self._func_to_submit, kw)
+
+    def _filter_tasks(self, kw_list: typing.List[dict]) -> typing.List[dict]:
+        """对函数的参数进行检查，过滤已经执行过并且成功的任务。一批消息只和redis交互一次，返回没有被过滤的消息。"""
+        kw_list_need_filter = [kw for kw in kw_list if self._get_priority_conf(kw, 'do_task_filtering')]
+        if not kw_list_need_filter:
+            return kw_list
+        exists_list = self._redis_filter.check_values_exist([delete_keys_and_return_new_dict(kw['body']) for kw in kw_list_need_filter])
+        filtered_kw_ids = set()
+        for kw, exists in zip(kw_list_need_filter, exists_list):
+            if exists:
+                self.logger.warning(f'redis的 [{self._redis_filter_key_name}] 键 中 过滤任务 {kw["body"]}')
+                self._confirm_consume(kw)
+                filtered_kw_ids.add(id(kw))
+        return [kw for kw in kw_list if id(kw) not in filtered_kw_ids]
+
+    def _reset_filter_values_buffer(self):
+        self._filter_values_to_add = []
+        self._lock_for_filter_values_to_add = Lock()
+        self._has_start_bulk_add_filter_values_thread = False
+
+    def _add_filter_value(self, function_only_params: dict):
+        """
+        函数执行成功后，把入参放入缓冲，由后台线程每隔0.1秒使用 add_values 批量添加到过滤的redis键中，不在每个任务结束时单独访问一次redis。
+        停止消费和程序正常退出时候会同步写入缓冲中剩余的值，进程被强制杀死时候最近0.1秒内成功的任务没有写入，重新发布的相同任务可能会再运行一次。
+        """
+        with self._lock_for_filter_values_to_add:
+            self._filter_values_to_add.append(function_only_params)
+            if not self._has_start_bulk_add_filter_values_thread:
+                self._has_start_bulk_add_filter_values_thread = True
+                threading.Thread(target=self._bulk_add_filter_values_forever, daemon=True).start()
+
+    def _bulk_add_filter_values_forever(self):
+        while self._stop_flag != 1:
+            time.sleep(0.1)
+            try:
+                self._bulk_add_filter_values()
+            except BaseException as e:
+                self.logger.error(f'批量添加过滤值到redis出错 {type(e)} {e}', exc_info=True)
+        self._bulk_add_filter_values()
+
+    def _bulk_add_filter_values(self):
+        with self._lock_for_filter_values_to_add:
+            values, self._filter_values_to_add = self._filter_values_to_add, []
+        if values:
+            self._redis_filter.add_values(values)
+
+    def _prepare_task_before_run(self, kw) -> bool:
+        """
+        对已经转换过的消息做过期丢弃、延时任务的判断。
+        返回True表示这条消息需要立即放入并发池运行，False表示已经被丢弃或者转为了延时任务。
+        """
         publish_time = get_publish_time(kw['body'])
         msg_expire_senconds_priority = self._get_priority_conf(kw, 'msg_expire_senconds')
         if msg_expire_senconds_priority and time.time() - msg_expire_senconds_priority > publish_time:
@@ -458,7 +593,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                 f'消息发布时戳是 {publish_time} {kw["body"].get("publish_time_format", "")},距离现在 {round(time.time() - publish_time, 4)} 秒 ,'
                 f'超过了指定的 {msg_expire_senconds_priority} 秒，丢弃任务')
             self._confirm_consume(kw)
-            return 0
+            return False
 
         msg_eta = self._get_priority_conf(kw, 'eta')
         msg_countdown = self._get_priority_conf(kw, 'countdown')
@@ -483,7 +618,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
             #                                    misfire_grace_time=misfire_grace_time)
 
             # 这种方式是延时任务重新以普通任务方式发送到消息队列
-            msg_no_delay = copy.deepcopy(kw['body'])
+            msg_no_delay = {**kw['body'], 'extra': dict(kw['body']['extra'])}  # 只会删除extra中的键，不需要deepcopy整个消息。
             self.__delete_eta_countdown(msg_no_delay)
             # print(msg_no_delay)
             # 数据库作为apscheduler的jobstores时候， 不能用 self.pbulisher_of_same_queue.publish，self不能序列化
@@ -491,15 +626,8 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                                                kwargs={'queue_name': self.queue_name, 'msg': msg_no_delay, 'runonce_uuid': str(uuid.uuid4())},
                                                misfire_grace_time=misfire_grace_time)
             self._confirm_consume(kw)
-
-        else:  # 普通任务
-            self.concurrent_pool.submit(self._run, kw)
-
-        if self.consumer_params.is_using_distributed_frequency_control:  # 如果是需要分布式控频。
-            active_num = self._distributed_consumer_statistics.active_consumer_num
-            self._frequency_control(self.consumer_params.qps / active_num, self._msg_schedule_time_intercal * active_num)
-        else:
-            self._frequency_control(self.consumer_params.qps, self._msg_schedule_time_intercal)
+            return False
+        return True  # 普通任务
 
     def __delete_eta_countdown(self, msg_body: dict):
         self.__dict_pop(msg_body.get('extra', {}), 'eta')
@@ -517,6 +645,9 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         # 以下是消费函数qps控制代码。无论是单个消费者空频还是分布式消费控频，都是基于直接计算的，没有依赖redis inrc计数，使得控频性能好。
         if qpsx is None:  # 不需要控频的时候，就不需要休眠。
             return
+        if self._rate_limiter is not None:  # 令牌桶或GCRA限流器，任何qps下都是匀速放行。
+            self._rate_limiter.acquire(qpsx)
+            return
         if qpsx <= 5:
             """ 原来的简单版 """
             time.sleep(msg_schedule_time_intercalx)
@@ -543,12 +674,16 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         # print(999)
         if self.consumer_params.is_show_message_get_from_broker:
             # self.logger.debug(f'从 {broker_name} 中间件 的 {self._queue_name} 中取出的消息是 {msg}')
-            self.logger.debug(f'从 {broker_name or self.consumer_params.broker_kind} 中间件 的 {self._queue_name} 中取出的消息是 {Serialization.to_json_str(msg)}')
+            try:
+                msg_str = Serialization.to_json_str(msg)
+            except TypeError:  # 非json序列化的消息可能含有bytes等类型
+                msg_str = str(msg)
+            self.logger.debug(f'从 {broker_name or self.consumer_params.broker_kind} 中间件 的 {self._queue_name} 中取出的消息是 {msg_str}')
 
     def _get_priority_conf(self, kw: dict, broker_task_config_key: str):
         broker_task_config = kw['body'].get('extra', {}).get(broker_task_config_key, None)
         if not broker_task_config:
-            return getattr(self.consumer_params, f'{broker_task_config_key}', None)
+            return getattr(self.consumer_params, broker_task_config_key, None)
         else:
             return broker_task_config
 
@@ -605,15 +740,74 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         else:
             return function_only_params
 
+    def _build_execution_pipeline(self):
+        """
+        消费函数外面要包装的 sync_or_async_fun_deco consumin_function_decorator 超时装饰器 都是每个消费者固定的，
+        在这里组装一次，以后每条消息直接复用，不需要每条消息都重新生成一遍闭包。
+        只有消息自己指定了 function_timeout 时候才需要按超时时间另外包装，也会缓存起来。
+        远程杀死任务的装饰器和每条消息的 task_id 绑定，仍然是每条消息包装。
+        """
+        if self.consumer_params.concurrent_mode == ConcurrentModeEnum.PROCESS:
+            # 工作进程中自己组装 sync_or_async_fun_deco 和 consumin_function_decorator，这里只是把入参发给工作进程并等待结果。
+            function_run = self._concurrent_mode_dispatcher.build_process_worker_pool().run
+        else:
+            function_run = self.consuming_function
+            if self._consuming_function_is_asyncio:
+                function_run = sync_or_async_fun_deco(function_run)
+            if self.consumer_params.consumin_function_decorator is not None:
+                function_run = self.consumer_params.consumin_function_decorator(function_run)
+        self._function_run_without_timeout = function_run
+        self._function_run_timeout__function_run_map = {}
+        self._default_function_run = self._get_function_run_by_timeout(self.consumer_params.function_timeout)
+
+    def _get_function_run_by_timeout(self, function_timeout):
+        if not function_timeout:
+            return self._function_run_without_timeout
+        function_run = self._function_run_timeout__function_run_map.get(function_timeout)
+        if function_run is None:
+            function_run = self._concurrent_mode_dispatcher.timeout_deco(function_timeout)(self._function_run_without_timeout)
+            if len(self._function_run_timeout__function_run_map) < 100:  # 防止每条消息的超时时间都不一样导致无限增长。
+                self._function_run_timeout__function_run_map[function_timeout] = function_run
+        return function_run
+
+    _IMMUTABLE_PARAM_TYPES = (str, int, float, bool, type(None), bytes)
+
+    def _split_function_only_params(self, kw: dict) -> dict:
+        """
+        每条消息只在这里把函数入参从消息中拆分出来一次(浅拷贝)，这个字典是给 FunctionResultStatus 任务过滤 死信日志 这些记录用的，不传给消费函数，
+        所以消费函数修改了嵌套的入参也不会影响过滤键和保存的入参。
+        """
+        function_only_params = delete_keys_and_return_new_dict(kw['body'])
+        kw['function_only_params'] = function_only_params
+        kw['function_only_params_is_flat'] = all(isinstance(v, self._IMMUTABLE_PARAM_TYPES) for v in function_only_params.values())
+        return function_only_params
+
+    def _get_function_only_params(self, kw: dict) -> dict:
+        """
+        每次运行消费函数使用的入参，和 _split_function_only_params 记录用的字典互不影响。
+        入参的值全是不可变对象时候(绝大部分消息)直接共用，函数修改不了它们，**解包传参时候本身就是新的字典；
+        有列表字典这种嵌套可变对象的，有原始消息字符串的重新解码一次，不是字符串或者用户重写了 convert_msg_before_run 的才deepcopy，
+        重试时候不会再次运行用户的消息转换代码。
+        """
+        if self._do_not_delete_extra_from_msg:
+            return kw['body']
+        if 'function_only_params' not in kw:  # 没有经过 _run 直接调用的情况
+            return delete_keys_and_return_new_dict(kw['body'])
+        if kw['function_only_params_is_flat']:
+            return kw['function_only_params']
+        if 'raw_body' in kw and type(self).convert_msg_before_run is AbstractConsumer.convert_msg_before_run:
+            return delete_keys_and_return_new_dict(Serialization.to_dict(kw['raw_body'], self.consumer_params.serializer))
+        return copy.deepcopy(kw['function_only_params'])
+
     # noinspection PyProtectedMember
     def _run(self, kw: dict, ):
         # print(kw)
         try:
             t_start_run_fun = time.time()
             max_retry_times = self._get_priority_conf(kw, 'max_retry_times')
-            current_function_result_status = FunctionResultStatus(self.queue_name, self.consuming_function.__name__, kw['body'], )
+            function_only_params = self._split_function_only_params(kw)
+            current_function_result_status = FunctionResultStatus(self.queue_name, self.consuming_function.__name__, kw['body'], function_only_params)
             current_retry_times = 0
-            function_only_params = delete_keys_and_return_new_dict(kw['body'])
             for current_retry_times in range(max_retry_times + 1):
                 current_function_result_status.run_times = current_retry_times + 1
                 current_function_result_status.run_status = RunStatus.running
@@ -633,7 +827,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
             current_function_result_status.run_status = RunStatus.finish
             self._result_persistence_helper.save_function_result_to_mongo(current_function_result_status)
             if self._get_priority_conf(kw, 'do_task_filtering'):
-                self._redis_filter.add_a_value(function_only_params)  # 函数执行成功后，添加函数的参数排序后的键值对字符串到set中。
+                self._add_filter_value(function_only_params)  # 函数执行成功后，添加函数的参数排序后的键值对字符串到set中。
             if current_function_result_status.success is False and current_retry_times == max_retry_times:
                 log_msg = f'函数 {self.consuming_function.__name__} 达到最大重试次数 {self._get_priority_conf(kw, "max_retry_times")} 后,仍然失败， 入参是  {function_only_params} '
                 if self.consumer_params.is_push_to_dlx_queue_when_retry_max_times:
@@ -655,27 +849,8 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                         p.expire(kw['body']['extra']['task_id'], self.consumer_params.rpc_result_expire_seconds)
                         p.execute()
 
-            with self._lock_for_count_execute_task_times_every_unit_time:
-                self._execute_task_times_every_unit_time += 1
-                self._consuming_function_cost_time_total_every_unit_time += time.time() - t_start_run_fun
-                self._last_execute_task_time = time.time()
-                if time.time() - self._current_time_for_execute_task_times_every_unit_time > self._unit_time_for_count:
-                    avarage_function_spend_time = round(self._consuming_function_cost_time_total_every_unit_time / self._execute_task_times_every_unit_time, 4)
-                    msg = f'{self._unit_time_for_count} 秒内执行了 {self._execute_task_times_every_unit_time} 次函数 [ {self.consuming_function.__name__} ] ,' \
-                          f'函数平均运行耗时 {avarage_function_spend_time} 秒。 '
-                    self.logger.info(msg)
-                    if time.time() - self._last_show_remaining_execution_time > self._show_remaining_execution_time_interval:
-                        self._msg_num_in_broker = self.publisher_of_same_queue.get_message_count()
-                        if self._msg_num_in_broker != -1:  # 有的中间件无法统计或没实现统计队列剩余数量的，统一返回的是-1，不显示这句话。
-                            # msg += f''' ，预计还需要 {time_util.seconds_to_hour_minute_second(self._msg_num_in_broker * avarage_function_spend_time / active_consumer_num)} 时间 才能执行完成 {self._msg_num_in_broker}个剩余的任务'''
-                            need_time = time_util.seconds_to_hour_minute_second(self._msg_num_in_broker / (self._execute_task_times_every_unit_time / self._unit_time_for_count) /
-                                                                                self._distributed_consumer_statistics.active_consumer_num)
-                            msg += f''' 预计还需要 {need_time} 时间 才能执行完成 队列 {self.queue_name} 中的 {self._msg_num_in_broker} 个剩余任务'''
-                            self.logger.info(msg)
-                            self._last_show_remaining_execution_time = time.time()
-                    self._current_time_for_execute_task_times_every_unit_time = time.time()
-                    self._consuming_function_cost_time_total_every_unit_time = 0
-                    self._execute_task_times_every_unit_time = 0
+            t_end_run_fun = time.time()
+            self._consume_metrics.record(t_end_run_fun - t_start_run_fun, t_end_run_fun)  # 只是写本线程自己的计数器，由 _report_execute_task_times 后台汇总打印。
             self.user_custom_record_process_info_func(current_function_result_status)  # 两种方式都可以自定义,记录结果,建议继承方式,不使用boost中指定 user_custom_record_process_info_func
             if self.consumer_params.user_custom_record_process_info_func:
                 self.consumer_params.user_custom_record_process_info_func(current_function_result_status)
@@ -690,7 +865,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
     # noinspection PyProtectedMember
     def _run_consuming_function_with_confirm_and_retry(self, kw: dict, current_retry_times,
                                                        function_result_status: FunctionResultStatus, ):
-        function_only_params = delete_keys_and_return_new_dict(kw['body']) if self._do_not_delete_extra_from_msg is False else kw['body']
+        function_only_params = self._get_function_only_params(kw)
         task_id = kw['body']['extra']['task_id']
         t_start = time.time()
         # function_result_status.run_times = current_retry_times + 1
@@ -701,17 +876,16 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                                  logger=self.logger, )
 
         try:
-            function_run = self.consuming_function
             if self._consuming_function_is_asyncio:
                 fct_context.asyncio_use_thread_concurrent_mode = True
-                function_run = sync_or_async_fun_deco(function_run)
             else:
                 fct_context.asynco_use_thread_concurrent_mode = False
             fct.set_fct_context(fct_context)
-            function_timeout = self._get_priority_conf(kw, 'function_timeout')
-            function_run = function_run if self.consumer_params.consumin_function_decorator is None else self.consumer_params.consumin_function_decorator(function_run)
-            function_run = function_run if not function_timeout else self._concurrent_mode_dispatcher.timeout_deco(
-                function_timeout)(function_run)
+            function_timeout_of_msg = kw['body'].get('extra', {}).get('function_timeout')
+            if not function_timeout_of_msg:  # 快速路径，消息没有单独指定超时时间，直接使用预先组装好的函数。
+                function_run = self._default_function_run
+            else:
+                function_run = self._get_function_run_by_timeout(function_timeout_of_msg)
 
             if self.consumer_params.is_support_remote_kill_task:
                 if kill_remote_task.RemoteTaskKiller(self.queue_name, task_id).judge_need_revoke_run():  # 如果远程指令杀死任务，如果还没开始运行函数，就取消运行
@@ -784,9 +958,9 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         try:
             t_start_run_fun = time.time()
             max_retry_times = self._get_priority_conf(kw, 'max_retry_times')
-            current_function_result_status = FunctionResultStatus(self.queue_name, self.consuming_function.__name__, kw['body'], )
+            function_only_params = self._split_function_only_params(kw)
+            current_function_result_status = FunctionResultStatus(self.queue_name, self.consuming_function.__name__, kw['body'], function_only_params)
             current_retry_times = 0
-            function_only_params = delete_keys_and_return_new_dict(kw['body'])
             for current_retry_times in range(max_retry_times + 1):
                 current_function_result_status.run_times = current_retry_times + 1
                 current_function_result_status.run_status = RunStatus.running
@@ -804,8 +978,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
             current_function_result_status.run_status = RunStatus.finish
             await simple_run_in_executor(self._result_persistence_helper.save_function_result_to_mongo, current_function_result_status)
             if self._get_priority_conf(kw, 'do_task_filtering'):
-                # self._redis_filter.add_a_value(function_only_params)  # 函数执行成功后，添加函数的参数排序后的键值对字符串到set中。
-                await simple_run_in_executor(self._redis_filter.add_a_value, function_only_params)
+                self._add_filter_value(function_only_params)  # 只是放入内存缓冲，不阻塞事件循环，不需要 run_in_executor
             if current_function_result_status.success is False and current_retry_times == max_retry_times:
                 log_msg = f'函数 {self.consuming_function.__name__} 达到最大重试次数 {self._get_priority_conf(kw, "max_retry_times")} 后,仍然失败， 入参是  {function_only_params} '
                 if self.consumer_params.is_push_to_dlx_queue_when_retry_max_times:
@@ -828,25 +1001,8 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                 if (current_function_result_status.success is False and current_retry_times == max_retry_times) or current_function_result_status.success is True:
                     await simple_run_in_executor(push_result)
 
-            # 异步执行不存在线程并发，不需要加锁。
-            self._execute_task_times_every_unit_time += 1
-            self._consuming_function_cost_time_total_every_unit_time += time.time() - t_start_run_fun
-            self._last_execute_task_time = time.time()
-            if time.time() - self._current_time_for_execute_task_times_every_unit_time > self._unit_time_for_count:
-                avarage_function_spend_time = round(self._consuming_function_cost_time_total_every_unit_time / self._execute_task_times_every_unit_time, 4)
-                msg = f'{self._unit_time_for_count} 秒内执行了 {self._execute_task_times_every_unit_time} 次函数 [ {self.consuming_function.__name__} ] ,' \
-                      f'函数平均运行耗时 {avarage_function_spend_time} 秒。 '
-                self.logger.info(msg)
-                if self._msg_num_in_broker != -1 and time.time() - self._last_show_remaining_execution_time > self._show_remaining_execution_time_interval:  # 有的中间件无法统计或没实现统计队列剩余数量的，统一返回的是-1，不显示这句话。
-                    # msg += f''' ，预计还需要 {time_util.seconds_to_hour_minute_second(self._msg_num_in_broker * avarage_function_spend_time / active_consumer_num)} 时间 才能执行完成 {self._msg_num_in_broker}个剩余的任务'''
-                    need_time = time_util.seconds_to_hour_minute_second(self._msg_num_in_broker / (self._execute_task_times_every_unit_time / self._unit_time_for_count) /
-                                                                        self._distributed_consumer_statistics.active_consumer_num)
-                    msg += f''' 预计还需要 {need_time} 时间 才能执行完成 队列 {self.queue_name} 中的 {self._msg_num_in_broker} 个剩余任务'''
-                    self.logger.info(msg)
-                    self._last_show_remaining_execution_time = time.time()
-                self._current_time_for_execute_task_times_every_unit_time = time.time()
-                self._consuming_function_cost_time_total_every_unit_time = 0
-                self._execute_task_times_every_unit_time = 0
+            t_end_run_fun = time.time()
+            self._consume_metrics.record(t_end_run_fun - t_start_run_fun, t_end_run_fun)
 
             self.user_custom_record_process_info_func(current_function_result_status)  # 两种方式都可以自定义,记录结果.建议使用文档4.21.b的方式继承来重写
             await self.aio_user_custom_record_process_info_func(current_function_result_status)
@@ -866,7 +1022,7 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
                                                                    function_result_status: FunctionResultStatus, ):
         """虽然和上面有点大面积重复相似，这个是为了asyncio模式的，asyncio模式真的和普通同步模式的代码思维和形式区别太大，
         框架实现兼容async的消费函数很麻烦复杂，连并发池都要单独写"""
-        function_only_params = delete_keys_and_return_new_dict(kw['body']) if self._do_not_delete_extra_from_msg is False else kw['body']
+        function_only_params = self._get_function_only_params(kw)
         function_result_status.run_times = current_retry_times + 1
         # noinspection PyBroadException
         t_start = time.time()
@@ -932,6 +1088,27 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         """确认消费"""
         raise NotImplementedError
 
+    def _report_execute_task_times(self):
+        """
+        后台线程汇总各个工作线程的执行次数和耗时并打印，
+        剩余任务预计耗时使用 check_heartbeat_and_message_count 定时查询到的消息数量，工作线程里面不再同步查询中间件。
+        """
+        execute_times, cost_time_total, last_execute_task_time = self._consume_metrics.collect()
+        if last_execute_task_time > self._last_execute_task_time:
+            self._last_execute_task_time = last_execute_task_time
+        if execute_times == 0:
+            return
+        avarage_function_spend_time = round(cost_time_total / execute_times, 4)
+        msg = f'{self._unit_time_for_count} 秒内执行了 {execute_times} 次函数 [ {self.consuming_function.__name__} ] ,' \
+              f'函数平均运行耗时 {avarage_function_spend_time} 秒。 '
+        self.logger.info(msg)
+        if self._msg_num_in_broker not in (-1, 0) and time.time() - self._last_show_remaining_execution_time > self._show_remaining_execution_time_interval:  # 有的中间件无法统计或没实现统计队列剩余数量的，统一返回的是-1，不显示这句话。
+            need_time = time_util.seconds_to_hour_minute_second(self._msg_num_in_broker / (execute_times / self._unit_time_for_count) /
+                                                                self._distributed_consumer_statistics.active_consumer_num)
+            msg += f''' 预计还需要 {need_time} 时间 才能执行完成 队列 {self.queue_name} 中的 {self._msg_num_in_broker} 个剩余任务'''
+            self.logger.info(msg)
+            self._last_show_remaining_execution_time = time.time()
+
     def check_heartbeat_and_message_count(self):
         self._msg_num_in_broker = self.publisher_of_same_queue.get_message_count()
         if time.time() - self._last_timestamp_print_msg_num > 600:
@@ -947,6 +1124,17 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         """重新入队"""
         raise NotImplementedError
 
+    def _get_msg_for_requeue(self, kw) -> typing.Union[str, bytes]:
+        """
+        重新入队时候发送的消息。优先原样发送从中间件收到的原始消息，没有原始消息的按当前 serializer 重新序列化，
+        不能对解码后的消息直接 json.dumps ，msgpack pickle5 编码的消息里面可能有bytes numpy数组等json不支持的类型。
+        """
+        if 'raw_body' in kw:
+            return kw['raw_body']
+        if isinstance(kw['body'], (str, bytes)):
+            return kw['body']
+        return self.publisher_of_same_queue._serialize_msg(kw['body'])
+
     def _apscheduler_job_miss(self, event):
         """
         这是 apscheduler 包的事件钩子。
@@ -1023,6 +1211,15 @@ class AbstractConsumer(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
     def __str__(self):
         return f'队列为 {self.queue_name} 函数为 {self.consuming_function} 的消费者'
 
+    @decorators.synchronized
+    def _prepare_run_without_consuming(self):
+        """在别的进程中只运行 _run 不拉取消息时候(见 _run_consumer_in_other_process)，初始化 start_consuming_message 中 _run 要用到的东西。"""
+        if getattr(self, '_result_persistence_helper', None) is not None:  # fork的子进程，或者这个进程自己也启动了消费
+            return
+        self._result_persistence_helper = ResultPersistenceHelper(self.consumer_params.function_result_status_persistance_conf, self.queue_name)
+        self._build_execution_pipeline()
+        self.keep_circulating(self._unit_time_for_count, block=False, daemon=True)(self._report_execute_task_times)()
+
 
 # noinspection PyProtectedMember
 class ConcurrentModeDispatcher(FunboostFileLoggerMixin):
@@ -1031,7 +1228,9 @@ class ConcurrentModeDispatcher(FunboostFileLoggerMixin):
         self.consumer = consumerx
         self._concurrent_mode = self.consumer.consumer_params.concurrent_mode
         self.timeout_deco = None
-        if self._concurrent_mode in (ConcurrentModeEnum.THREADING, ConcurrentModeEnum.SINGLE_THREAD):
+        self._process_worker_pool = None
+        if self._concurrent_mode in (ConcurrentModeEnum.THREADING, ConcurrentModeEnum.SINGLE_THREAD, ConcurrentModeEnum.PROCESS):
+            # PROCESS 模式超时后只是当前进程不再等待，工作进程中的函数会继续运行完。
             # self.timeout_deco = decorators.timeout
             self.timeout_deco = func_set_timeout  # 这个超时装饰器性能好很多。
         elif self._concurrent_mode == ConcurrentModeEnum.GEVENT:
@@ -1048,7 +1247,8 @@ class ConcurrentModeDispatcher(FunboostFileLoggerMixin):
             # print({self.consumer._concurrent_mode, ConsumersManager.global_concurrent_mode})
             if not {self.consumer.consumer_params.concurrent_mode, GlobalVars.global_concurrent_mode}.issubset({ConcurrentModeEnum.THREADING,
                                                                                                                 ConcurrentModeEnum.ASYNC,
-                                                                                                                ConcurrentModeEnum.SINGLE_THREAD}):
+                                                                                                                ConcurrentModeEnum.SINGLE_THREAD,
+                                                                                                                ConcurrentModeEnum.PROCESS}):
                 # threding、asyncio、solo 这几种模式可以共存。但同一个解释器不能同时选择 gevent + 其它并发模式，也不能 eventlet + 其它并发模式。
                 raise ValueError('''由于猴子补丁的原因，同一解释器中不可以设置两种并发类型,请查看显示的所有消费者的信息，
                                  搜索 concurrent_mode 关键字，确保当前解释器内的所有消费者的并发模式只有一种(或可以共存),
@@ -1062,7 +1262,7 @@ class ConcurrentModeDispatcher(FunboostFileLoggerMixin):
             return self.consumer._concurrent_pool
 
         pool_type = None  # 是按照ThreadpoolExecutor写的三个鸭子类，公有方法名和功能写成完全一致，可以互相替换。
-        if self._concurrent_mode == ConcurrentModeEnum.THREADING:
+        if self._concurrent_mode in (ConcurrentModeEnum.THREADING, ConcurrentModeEnum.PROCESS):  # PROCESS 模式的线程只是等待工作进程的结果
             # pool_type = CustomThreadPoolExecutor
             # pool_type = BoundedThreadPoolExecutor
             pool_type = FlexibleThreadPool
@@ -1081,7 +1281,11 @@ class ConcurrentModeDispatcher(FunboostFileLoggerMixin):
         # pool_type = BoundedProcessPoolExecutor
         # from concurrent.futures import ProcessPoolExecutor
         # pool_type = ProcessPoolExecutor
-        if self._concurrent_mode == ConcurrentModeEnum.ASYNC:
+        if self._concurrent_mode == ConcurrentModeEnum.ASYNC and self.consumer.consumer_params.async_loop_num > 1:
+            from funboost.concurrent_pool.multi_loop_async_pool_executor import MultiLoopAsyncPoolExecutor
+            self.consumer._concurrent_pool = self.consumer.consumer_params.specify_concurrent_pool or MultiLoopAsyncPoolExecutor(
+                self.consumer.consumer_params.concurrent_num, loop_num=self.consumer.consumer_params.async_loop_num)
+        elif self._concurrent_mode == ConcurrentModeEnum.ASYNC:
             self.consumer._concurrent_pool = self.consumer.consumer_params.specify_concurrent_pool or pool_type(
                 self.consumer.consumer_params.concurrent_num, loop=self.consumer.consumer_params.specify_async_loop)
         else:
@@ -1110,9 +1314,48 @@ class ConcurrentModeDispatcher(FunboostFileLoggerMixin):
     #             g = eventlet.spawn(self.consumer.keep_circulating(1)(self.consumer._shedual_task), )
     #             ConsumersManager.schedulal_thread_to_be_join.append(g)
 
+    def build_process_worker_pool(self):
+        if self._process_worker_pool is None:
+            from funboost.concurrent_pool.process_worker_pool import ProcessWorkerPool
+            self._process_worker_pool = ProcessWorkerPool(self.consumer.queue_name, self.consumer.consumer_params.process_pool_worker_num)
+        return self._process_worker_pool
+
     def schedulal_task_with_no_block(self):
+        if (self._concurrent_mode == ConcurrentModeEnum.ASYNC
+                and type(self.consumer)._async_shedual_task is not AbstractConsumer._async_shedual_task
+                and hasattr(self.build_pool(), 'asubmit')):
+            asyncio.run_coroutine_threadsafe(self._run_async_shedual_task_forever(), self.build_pool().loop)
+            return
         self.consumer.keep_circulating(1, block=False, daemon=False)(self.consumer._shedual_task)()
 
+    async def _run_async_shedual_task_forever(self):
+        while True:  # 和 keep_circulating 一样，出错后间隔1秒重新运行
+            try:
+                await self.consumer._async_shedual_task()
+            except asyncio.CancelledError:  # 取消任务或者停止loop时候退出，不能当作出错重新运行
+                raise
+            except Exception as e:
+                self.consumer.logger.exception(f'{self.consumer.queue_name} 的 _async_shedual_task 出错 {type(e)} {e}')
+            await asyncio.sleep(1)
+
+
+def _get_consumer_to_run_in_current_process(queue_name: str, consumer_identification: str) -> AbstractConsumer:
+    consumer = funboost_lazy_impoter.BoostersManager.get_or_create_booster_by_queue_name(queue_name).consumer
+    if consumer.consumer_identification != consumer_identification:
+        # spawn 方式的子进程新建了消费者，要用拉取消息的消费者的标识，按标识命名的 unack zset/list 才是同一个。子进程不发送心跳，由拉取消息的进程发送。
+        consumer.consumer_identification = consumer_identification
+    consumer._prepare_run_without_consuming()
+    return consumer
+
+
+def _run_consumer_in_other_process(queue_name: str, consumer_identification: str, kw: dict):
+    """HybridProcessPool 作为 specify_concurrent_pool 时候，子进程中运行的函数，入参 kw 是拉取消息的进程中的消息。"""
+    return _get_consumer_to_run_in_current_process(queue_name, consumer_identification)._run(kw)
+
+
+async def _async_run_consumer_in_other_process(queue_name: str, consumer_identification: str, kw: dict):
+    return await _get_consumer_to_run_in_current_process(queue_name, consumer_identification)._async_run(kw)
+
 
 def wait_for_possible_has_finish_all_tasks_by_conusmer_list(consumer_list: typing.List[AbstractConsumer], minutes: int = 3):
     """
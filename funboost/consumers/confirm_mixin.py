@@ -46,7 +46,7 @@ class ConsumerConfirmMixinWithTheHelpOfRedis(RedisMixin):
                 time_max = time.time() - self.UNCONFIRMED_TIMEOUT
                 for value in self.redis_db_frame.zrangebyscore(self._unack_zset_name, 0, time_max):
                     self.logger.warning(f'向 {self._queue_name} 重新放入未消费确认的任务 {value}')
-                    self._requeue({'body': Serialization.to_dict(value)})
+                    self._requeue({'body': value})  # 原样放回，不解码，pickle5等编码的消息解码还需要消费者的serializer
                     self.redis_db_frame.zrem(self._unack_zset_name, value)
                 self.logger.info(f'{self._unack_zset_name} 中有待确认消费任务的数量是'
                                  f' {self.redis_db_frame.zcard(self._unack_zset_name)}')
@@ -61,10 +61,14 @@ class ConsumerConfirmMixinWithTheHelpOfRedisByHearbeat(ConsumerConfirmMixinWithT
 
     # noinspection PyAttributeOutsideInit
     def custom_init(self):
-        self._unack_zset_name = f'{self._queue_name}__unack_id_{self.consumer_identification}'
         self.consumer_params.is_send_consumer_hearbeat_to_redis = True
         self._last_show_unacked_msg_num_log = 0
 
+    @property
+    def _unack_zset_name(self):
+        # 每次按消费者标识生成，HybridProcessPool 的子进程使用拉取消息的父进程的标识，确认消费时候删除的是父进程的 unack zset 。
+        return f'{self._queue_name}__unack_id_{self.consumer_identification}'
+
     def _requeue_tasks_which_unconfirmed(self):
         lock_key = f'fsdf_lock__requeue_tasks_which_unconfirmed:{self._queue_name}'
         with decorators.RedisDistributedLockContextManager(self.redis_db_frame, lock_key, ).set_log_level(30) as lock:
@@ -59,6 +59,31 @@ class HTTPConsumer(AbstractConsumer, ):
         asyncio.set_event_loop(loop)
         AioHttpImporter().web.run_app(app, host='0.0.0.0', port=self._port, )
 
+    async def _async_shedual_task(self):
+        """ASYNC 并发模式下，aiohttp 服务直接运行在并发池的loop中，收到的消息 await 放入并发池，不阻塞接收请求。"""
+        routes = AioHttpImporter().web.RouteTableDef()
+
+        # noinspection PyUnusedLocal
+        @routes.get('/')
+        async def hello(request):
+            return AioHttpImporter().web.Response(text="Hello, from funboost")
+
+        @routes.post('/queue')
+        async def recv_msg(request: AioHttpImporter().Request):
+            data = await request.post()
+            await self._async_submit_tasks([{'body': data['msg']}])
+            return AioHttpImporter().web.Response(text="finish")
+
+        app = AioHttpImporter().web.Application()
+        app.add_routes(routes)
+        runner = AioHttpImporter().web.AppRunner(app)
+        await runner.setup()
+        try:
+            await AioHttpImporter().web.TCPSite(runner, host='0.0.0.0', port=self._port).start()
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
     def _confirm_consume(self, kw):
         pass  # 没有确认消费的功能。
 
@@ -68,4 +68,5 @@ class KafkaConsumer(AbstractConsumer):
         pass  # 使用kafka的自动commit模式。
 
     def _requeue(self, kw):
-        self._producer.send(self._queue_name, json.dumps(kw['body']).encode())
+        msg = self._get_msg_for_requeue(kw)
+        self._producer.send(self._queue_name, msg if isinstance(msg, bytes) else msg.encode())
@@ -27,6 +27,7 @@ class KafkaConsumerManuallyCommit(AbstractConsumer):
 
     可以让消费函数内部 sleep 60秒，突然停止消费代码，使用 kafka-consumer-groups.sh --bootstrap-server 127.0.0.1:9092 --describe --group frame_group 来证实自动确认消费和手动确认消费的区别。
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
 
     BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'group_id': 'funboost_confluent_kafka', 'auto_offset_reset': 'earliest'}
 
@@ -119,7 +120,8 @@ class KafkaConsumerManuallyCommit(AbstractConsumer):
             # print(self._partion__offset_consume_status_map)
 
     def _requeue(self, kw):
-        self._producer.send(self._queue_name, json.dumps(kw['body']).encode())
+        msg = self._get_msg_for_requeue(kw)
+        self._producer.send(self._queue_name, msg if isinstance(msg, bytes) else msg.encode())
 
 
 class SaslPlainKafkaConsumer(KafkaConsumerManuallyCommit):
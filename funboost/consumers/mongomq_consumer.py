@@ -11,6 +11,7 @@ class MongoMqConsumer(AbstractConsumer, MongoMixin):
     """
     Mongo queue包实现的基于mongo的消息队列，支持消费确认。
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
 
 
     def _shedual_task(self):
@@ -18,6 +18,7 @@ class NsqConsumer(AbstractConsumer):
     """
     nsq作为中间件实现的。
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
 
 
     def _shedual_task(self):
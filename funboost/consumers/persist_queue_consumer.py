@@ -11,6 +11,7 @@ class PersistQueueConsumer(AbstractConsumer):
     """
     persist queue包实现的本地持久化消息队列。
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
 
     def _shedual_task(self):
         pub = PersistQueuePublisher(publisher_params=PublisherParams(queue_name=self.queue_name))
@@ -31,6 +31,7 @@ class PulsarConsumer(AbstractConsumer, ):
     """
     pulsar作为中间件实现的。
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
 
     BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'subscription_name': 'funboost_group',
                                        'replicate_subscription_state_enabled': True,
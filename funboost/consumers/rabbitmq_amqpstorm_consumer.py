@@ -14,7 +14,10 @@ class RabbitmqConsumerAmqpStorm(AbstractConsumer):
     使用AmqpStorm实现的，多线程安全的，不用加锁。
     funboost 强烈推荐使用这个做消息队列中间件。
     """
-    BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'x-max-priority': None}  # x-max-priority 是 rabbitmq的优先级队列配置，必须为整数，强烈建议要小于5。为None就代表队列不支持优先级。
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
+    BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'x-max-priority': None,  # x-max-priority 是 rabbitmq的优先级队列配置，必须为整数，强烈建议要小于5。为None就代表队列不支持优先级。
+                                       'publisher_connection_num': 1, 'publisher_channel_num': 8,  # 发布者channel池的连接数量和channel数量，channel平均分布在连接上。
+                                       }
 
     def _shedual_task(self):
         # noinspection PyTypeChecker
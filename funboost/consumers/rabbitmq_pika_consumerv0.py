@@ -20,6 +20,7 @@ class RabbitmqConsumer(AbstractConsumer):
     """
     使用pika包实现的。
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
 
 
     # noinspection PyAttributeOutsideInit
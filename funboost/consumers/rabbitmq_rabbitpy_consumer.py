@@ -12,6 +12,7 @@ class RabbitmqConsumerRabbitpy(AbstractConsumer):
     """
     使用rabbitpy实现的
     """
+    IS_ACK_BOUND_TO_CONSUMER_INSTANCE = True
     def custom_init(self):
         raise Exception('不建议使用这个中间件模式，建议使用 BrokerEnum.RABBITMQ_AMQPSTORM 操作rabbitmq')
 
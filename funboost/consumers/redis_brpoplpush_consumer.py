@@ -34,7 +34,7 @@ class RedisBrpopLpushConsumer(AbstractConsumer, RedisMixin):
         self.redis_db_frame.lrem(f'unack_{self._queue_name}_{self.consumer_identification}',count=1,value= kw['raw_msg'], )
 
     def _requeue(self, kw):
-        self.redis_db_frame.lpush(self._queue_name, json.dumps(kw['body']))
+        self.redis_db_frame.lpush(self._queue_name, self._get_msg_for_requeue(kw))
 
     def _requeue_tasks_which_unconfirmed(self):
         lock_key = f'fsdf_lock__requeue_tasks_which_unconfirmed:{self._queue_name}'
@@ -20,7 +20,9 @@ class RedisConsumer(AbstractConsumer, RedisMixin):
     这个是复杂版，一次性拉取100个,减少和redis的交互，简单版在 funboost/consumers/redis_consumer_simple.py
     """
 
-    BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'redis_bulk_push':1,'pull_msg_batch_size':100}   #redis_bulk_push 是否redis批量推送
+    BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'redis_bulk_push':1,'pull_msg_batch_size':100,   #redis_bulk_push 是否redis批量推送
+                                       # 批量推送时候，满足 条数 字节数 最大等待秒数 任意一个条件就推送一批。
+                                       'redis_bulk_push_max_msg_num': 1000, 'redis_bulk_push_max_bytes': 1024 * 1024, 'redis_bulk_push_max_latency': 0.002}
 
     # noinspection DuplicatedCode
     def _shedual_task(self):
@@ -35,9 +37,7 @@ class RedisConsumer(AbstractConsumer, RedisMixin):
             if task_str_list:
                 # self.logger.debug(f'从redis的 [{self._queue_name}] 队列中 取出的消息是：  {task_str_list}  ')
                 self._print_message_get_from_broker( task_str_list)
-                for task_str in task_str_list:
-                    kw = {'body': task_str}
-                    self._submit_task(kw)
+                self._submit_tasks([{'body': task_str} for task_str in task_str_list])
             else:
                 result = self.redis_db_frame.brpop(self._queue_name, timeout=60)
                 if result:
@@ -57,4 +57,4 @@ class RedisConsumer(AbstractConsumer, RedisMixin):
         pass  # redis没有确认消费的功能。
 
     def _requeue(self, kw):
-        self.redis_db_frame.rpush(self._queue_name,Serialization.to_json_str(kw['body']))
+        self.redis_db_frame.rpush(self._queue_name, self._get_msg_for_requeue(kw))
@@ -36,7 +36,7 @@ class RedisConsumerAckAble000(ConsumerConfirmMixinWithTheHelpOfRedis, AbstractCo
                 self._submit_task(kw)
 
     def _requeue(self, kw):
-        self.redis_db_frame.rpush(self._queue_name, json.dumps(kw['body']))
+        self.redis_db_frame.rpush(self._queue_name, self._get_msg_for_requeue(kw))
 
 
 @deprecated(version='1.0', reason="This class not used")
@@ -79,7 +79,7 @@ class RedisConsumerAckAble111(ConsumerConfirmMixinWithTheHelpOfRedis, AbstractCo
                 time.sleep(0.1)
 
     def _requeue(self, kw):
-        self.redis_db_frame.rpush(self._queue_name, json.dumps(kw['body']))
+        self.redis_db_frame.rpush(self._queue_name, self._get_msg_for_requeue(kw))
 
 
 class RedisConsumerAckAble(ConsumerConfirmMixinWithTheHelpOfRedisByHearbeat, AbstractConsumer, ):
@@ -126,7 +126,7 @@ class RedisConsumerAckAble(ConsumerConfirmMixinWithTheHelpOfRedisByHearbeat, Abs
         pull_msg_batch_size = self.consumer_params.broker_exclusive_config['pull_msg_batch_size']
         lua = f'''
                      local task_list = redis.call("lrange", KEYS[1],0,{pull_msg_batch_size-1})
-                     redis.call("ltrim", KEYS[1],100,-1)
+                     redis.call("ltrim", KEYS[1],{pull_msg_batch_size},-1)
                      if (#task_list > 0) then
                         for task_index,task_value in ipairs(task_list)
                         do
@@ -149,11 +149,9 @@ class RedisConsumerAckAble(ConsumerConfirmMixinWithTheHelpOfRedisByHearbeat, Abs
             if task_str_list:
                 self._print_message_get_from_broker( task_str_list)
                 # self.logger.debug(f'从redis的 [{self._queue_name}] 队列中 取出的消息是：  {task_str_list}  ')
-                for task_str in task_str_list:
-                    kw = {'body': task_str, 'task_str': task_str}
-                    self._submit_task(kw)
+                self._submit_tasks([{'body': task_str, 'task_str': task_str} for task_str in task_str_list])
             else:
                 time.sleep(0.2)
 
     def _requeue(self, kw):
-        self.redis_db_frame.rpush(self._queue_name, json.dumps(kw['body']))
+        self.redis_db_frame.rpush(self._queue_name, self._get_msg_for_requeue(kw))
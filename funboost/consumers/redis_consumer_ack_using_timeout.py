@@ -40,7 +40,7 @@ class RedisConsumerAckUsingTimeout(AbstractConsumer, RedisMixin):
         self.redis_db_frame.zrem(self._unack_zset_name, kw['task_str'])
 
     def _requeue(self, kw):
-        self.redis_db_frame.rpush(self._queue_name, Serialization.to_json_str(kw['body']))
+        self.redis_db_frame.rpush(self._queue_name, self._get_msg_for_requeue(kw))
 
     def _shedual_task(self):
         lua = '''
@@ -50,7 +50,9 @@ class RedisPriorityConsumer(RedisConsumerAckAble):
         f.consume()
     """
 
-    BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'x-max-priority': None}  # x-max-priority 是 rabbitmq的优先级队列配置，必须为整数，强烈建议要小于5。为None就代表队列不支持优先级。
+    BROKER_EXCLUSIVE_CONFIG_DEFAULT = {'x-max-priority': None,  # x-max-priority 是 rabbitmq的优先级队列配置，必须为整数，强烈建议要小于5。为None就代表队列不支持优先级。
+                                       'pull_msg_batch_size': 100,  # 每次最多拉取多少条消息，对优先级实时性要求很高时候可以设置小一些，已经拉取到本地的消息不会被之后发布的更高优先级消息插队。
+                                       }
 
     def _shedual_task0000(self):
 
@@ -66,7 +68,48 @@ class RedisPriorityConsumer(RedisConsumerAckAble):
                 self._submit_task(kw)
 
     def _shedual_task(self):
-        """https://redis.readthedocs.io/en/latest/advanced_features.html#default-pipelines """
+        """
+        lua脚本原子性的按优先级从高到低从多个子队列批量取出消息并放入unack的zset，一次网络交互取一批，
+        不再使用watch乐观事务，多个消费者之间不会因为 WatchError 反复重试。
+        """
+        pull_msg_batch_size = self.consumer_params.broker_exclusive_config['pull_msg_batch_size']
+        lua = '''
+            local batch_size = tonumber(ARGV[2])
+            local unack_zset_name = KEYS[#KEYS]
+            local task_list = {}
+            for i = 1, #KEYS - 1 do
+                local remain_size = batch_size - #task_list
+                if remain_size <= 0 then
+                    break
+                end
+                local queue_task_list = redis.call("lrange", KEYS[i], 0, remain_size - 1)
+                if #queue_task_list > 0 then
+                    redis.call("ltrim", KEYS[i], #queue_task_list, -1)
+                    for _, task_value in ipairs(queue_task_list) do
+                        redis.call("zadd", unack_zset_name, ARGV[1], task_value)
+                        table.insert(task_list, task_value)
+                    end
+                end
+            end
+            return task_list
+        '''
+        script = self.redis_db_frame.register_script(lua)
+        keys = [*self.publisher_of_same_queue.queue_list, self._unack_zset_name]  # queue_list 是优先级从高到低排好序的
+        sleep_time = 0.01
+        while True:
+            task_str_list = script(keys=keys, args=[time.time(), pull_msg_batch_size])
+            if task_str_list:
+                sleep_time = 0.01
+                self._print_message_get_from_broker(task_str_list)
+                self._submit_tasks([{'body': task_str, 'task_str': task_str} for task_str in task_str_list])
+            else:
+                time.sleep(sleep_time)  # lua脚本中不能使用blpop，没有消息时候逐渐加大等待时间，有消息后立即恢复。
+                sleep_time = min(sleep_time * 2, 0.2)
+
+    def _shedual_task_by_watch(self):
+        """
+        旧的实现，watch + blpop + multi，每次乐观事务只能取一条消息，多个消费者竞争时候 WatchError 反复重试。
+        https://redis.readthedocs.io/en/latest/advanced_features.html#default-pipelines """
         while True:
             # task_str_list = script(keys=[queues_str, self._unack_zset_name], args=[time.time()])
             while True:
@@ -25,6 +25,6 @@ class RedisConsumer(AbstractConsumer, RedisMixin):
         pass  # redis没有确认消费的功能。
 
     def _requeue(self, kw):
-        self.redis_db_frame.rpush(self._queue_name, Serialization.to_json_str(kw['body']))
+        self.redis_db_frame.rpush(self._queue_name, self._get_msg_for_requeue(kw))
 
 
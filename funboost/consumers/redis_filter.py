@@ -7,12 +7,13 @@
 """
 
 import json
+import threading
 import time
-from collections import OrderedDict
 import typing
 
 from funboost.core.serialization import Serialization
 from funboost.utils import  decorators
+from funboost.utils.bloom_filter import BloomFilter
 from funboost.core.loggers import FunboostFileLoggerMixin
 
 from funboost.utils.redis_manager import RedisMixin
@@ -34,22 +35,42 @@ class RedisFilter(RedisMixin, FunboostFileLoggerMixin):
 
     @staticmethod
     def _get_ordered_str(value):
-        """对json的键值对在redis中进行过滤，需要先把键值对排序，否则过滤会不准确如 {"a":1,"b":2} 和 {"b":2,"a":1}"""
+        """对json的键值对在redis中进行过滤，需要先把键值对排序，否则过滤会不准确如 {"a":1,"b":2} 和 {"b":2,"a":1}
+        python3.7以后dict本身是有序的，不需要OrderedDict。生成的字符串格式不能改变，否则redis中已存在的过滤记录会失效。
+        """
         value = Serialization.to_dict(value)
-        ordered_dict = OrderedDict()
-        for k in sorted(value):
-            ordered_dict[k] = value[k]
-        return json.dumps(ordered_dict)
+        return json.dumps({k: value[k] for k in sorted(value)})
 
     def add_a_value(self, value: typing.Union[str, dict]):
         self.redis_db_filter_and_rpc_result.sadd(self._redis_key_name, self._get_ordered_str(value))
 
+    def add_values(self, values: typing.List[typing.Union[str, dict]]):
+        """批量添加，一次redis交互"""
+        self._add_value_strs([self._get_ordered_str(value) for value in values])
+
+    def _add_value_strs(self, value_strs: typing.List[str]):
+        """入参是已经 _get_ordered_str 过的字符串"""
+        if value_strs:
+            self.redis_db_filter_and_rpc_result.sadd(self._redis_key_name, *value_strs)
+
     def manual_delete_a_value(self, value: typing.Union[str, dict]):
         self.redis_db_filter_and_rpc_result.srem(self._redis_key_name, self._get_ordered_str(value))
 
     def check_value_exists(self, value):
         return self.redis_db_filter_and_rpc_result.sismember(self._redis_key_name, self._get_ordered_str(value))
 
+    def check_values_exist(self, values: typing.List[typing.Union[str, dict]]) -> typing.List[bool]:
+        """批量检查，一次redis交互，返回的列表和 values 一一对应。使用pipeline而不是 smismember，是为了兼容6.2版本以下的redis服务端。"""
+        return self._check_value_strs_exist([self._get_ordered_str(value) for value in values])
+
+    def _check_value_strs_exist(self, value_strs: typing.List[str]) -> typing.List[bool]:
+        if not value_strs:
+            return []
+        with self.redis_db_filter_and_rpc_result.pipeline(transaction=False) as p:
+            for value_str in value_strs:
+                p.sismember(self._redis_key_name, value_str)
+            return [bool(r) for r in p.execute()]
+
     def delete_expire_filter_task_cycle(self):
         pass
 
@@ -64,6 +85,11 @@ class RedisImpermanencyFilter(RedisFilter):
     def add_a_value(self, value: typing.Union[str, dict]):
         self.redis_db_filter_and_rpc_result.zadd(self._redis_key_name, {self._get_ordered_str(value):time.time()})
 
+    def _add_value_strs(self, value_strs: typing.List[str]):
+        if value_strs:
+            now = time.time()
+            self.redis_db_filter_and_rpc_result.zadd(self._redis_key_name, {value_str: now for value_str in value_strs})
+
     def manual_delete_a_value(self, value: typing.Union[str, dict]):
         self.redis_db_filter_and_rpc_result.zrem(self._redis_key_name, self._get_ordered_str(value))
 
@@ -71,6 +97,14 @@ class RedisImpermanencyFilter(RedisFilter):
         # print(self.redis_db_filter_and_rpc_result.zrank(self._redis_key_name, self._get_ordered_str(value)))
         return False if self.redis_db_filter_and_rpc_result.zrank(self._redis_key_name, self._get_ordered_str(value)) is None else True
 
+    def _check_value_strs_exist(self, value_strs: typing.List[str]) -> typing.List[bool]:
+        if not value_strs:
+            return []
+        with self.redis_db_filter_and_rpc_result.pipeline(transaction=False) as p:
+            for value_str in value_strs:
+                p.zscore(self._redis_key_name, value_str)
+            return [r is not None for r in p.execute()]
+
     @decorators.keep_circulating(60, block=False)
     def delete_expire_filter_task_cycle000(self):
         """
@@ -116,11 +150,27 @@ class RedisImpermanencyFilterUsingRedisKey(RedisFilter):
         self.redis_db_filter_and_rpc_result.set(redis_key, 1)
         self.redis_db_filter_and_rpc_result.expire(redis_key, self._redis_filter_task_expire_seconds)
 
+    def _add_value_strs(self, value_strs: typing.List[str]):
+        if not value_strs:
+            return
+        with self.redis_db_filter_and_rpc_result.pipeline(transaction=False) as p:
+            for value_str in value_strs:
+                p.set(self.__add_dir_prefix(value_str), 1, ex=self._redis_filter_task_expire_seconds)
+            p.execute()
+
     def manual_delete_a_value(self, value: typing.Union[str, dict]):
         self.redis_db_filter_and_rpc_result.delete(self.__add_dir_prefix(self._get_ordered_str(value)))
 
     def check_value_exists(self, value):
-        return True if self.redis_db_filter_and_rpc_result.exists(self.__add_dir_prefix(self._get_ordered_str(value))) else True
+        return True if self.redis_db_filter_and_rpc_result.exists(self.__add_dir_prefix(self._get_ordered_str(value))) else False
+
+    def _check_value_strs_exist(self, value_strs: typing.List[str]) -> typing.List[bool]:
+        if not value_strs:
+            return []
+        with self.redis_db_filter_and_rpc_result.pipeline(transaction=False) as p:
+            for value_str in value_strs:
+                p.exists(self.__add_dir_prefix(value_str))
+            return [bool(r) for r in p.execute()]
 
     def delete_expire_filter_task_cycle(self):
         """
@@ -130,6 +180,112 @@ class RedisImpermanencyFilterUsingRedisKey(RedisFilter):
         pass
 
 
+class BloomFilterFrontCacheMixin:
+    """
+    在redis过滤前面加一层进程内的布隆过滤器。
+    布隆过滤器判断不存在的任务一定没执行过，直接返回不存在，不再访问redis；判断可能存在的，才去redis精确确认。
+    对于绝大部分都是新任务的去重场景，几乎所有的redis判重交互都可以省掉。
+
+    后台线程启动时候和每隔 BLOOM_SYNC_INTERVAL 秒从redis全量同步一次，以便得知其他进程/机器执行过的任务，
+    所以其他机器刚执行完的任务，在一个同步周期内有可能不会被当前进程过滤掉。需要严格去重的不要开启。
+    首次同步完成之前，所有判断都直接走redis。
+
+    有过期时间的过滤不需要使用支持删除的布隆过滤器，已经过期的任务在布隆过滤器中只会造成"可能存在"，
+    然后去redis精确确认，结果仍然正确，下一次全量同步重建时候就会去掉。
+    """
+    BLOOM_SYNC_INTERVAL = 60
+    BLOOM_MIN_CAPACITY = 100000
+    BLOOM_ERROR_RATE = 0.001
+
+    def __init__(self, redis_key_name, redis_filter_task_expire_seconds):
+        super().__init__(redis_key_name, redis_filter_task_expire_seconds)
+        self._bloom = BloomFilter(self.BLOOM_MIN_CAPACITY, self.BLOOM_ERROR_RATE)
+        self._bloom_is_ready = False
+        self._bloom_is_syncing = False
+        self._bloom_values_added_during_sync = []
+        self._lock_for_bloom = threading.Lock()
+        self._has_start_bloom_sync_cycle = False
+
+    def _get_redis_values_num(self) -> int:
+        raise NotImplementedError
+
+    def _scan_redis_values(self) -> typing.Iterable[str]:
+        raise NotImplementedError
+
+    def start_bloom_sync_cycle(self):
+        if not self._has_start_bloom_sync_cycle:
+            self._has_start_bloom_sync_cycle = True
+            decorators.keep_circulating(self.BLOOM_SYNC_INTERVAL, block=False, daemon=True)(self._sync_bloom_from_redis)()
+
+    def _sync_bloom_from_redis(self):
+        with self._lock_for_bloom:
+            self._bloom_is_syncing = True
+            self._bloom_values_added_during_sync = []
+        try:
+            bloom = BloomFilter(max(self._get_redis_values_num() * 2, self.BLOOM_MIN_CAPACITY), self.BLOOM_ERROR_RATE)
+            for value_str in self._scan_redis_values():
+                bloom.add(value_str)
+            with self._lock_for_bloom:
+                for value_str in self._bloom_values_added_during_sync:  # 同步过程中当前进程新添加的，补进新的布隆过滤器
+                    bloom.add(value_str)
+                self._bloom = bloom
+                self._bloom_is_ready = True
+            self.logger.debug(f'从redis的 {self._redis_key_name} 键同步了 {len(bloom)} 个过滤任务到本地布隆过滤器')
+        finally:
+            with self._lock_for_bloom:
+                self._bloom_is_syncing = False
+                self._bloom_values_added_during_sync = []
+
+    def _add_to_bloom(self, value_str_list: typing.List[str]):
+        with self._lock_for_bloom:
+            for value_str in value_str_list:
+                self._bloom.add(value_str)
+            if self._bloom_is_syncing:
+                self._bloom_values_added_during_sync.extend(value_str_list)
+
+    def add_a_value(self, value: typing.Union[str, dict]):
+        self._add_value_strs([self._get_ordered_str(value)])
+
+    def _add_value_strs(self, value_strs: typing.List[str]):
+        super()._add_value_strs(value_strs)
+        self._add_to_bloom(value_strs)
+
+    def check_value_exists(self, value):
+        return self.check_values_exist([value])[0]
+
+    def _check_value_strs_exist(self, value_strs: typing.List[str]) -> typing.List[bool]:
+        if not self._bloom_is_ready:
+            return super()._check_value_strs_exist(value_strs)
+        bloom = self._bloom
+        results = [False] * len(value_strs)
+        maybe_exists_indexes = [i for i, value_str in enumerate(value_strs) if value_str in bloom]
+        if maybe_exists_indexes:
+            redis_results = super()._check_value_strs_exist([value_strs[i] for i in maybe_exists_indexes])
+            for i, exists in zip(maybe_exists_indexes, redis_results):
+                results[i] = exists
+        return results
+
+
+class RedisFilterWithBloom(BloomFilterFrontCacheMixin, RedisFilter):
+    """永久性过滤 + 本地布隆过滤器"""
+
+    def _get_redis_values_num(self) -> int:
+        return self.redis_db_filter_and_rpc_result.scard(self._redis_key_name)
+
+    def _scan_redis_values(self) -> typing.Iterable[str]:
+        return self.redis_db_filter_and_rpc_result.sscan_iter(self._redis_key_name, count=5000)
+
+
+class RedisImpermanencyFilterWithBloom(BloomFilterFrontCacheMixin, RedisImpermanencyFilter):
+    """有过期时间的过滤 + 本地布隆过滤器"""
+
+    def _get_redis_values_num(self) -> int:
+        return self.redis_db_filter_and_rpc_result.zcard(self._redis_key_name)
+
+    def _scan_redis_values(self) -> typing.Iterable[str]:
+        return (value for value, _ in self.redis_db_filter_and_rpc_result.zscan_iter(self._redis_key_name, count=5000))
+
+
 if __name__ == '__main__':
     # filter = RedisFilter('filter_set:abcdefgh', 120)
     params_filter = RedisImpermanencyFilter('filter_zset:abcdef', 120)
@@ -47,9 +47,7 @@ class RedisStreamConsumer(AbstractConsumer, RedisMixin):
                 # self.logger.debug(f'从redis的 [{self._queue_name}] stream 中 取出的消息是：  {results}  ')
                 self._print_message_get_from_broker( results)
                 # print(results[0][1])
-                for msg_id, msg in results[0][1]:
-                    kw = {'body': msg[''], 'msg_id': msg_id}
-                    self._submit_task(kw)
+                self._submit_tasks([{'body': msg[''], 'msg_id': msg_id} for msg_id, msg in results[0][1]])
 
     def _confirm_consume(self, kw):
         # self.redis_db_frame.xack(self._queue_name, 'distributed_frame_group', kw['msg_id'])
@@ -61,7 +59,7 @@ class RedisStreamConsumer(AbstractConsumer, RedisMixin):
 
     def _requeue(self, kw):
         self.redis_db_frame.xack(self._queue_name, self.group, kw['msg_id'])
-        self.redis_db_frame.xadd(self._queue_name, {'': json.dumps(kw['body'])})
+        self.redis_db_frame.xadd(self._queue_name, {'': self._get_msg_for_requeue(kw)})
         # print(self.redis_db_frame.xclaim(self._queue_name,
         #                                     'distributed_frame_group', self.consumer_identification,
         #                                     min_idle_time=0, message_ids=[kw['msg_id']]))
@@ -40,5 +40,6 @@ class UDPConsumer(AbstractConsumer, ):
         pass  # 没有确认消费的功能。
 
     def _requeue(self, kw):
-        self.__udp_client.send(json.dumps(kw['body']).encode())
+        msg = self._get_msg_for_requeue(kw)
+        self.__udp_client.send(msg if isinstance(msg, bytes) else msg.encode())
         data = self.__udp_client.recv(self.BUFSIZE)
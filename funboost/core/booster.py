@@ -113,6 +113,8 @@ class Booster:
             # self.push = self.delay = consumer.publisher_of_same_queue.push
             self.publish = self.pub = self.apply_async = self._safe_publish
             self.push = self.delay = self._safe_push
+            self.publish_many = self._safe_publish_many
+            self.push_many = self._safe_push_many
 
             self.clear = self.clear_queue = consumer.publisher_of_same_queue.clear
             self.get_message_count = consumer.publisher_of_same_queue.get_message_count
@@ -141,16 +143,38 @@ class Booster:
         consumer = BoostersManager.get_or_create_booster_by_queue_name(self.queue_name).consumer
         return consumer.publisher_of_same_queue.publish(msg=msg, task_id=task_id, priority_control_config=priority_control_config)
 
+    def _safe_publish_many(self, msgs: typing.Iterable[typing.Union[str, dict]], priority_control_config: PriorityConsumingControlConfig = None,
+                           batch_size: int = 1000) -> int:
+        """ 批量发布,见 AbstractPublisher.publish_many"""
+        consumer = BoostersManager.get_or_create_booster_by_queue_name(self.queue_name).consumer
+        return consumer.publisher_of_same_queue.publish_many(msgs, priority_control_config=priority_control_config, batch_size=batch_size)
+
+    def _safe_push_many(self, args_iter: typing.Iterable, batch_size: int = 1000) -> int:
+        """ 批量push,见 AbstractPublisher.push_many ,例如 add.push_many((i, i * 2) for i in range(10000000))"""
+        consumer = BoostersManager.get_or_create_booster_by_queue_name(self.queue_name).consumer
+        return consumer.publisher_of_same_queue.push_many(args_iter, batch_size=batch_size)
+
+    def _get_aio_publisher(self):
+        from funboost.factories.publisher_factotry import get_aio_publisher
+        consumer = BoostersManager.get_or_create_booster_by_queue_name(self.queue_name).consumer
+        return get_aio_publisher(consumer.publisher_of_same_queue)
+
     async def aio_push(self, *func_args, **func_kwargs) -> AioAsyncResult:
-        """asyncio 生态下发布消息,因为同步push只需要消耗不到1毫秒,所以基本上大概可以直接在asyncio异步生态中直接调用同步的push方法,
-        但为了更好的防止网络波动(例如发布消息到外网的消息队列耗时达到10毫秒),可以使用aio_push"""
+        """asyncio 生态下发布消息,redis rabbitmq(amqpstorm) http 中间件使用asyncio原生的发布者,不经过线程池,
+        其他中间件仍然使用 run_in_executor 在线程池中调用同步的push方法"""
+        aio_publisher = self._get_aio_publisher()
+        if aio_publisher is not None:
+            return await aio_publisher.push(*func_args, **func_kwargs)
         async_result = await simple_run_in_executor(self.push, *func_args, **func_kwargs)
         return AioAsyncResult(async_result.task_id, )
 
     async def aio_publish(self, msg: typing.Union[str, dict], task_id=None,
                       priority_control_config: PriorityConsumingControlConfig = None) -> AioAsyncResult:
-        """asyncio 生态下发布消息,因为同步push只需要消耗不到1毫秒,所以基本上大概可以直接在asyncio异步生态中直接调用同步的push方法,
-        但为了更好的防止网络波动(例如发布消息到外网的消息队列耗时达到10毫秒),可以使用aio_push"""
+        """asyncio 生态下发布消息,redis rabbitmq(amqpstorm) http 中间件使用asyncio原生的发布者,不经过线程池,
+        其他中间件仍然使用 run_in_executor 在线程池中调用同步的publish方法"""
+        aio_publisher = self._get_aio_publisher()
+        if aio_publisher is not None:
+            return await aio_publisher.publish(msg, task_id, priority_control_config)
         async_result = await simple_run_in_executor(self.publish,msg,task_id,priority_control_config)
         return AioAsyncResult(async_result.task_id, )
 
@@ -177,6 +201,15 @@ class Booster:
         from funboost.core.muliti_process_enhance import multi_process_pub_params_list
         multi_process_pub_params_list(self, params_list, process_num)
 
+    def multi_process_pub_params_stream(self, source, process_num=16, chunk_size=5000, batch_size=1000) -> int:
+        """
+        流式的超高速多进程发布，source 可以是消息字典的生成器，也可以是每行一个json的jsonl文件路径，
+        父进程边读边分块发给子进程，子进程批量发布，发布几千万消息也不需要全部放在内存中。
+        例如 f.multi_process_pub_params_stream(({'x': i, 'y': i * 3} for i in range(50000000)), process_num=20)
+        """
+        from funboost.core.muliti_process_enhance import multi_process_pub_params_stream
+        return multi_process_pub_params_stream(self, source, process_num, chunk_size=chunk_size, batch_size=batch_size)
+
     # noinspection PyDefaultArgument
     # noinspection PyMethodMayBeStatic
     def fabric_deploy(self, host, port, user, password,
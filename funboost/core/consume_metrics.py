@@ -0,0 +1,92 @@
+"""
+消费者单位时间内执行次数和函数耗时的统计。
+
+以前每个任务结束时候都要抢同一把锁，并且在锁里面多次 time.time()，到了统计周期还会在锁里同步查询中间件的消息数量，
+线程数量很多时候锁竞争严重，查询消息数量慢的时候，这一时刻结束的所有任务都会卡住。
+
+现在每个线程只写自己的计数器(只有一个写者，不需要锁)，由后台线程定时汇总计算增量，工作线程只是做几次加法。
+"""
+import threading
+import time
+import typing
+
+
+class _ThreadMetricsCounter:
+    __slots__ = ('execute_times', 'cost_time_total', 'last_execute_task_time', 'thread',
+                 'reported_execute_times', 'reported_cost_time_total')
+
+    def __init__(self, thread: threading.Thread):
+        self.execute_times = 0
+        self.cost_time_total = 0.0
+        self.last_execute_task_time = 0.0
+        self.thread = thread
+        # 下面两个只有汇总线程读写
+        self.reported_execute_times = 0
+        self.reported_cost_time_total = 0.0
+
+
+class ConsumeMetricsAccumulator:
+    def __init__(self):
+        self._thread_local = threading.local()
+        self._counters = []  # type: typing.List[_ThreadMetricsCounter]
+        self._lock_for_register = threading.Lock()  # 只有每个线程第一次记录时候才会用到这个锁。
+
+    def _register_counter(self) -> _ThreadMetricsCounter:
+        counter = _ThreadMetricsCounter(threading.current_thread())
+        with self._lock_for_register:
+            self._counters.append(counter)
+        self._thread_local.counter = counter
+        return counter
+
+    def record(self, cost_time: float, end_time: float):
+        """工作线程每执行完一个任务调用一次"""
+        counter = getattr(self._thread_local, 'counter', None)
+        if counter is None:
+            counter = self._register_counter()
+        counter.cost_time_total += cost_time
+        counter.last_execute_task_time = end_time
+        counter.execute_times += 1  # 最后加次数，汇总线程看到的次数不会多于已经累加的耗时。
+
+    def collect(self) -> typing.Tuple[int, float, float]:
+        """
+        汇总线程调用，返回上次汇总以来的 (执行次数, 函数总耗时, 最近一次执行任务的时间)。
+        只能由一个线程调用。
+        """
+        execute_times = 0
+        cost_time_total = 0.0
+        last_execute_task_time = 0.0
+        with self._lock_for_register:
+            counters = list(self._counters)
+        dead_counters = []
+        for counter in counters:
+            counter_execute_times = counter.execute_times
+            counter_cost_time_total = counter.cost_time_total
+            execute_times += counter_execute_times - counter.reported_execute_times
+            cost_time_total += counter_cost_time_total - counter.reported_cost_time_total
+            counter.reported_execute_times = counter_execute_times
+            counter.reported_cost_time_total = counter_cost_time_total
+            last_execute_task_time = max(last_execute_task_time, counter.last_execute_task_time)
+            if not counter.thread.is_alive():  # 线程池缩容退出的线程，数据已经汇总完了，不再需要它的计数器。
+                dead_counters.append(counter)
+        if dead_counters:
+            with self._lock_for_register:
+                for counter in dead_counters:
+                    self._counters.remove(counter)
+        return execute_times, cost_time_total, last_execute_task_time
+
+
+if __name__ == '__main__':
+    accumulator = ConsumeMetricsAccumulator()
+
+
+    def f():
+        for _ in range(100000):
+            t = time.time()
+            accumulator.record(0.001, t)
+
+
+    t1 = time.time()
+    threads = [threading.Thread(target=f) for _ in range(10)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    print(time.time() - t1, accumulator.collect(), accumulator.collect())
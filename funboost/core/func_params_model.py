@@ -7,7 +7,7 @@ import typing
 from collections import OrderedDict
 
 from funboost.concurrent_pool import FunboostBaseConcurrentPool, FlexibleThreadPool, ConcurrentPoolBuilder
-from funboost.constant import ConcurrentModeEnum, BrokerEnum
+from funboost.constant import ConcurrentModeEnum, BrokerEnum, RateLimiterKindEnum, SerializerEnum
 from pydantic import BaseModel, validator, root_validator, BaseConfig, Field
 
 from funboost.core.lazy_impoter import funboost_lazy_impoter
@@ -125,8 +125,10 @@ class BoosterParams(BaseJsonAbleModel):
     由于有很好用的qps控制运行频率和智能扩大缩小的线程池，此框架建议不需要理会和设置并发数量只需要关心qps就行了，框架的并发是自适应并发数量，这一点很强很好用。"""
     concurrent_mode: str = ConcurrentModeEnum.THREADING  # 并发模式,支持THREADING,GEVENT,EVENTLET,ASYNC,SINGLE_THREAD并发,multi_process_consume 支持协程/线程 叠加多进程并发,性能炸裂.
     concurrent_num: int = 50  # 并发数量，并发种类由concurrent_mode决定
-    specify_concurrent_pool: typing.Optional[FunboostBaseConcurrentPool] = None  # 使用指定的线程池/携程池，可以多个消费者共使用一个线程池,节约线程.不为None时候。threads_num失效
+    process_pool_worker_num: typing.Optional[int] = None  # concurrent_mode 为 ConcurrentModeEnum.PROCESS 时候的工作进程数量,None就是cpu核数. concurrent_num 仍然是同时在运行和排队等待工作进程的任务数量.
+    specify_concurrent_pool: typing.Optional[FunboostBaseConcurrentPool] = None  # 使用指定的线程池/携程池，可以多个消费者共使用一个线程池,节约线程.不为None时候。threads_num失效。HybridProcessPool 是多进程叠加线程池/asyncio池,函数在子进程中运行,rabbitmq kafka(手动commit)等要用拉取消息的连接确认消费的中间件不能使用
     specify_async_loop: asyncio.AbstractEventLoop = None  # 指定的async的loop循环，设置并发模式为async才能起作用。 有些包例如aiohttp,请求和httpclient的实例化不能处在两个不同的loop中,可以传过来.
+    async_loop_num: int = 1  # 并发模式为async时候的事件循环数量,大于1时候使用 MultiLoopAsyncPoolExecutor ,每个loop一个线程,concurrent_num 平均分给每个loop. 不能同时指定 specify_async_loop,和loop绑定的对象(例如aiohttp.ClientSession)要在每个loop中各自创建.
 
     """qps:
     强悍的控制功能,指定1秒内的函数执行次数，例如可以是小数0.01代表每100秒执行一次，也可以是50代表1秒执行50次.为None则不控频。 设置qps时候,不需要指定并发数量,funboost的能够自适应智能动态调节并发池大小."""
@@ -135,6 +137,8 @@ class BoosterParams(BaseJsonAbleModel):
     是否使用分布式空频（依赖redis统计消费者数量，然后频率平分），默认只对当前实例化的消费者空频有效。假如实例化了2个qps为10的使用同一队列名的消费者，并且都启动，则每秒运行次数会达到20。
     如果使用分布式空频则所有消费者加起来的总运行次数是10。"""
     is_using_distributed_frequency_control: bool = False
+    rate_limiter_kind: str = RateLimiterKindEnum.DEFAULT  # 控频使用的限流器, RateLimiterKindEnum.TOKEN_BUCKET 或 GCRA 在任何qps下都是匀速的,不会在每秒开头突发,适合下游接口对突发流量敏感的场景. RateLimiterKindEnum.REDIS_DISTRIBUTED_GCRA 是基于redis的分布式限流,qps是所有消费者加起来的全局qps,扩缩容时也准确.
+    rate_limiter_burst: int = 1  # 令牌桶和GCRA限流器允许的最大突发数量,为1则完全匀速.
 
     is_send_consumer_hearbeat_to_redis: bool = False  # 是否将发布者的心跳发送到redis，有些功能的实现需要统计活跃消费者。因为有的中间件不是真mq。这个功能,需要安装redis.
 
@@ -162,6 +166,7 @@ class BoosterParams(BaseJsonAbleModel):
 
     do_task_filtering: bool = False  # 是否对函数入参进行过滤去重.
     task_filtering_expire_seconds: int = 0  # 任务过滤的失效期，为0则永久性过滤任务。例如设置过滤过期时间是1800秒 ， 30分钟前发布过1 + 2 的任务，现在仍然执行，如果是30分钟以内执行过这个任务，则不执行1 + 2
+    task_filtering_use_local_bloom_filter: bool = False  # 任务过滤时候是否在redis前面加一层本地内存布隆过滤器,一定不存在的任务不再访问redis.本地布隆过滤器每60秒从redis全量同步一次,其他进程/机器添加的过滤值最长要60秒后才能在本地布隆过滤器中看到,这个窗口内它们执行过的任务不会被当前进程过滤,需要严格去重的不要开启.
 
     function_result_status_persistance_conf: FunctionResultStatusPersistanceConfig = FunctionResultStatusPersistanceConfig(
         is_save_result=False, is_save_status=False, expire_seconds=7 * 24 * 3600, is_use_bulk_insert=False)  # 是否保存函数的入参，运行结果和运行状态到mongodb。这一步用于后续的参数追溯，任务统计和web展示，需要安装mongo。
@@ -189,6 +194,9 @@ class BoosterParams(BaseJsonAbleModel):
     # 例如kafka支持消费者组，rabbitmq也支持各种独特概念例如各种ack机制 复杂路由机制，有的中间件原生能支持消息优先级有的中间件不支持,每一种消息队列都有独特的配置参数意义，可以通过这里传递。每种中间件能传递的键值对可以看consumer类的 BROKER_EXCLUSIVE_CONFIG_DEFAULT
 
     should_check_publish_func_params: bool = True  # 消息发布时候是否校验消息发布内容,比如有的人发布消息,函数只接受a,b两个入参,他去传2个入参,或者传参不存在的参数名字,  如果消费函数你非要写*args,**kwargs,那就需要关掉发布消息时候的函数入参检查
+    check_publish_func_params_type: bool = False  # 发布消息时候是否按消费函数入参的类型注解校验参数类型,在Booster创建时候生成一次pydantic校验模型,使用严格模式不做类型转换(例如注解是int,发布"1"会报错),默认不开启,开启后每条消息多一次pydantic校验.
+    serializer: str = SerializerEnum.JSON  # 消息序列化方式,见 SerializerEnum. 非json的消息带有编解码器帧头,消费者自动识别; 只能传字符串的中间件会转成base64文本发送. PICKLE5 只有消费者也设置为PICKLE5时候才会解码,中间件必须可信.
+    publish_local_spool_dir: typing.Optional[str] = None  # 发布消息的本地落盘缓冲目录,设置后publish只写入本地内存映射文件就返回,后台线程批量转发到中间件,中间件故障期间消息保存在磁盘上,恢复后自动补发.
 
     consumer_override_cls: typing.Optional[typing.Type] = None  # 使用 consumer_override_cls 和 publisher_override_cls 来自定义重写或新增消费者 发布者,见文档4.21b介绍，
     publisher_override_cls: typing.Optional[typing.Type] = None
@@ -215,6 +223,18 @@ class BoosterParams(BaseJsonAbleModel):
 
         if values['concurrent_mode'] not in ConcurrentModeEnum.__dict__.values():
             raise ValueError('设置的并发模式不正确')
+        if values['rate_limiter_kind'] not in RateLimiterKindEnum.__dict__.values():
+            raise ValueError('设置的限流器类型不正确')
+        if values['rate_limiter_burst'] < 1:
+            raise ValueError('rate_limiter_burst 必须大于等于1')
+        if values['serializer'] not in SerializerEnum.__dict__.values():
+            raise ValueError('设置的序列化方式不正确')
+        if values['concurrent_mode'] == ConcurrentModeEnum.PROCESS and values['process_pool_worker_num'] is not None and values['process_pool_worker_num'] < 1:
+            raise ValueError('process_pool_worker_num 必须大于等于1')
+        if values['async_loop_num'] < 1:
+            raise ValueError('async_loop_num 必须大于等于1')
+        if values['async_loop_num'] > 1 and values['specify_async_loop'] is not None:
+            raise ValueError('async_loop_num 大于1时候有多个loop，不能指定 specify_async_loop ，可以使用 specify_concurrent_pool=MultiLoopAsyncPoolExecutor(loops=[...]) 给每个loop分别指定')
         if values['broker_kind'] in [BrokerEnum.REDIS_ACK_ABLE, BrokerEnum.REDIS_STREAM, BrokerEnum.REDIS_PRIORITY, BrokerEnum.RedisBrpopLpush]:
             values['is_send_consumer_hearbeat_to_redis'] = True  # 需要心跳进程来辅助判断消息是否属于掉线或关闭的进程，需要重回队列
         # if not set(values.keys()).issubset(set(BoosterParams.__fields__.keys())):
@@ -303,6 +323,9 @@ class PublisherParams(BaseJsonAbleModel):
     broker_kind: str = None
     broker_exclusive_config: dict = {}
     should_check_publish_func_params: bool = True  # 消息发布时候是否校验消息发布内容,比如有的人发布消息,函数只接受a,b两个入参,他去传2个入参,或者传参不存在的参数名字,  如果消费函数你非要写*args,**kwargs,那就需要关掉发布消息时候的函数入参检查
+    check_publish_func_params_type: bool = False  # 发布消息时候是否按消费函数入参的类型注解校验参数类型,在Booster创建时候生成一次pydantic校验模型,使用严格模式不做类型转换(例如注解是int,发布"1"会报错),默认不开启,开启后每条消息多一次pydantic校验.
+    serializer: str = SerializerEnum.JSON
+    publish_local_spool_dir: typing.Optional[str] = None  # 发布消息的本地落盘缓冲目录,设置后publish只写入本地内存映射文件就返回,后台线程批量转发到中间件,中间件故障期间消息保存在磁盘上,恢复后自动补发.
     publisher_override_cls: typing.Optional[typing.Type] = None
     # func_params_is_pydantic_model: bool = False  # funboost 兼容支持 函数娼还是 pydantic model类型，funboost在发布之前和取出来时候自己转化。
 
@@ -26,6 +26,17 @@ class RunStatus:
     finish = 'finish'
 
 class FunctionResultStatus():
+    """
+    每条消息都会实例化一次，所以使用 __slots__ ，并且 params_str publish_time_str 等字符串化的字段，
+    以及 get_status_dict 的字典，都是在保存mongo、rpc、用户自定义记录函数等真正需要的时候才计算，
+    没有任何地方读取状态的队列，不需要付出序列化入参和格式化时间的开销。
+    """
+    __slots__ = ('queue_name', 'function', 'msg_dict', 'task_id', 'process_id', 'thread_id', 'publish_time',
+                 'params', 'result', 'run_times', 'exception', 'time_start', 'time_cost', 'time_end', 'success',
+                 'run_status', 'rpc_result_expire_seconds',
+                 '_params_str', '_publish_time_str', '_total_thread',
+                 '_has_requeue', '_has_to_dlx_queue', '_has_kill_task',)
+
     host_name = socket.gethostname()
 
     script_name_long = sys.argv[0]
@@ -33,21 +44,26 @@ class FunctionResultStatus():
 
     FUNC_RUN_ERROR = 'FUNC_RUN_ERROR'
 
-    def __init__(self, queue_name: str, fucntion_name: str, msg_dict: dict):
-        # print(params)
-        self.host_process = f'{self.host_name} - {os.getpid()}'
+    # get_status_dict 中按这个顺序输出的字段，和以前遍历 __dict__ 得到的字段一致。
+    _STATUS_DICT_FIELDS = ('host_process', 'queue_name', 'function', 'msg_dict', 'task_id', 'process_id', 'thread_id',
+                           'publish_time', 'publish_time_str', 'params', 'params_str', 'result', 'run_times', 'exception',
+                           'time_start', 'time_cost', 'time_end', 'success', 'run_status', 'total_thread',
+                           'rpc_result_expire_seconds',)
+
+    def __init__(self, queue_name: str, fucntion_name: str, msg_dict: dict, function_params: dict = None):
+        """
+        :param function_params: 已经从 msg_dict 拆分出来的函数入参，传了就不需要再拆分一次。
+        """
         self.queue_name = queue_name
         self.function = fucntion_name
         self.msg_dict = msg_dict
-        self.task_id = self.msg_dict.get('extra', {}).get('task_id', '')
+        self.task_id = msg_dict.get('extra', {}).get('task_id', '')
         self.process_id = os.getpid()
         self.thread_id = threading.get_ident()
-        self.publish_time = publish_time = get_publish_time(msg_dict)
-        if publish_time:
-            self.publish_time_str = time_util.DatetimeConverter(publish_time).datetime_str
-        function_params = delete_keys_and_return_new_dict(msg_dict, )
+        self.publish_time = get_publish_time(msg_dict)
+        if function_params is None:
+            function_params = delete_keys_and_return_new_dict(msg_dict, )
         self.params = function_params
-        self.params_str = Serialization.to_json_str(function_params)
         self.result = None
         self.run_times = 0
         self.exception = None
@@ -56,11 +72,35 @@ class FunctionResultStatus():
         self.time_end = None
         self.success = False
         self.run_status = ''
-        self.total_thread = threading.active_count()
+        self.rpc_result_expire_seconds = None
+        self._params_str = None
+        self._publish_time_str = None
+        self._total_thread = None
         self._has_requeue = False
         self._has_to_dlx_queue = False
         self._has_kill_task = False
-        self.rpc_result_expire_seconds = None
+
+    @property
+    def host_process(self):
+        return f'{self.host_name} - {self.process_id}'
+
+    @property
+    def params_str(self):
+        if self._params_str is None:
+            self._params_str = Serialization.to_json_str(self.params)
+        return self._params_str
+
+    @property
+    def publish_time_str(self):
+        if self._publish_time_str is None and self.publish_time:
+            self._publish_time_str = time_util.DatetimeConverter(self.publish_time).datetime_str
+        return self._publish_time_str
+
+    @property
+    def total_thread(self):
+        if self._total_thread is None:  # 第一次被读取时候的线程数量，不再每条消息开始时候都统计一次。
+            self._total_thread = threading.active_count()
+        return self._total_thread
 
     def get_status_dict(self, without_datetime_obj=False):
         self.time_end = time.time()
@@ -68,12 +108,10 @@ class FunctionResultStatus():
             self.time_cost = None
         else:
             self.time_cost = round(self.time_end - self.time_start, 3)
-        item = {}
-        for k, v in self.__dict__.items():
-            if not k.startswith('_'):
-                item[k] = v
+        item = {k: getattr(self, k) for k in self._STATUS_DICT_FIELDS}
+        if not self.publish_time:
+            item.pop('publish_time_str')  # 和以前一样，没有发布时间时候没有这个字段。
         item['host_name'] = self.host_name
-        item['host_process'] = self.host_process
         item['script_name'] = self.script_name
         item['script_name_long'] = self.script_name_long
         # item.pop('time_start')
@@ -90,8 +128,6 @@ class FunctionResultStatus():
             item.update({'insert_time': datetime.datetime.now(),
                          'utime': datetime.datetime.utcnow(),
                          })
-        else:
-            item = delete_keys_and_return_new_dict(item, ['insert_time', 'utime'])
         # kw['body']['extra']['task_id']
         # item['_id'] = self.task_id.split(':')[-1] or str(uuid.uuid4())
         item['_id'] = self.task_id or str(uuid.uuid4())
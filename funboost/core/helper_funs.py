@@ -1,9 +1,10 @@
-import copy
+import itertools
+import os
 import pytz
 import time
 import uuid
 import datetime
-from funboost.core.funboost_time import FunboostTime
+from funboost.core.funboost_time import FunboostTime, timestamp_to_str
 
 
 def get_publish_time(paramsx: dict):
@@ -15,14 +16,12 @@ def get_publish_time(paramsx: dict):
 
 
 def delete_keys_and_return_new_dict(dictx: dict, keys: list = None):
-    dict_new = copy.deepcopy(dictx)  # 主要是去掉一级键 publish_time，浅拷贝即可。新的消息已经不是这样了。
-    keys = ['publish_time', 'publish_time_format', 'extra'] if keys is None else keys
-    for dict_key in keys:
-        try:
-            dict_new.pop(dict_key)
-        except KeyError:
-            pass
-    return dict_new
+    """
+    返回去掉了一级键的新字典，只是浅拷贝，嵌套的值和原字典是共用的。
+    大消息体deepcopy非常耗cpu，调用方如果需要修改嵌套的值，自己负责拷贝。
+    """
+    keys = ('publish_time', 'publish_time_format', 'extra') if keys is None else keys
+    return {k: v for k, v in dictx.items() if k not in keys}
 
 
 def block_python_main_thread_exit():
@@ -41,25 +40,48 @@ run_forever = block_python_main_thread_exit
 
 
 class MsgGenerater:
-    @staticmethod
-    def generate_task_id(queue_name:str) -> str:
-        return f'{queue_name}_result:{uuid.uuid4()}'
+    """
+    task_id 以前是每条消息 uuid4，现在是 毫秒时间戳 + 进程前缀 + 进程内自增计数，同一进程内单调递增，也能按时间排序。
+    进程前缀是每个进程随机生成的，fork的子进程会重新生成，不同机器不同进程之间不会重复。
+    """
+    _process_prefix = uuid.uuid4().hex[:12]
+    _task_id_counter = itertools.count()
+    _publish_time_format_cache = (0, '')  # (整数秒, 格式化的时间字符串)，同一秒内的消息直接使用缓存。
+
+    @classmethod
+    def _reset_process_prefix(cls):
+        cls._process_prefix = uuid.uuid4().hex[:12]
+        cls._task_id_counter = itertools.count()
+
+    @classmethod
+    def generate_task_id(cls, queue_name: str) -> str:
+        return f'{queue_name}_result:{int(time.time() * 1000):012x}-{cls._process_prefix}-{next(cls._task_id_counter):08x}'
 
     @staticmethod
     def generate_publish_time() -> float:
         return round(time.time(),4)
 
-    @staticmethod
-    def generate_publish_time_format() -> str:
-        return FunboostTime().get_str()
+    @classmethod
+    def generate_publish_time_format(cls, timestamp: float = None) -> str:
+        timestamp = time.time() if timestamp is None else timestamp
+        second = int(timestamp)
+        cache = cls._publish_time_format_cache
+        if cache[0] != second:
+            cache = (second, timestamp_to_str(second))
+            cls._publish_time_format_cache = cache  # 整个元组替换，多线程读到的秒和字符串总是对应的。
+        return cache[1]
 
     @classmethod
     def generate_pulish_time_and_task_id(cls,queue_name:str,task_id=None):
-        extra_params = {'task_id': task_id or cls.generate_task_id(queue_name), 'publish_time': cls.generate_publish_time(),
-                        'publish_time_format': cls.generate_publish_time_format()}
+        now = time.time()
+        extra_params = {'task_id': task_id or cls.generate_task_id(queue_name), 'publish_time': round(now, 4),
+                        'publish_time_format': cls.generate_publish_time_format(now)}
         return extra_params
 
 
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=MsgGenerater._reset_process_prefix)
+
 
 if __name__ == '__main__':
 
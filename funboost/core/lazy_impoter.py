@@ -101,8 +101,10 @@ class AioHttpImporter:
 
     def __init__(self):
         """pip install aiohttp==3.8.3"""
+        import aiohttp
         from aiohttp import web
         from aiohttp.web_request import Request
+        self.aiohttp = aiohttp
         self.web = web
         self.Request = Request
 
@@ -0,0 +1,250 @@
+"""
+发布者的本地落盘缓冲(spool)。
+
+中间件不可用时候，以前 publish 重试多次后抛出异常，发布方要么卡住要么丢消息。
+开启 publish_local_spool_dir 后，publish 只是把消息追加写入本地的内存映射文件，立即返回，
+后台线程批量转发到中间件，中间件故障或维护期间消息保存在磁盘上，恢复后自动补发，发布方的延迟不受中间件影响。
+
+存储格式:
+  每个队列一个目录，目录下是按序号命名的段文件 000000000001.seg，每个段文件预分配固定大小并mmap，
+  每条记录是 长度(4字节) + 类型(1字节, 0是str 1是bytes) + 消息内容，长度为0表示后面还没有写入。
+  写入时候先写内容最后写长度，读取线程不会读到写了一半的记录。
+  每个段文件的转发进度保存在同名的 .offset 文件中，转发成功才更新进度，进程崩溃后重启会从进度处继续转发(至少一次)。
+  写入进程切换到新的段文件后，旧段文件转发完就删除。
+  同一个目录同时只能有一个进程使用(文件锁)，多进程发布同一个队列时候，后面的进程自动使用 队列名.1 队列名.2 ... 目录，
+  进程重启后会重新占用这些目录，把上次没有转发完的消息继续转发。
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import typing
+from pathlib import Path
+
+_LEN_STRUCT = struct.Struct('<I')
+_RECORD_HEAD_SIZE = _LEN_STRUCT.size + 1
+_TYPE_STR = 0
+_TYPE_BYTES = 1
+
+
+def _try_lock_file(file_obj) -> bool:
+    try:
+        import fcntl
+        fcntl.flock(file_obj.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except ImportError:  # windows
+        import msvcrt
+        try:
+            msvcrt.locking(file_obj.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+    except OSError:
+        return False
+
+
+class _Segment:
+    def __init__(self, path: Path, size: int = None):
+        self.path = path
+        self.seq = int(path.stem)
+        self.offset_path = path.with_suffix('.offset')
+        if size is not None:  # 新建段文件并预分配
+            with open(path, 'wb') as f:
+                f.truncate(size)
+        self._file = open(path, 'r+b')
+        self.mm = mmap.mmap(self._file.fileno(), 0)
+        self.size = len(self.mm)
+        self.read_pos = None  # 只有转发线程读写
+
+    def get_read_pos(self) -> int:
+        if self.read_pos is None:
+            self.read_pos = self.read_offset()
+        return self.read_pos
+
+    def read_offset(self) -> int:
+        if self.offset_path.exists():
+            return int(self.offset_path.read_text() or 0)
+        return 0
+
+    def write_offset(self, offset: int):
+        tmp_path = self.offset_path.with_suffix('.offset_tmp')
+        tmp_path.write_text(str(offset))
+        os.replace(tmp_path, self.offset_path)
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        self.path.unlink()
+        if self.offset_path.exists():
+            self.offset_path.unlink()
+
+
+class LocalSpool:
+    def __init__(self, spool_dir: str, queue_name: str, forward_func: typing.Callable[[list], typing.Any],
+                 segment_max_bytes: int = 64 * 1024 * 1024, forward_batch_size: int = 1000, logger=None):
+        """
+        :param forward_func: 把一批消息发送到中间件的函数，入参是消息列表，抛出异常表示发送失败，之后会重试这一批。
+        :param segment_max_bytes: 每个段文件的大小。
+        :param forward_batch_size: 每批转发的最大消息数量。
+        """
+        self.queue_name = queue_name
+        self._forward_func = forward_func
+        self.segment_max_bytes = segment_max_bytes
+        self.forward_batch_size = forward_batch_size
+        self.logger = logger
+        self._spool_dir = Path(spool_dir)
+        self._open()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reopen_after_fork)
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._dir = self._lock_spool_dir(self._spool_dir, self.queue_name)
+        self._lock_for_write = threading.Lock()
+        self._has_new_msg_event = threading.Event()
+
+        old_segment_paths = sorted(self._dir.glob('*.seg'))
+        self._read_segments = [_Segment(path) for path in old_segment_paths]  # 上次没有转发完的段文件
+        next_seq = self._read_segments[-1].seq + 1 if self._read_segments else 1
+        self._write_segment = None  # type: typing.Optional[_Segment]
+        self._write_pos = 0
+        self._open_new_write_segment(next_seq, self.segment_max_bytes)
+        if len(self._read_segments) > 1 and self.logger:
+            self.logger.warning(f'本地spool目录 {self._dir} 中有上次没有转发完的消息，继续转发到中间件')
+        self._drainer_thread = threading.Thread(target=self._drain_forever, name=f'local_spool_drainer--{self.queue_name}', daemon=True)
+        self._drainer_thread.start()
+
+    def _reopen_after_fork(self):
+        """
+        fork 出来的子进程继承了父进程的 mmap(MAP_SHARED) 和写入位置，但是没有转发线程，
+        如果继续用会和父进程写到同一个段文件的同一个位置，互相覆盖。
+        子进程丢掉继承来的段文件，重新占用一个新的目录(父进程持有原目录的文件锁，子进程会用 队列名.1 这样的目录)，启动自己的转发线程。
+        父进程没转发完的消息仍然由父进程转发。
+        """
+        if self._pid == os.getpid():
+            return
+        for segment in self._read_segments:
+            segment.mm.close()  # 只解除子进程自己的映射，不 flush 不删除，文件是父进程的。
+            segment._file.close()
+        self._lock_file.close()  # 父进程的文件描述还开着，锁不会释放。
+        self._open()
+
+    def _lock_spool_dir(self, spool_dir: Path, queue_name: str) -> Path:
+        index = 0
+        while True:
+            dir_path = spool_dir / (queue_name if index == 0 else f'{queue_name}.{index}')
+            dir_path.mkdir(parents=True, exist_ok=True)
+            lock_file = open(dir_path / 'lock', 'a+b')
+            if _try_lock_file(lock_file):
+                self._lock_file = lock_file  # 保持文件打开，进程退出时候锁自动释放。
+                return dir_path
+            lock_file.close()
+            index += 1
+
+    def _open_new_write_segment(self, seq: int, size: int):
+        segment = _Segment(self._dir / f'{seq:012d}.seg', size=size)
+        self._read_segments.append(segment)
+        self._write_segment = segment
+        self._write_pos = 0
+
+    def put(self, msg: typing.Union[str, bytes]):
+        if isinstance(msg, str):
+            data = msg.encode('utf8')
+            msg_type = _TYPE_STR
+        else:
+            data = msg
+            msg_type = _TYPE_BYTES
+        need_size = _RECORD_HEAD_SIZE + len(data)
+        with self._lock_for_write:
+            if self._write_pos + need_size + _LEN_STRUCT.size > self._write_segment.size:  # 段文件末尾要留出一个0长度作为结束标志
+                self._open_new_write_segment(self._write_segment.seq + 1, max(self.segment_max_bytes, need_size + _LEN_STRUCT.size))
+            mm = self._write_segment.mm
+            pos = self._write_pos
+            mm[pos + _RECORD_HEAD_SIZE:pos + need_size] = data
+            mm[pos + _LEN_STRUCT.size] = msg_type
+            mm[pos:pos + _LEN_STRUCT.size] = _LEN_STRUCT.pack(len(data))  # 最后写长度，这条记录才对读取线程可见
+            self._write_pos = pos + need_size
+        if not self._has_new_msg_event.is_set():
+            self._has_new_msg_event.set()
+
+    def put_many(self, msg_list: typing.Iterable[typing.Union[str, bytes]]):
+        for msg in msg_list:
+            self.put(msg)
+
+    @staticmethod
+    def _read_records(segment: _Segment, offset: int, max_num: int) -> typing.Tuple[list, int]:
+        mm = segment.mm
+        msgs = []
+        while len(msgs) < max_num and offset + _RECORD_HEAD_SIZE <= segment.size:
+            data_len, = _LEN_STRUCT.unpack_from(mm, offset)
+            if data_len == 0:
+                break
+            msg_type = mm[offset + _LEN_STRUCT.size]
+            data = mm[offset + _RECORD_HEAD_SIZE:offset + _RECORD_HEAD_SIZE + data_len]
+            msgs.append(data.decode('utf8') if msg_type == _TYPE_STR else data)
+            offset += _RECORD_HEAD_SIZE + data_len
+        return msgs, offset
+
+    def _drain_once(self) -> bool:
+        """转发一批消息，返回是否还有可能有待转发的消息"""
+        segment = self._read_segments[0]
+        offset = segment.get_read_pos()
+        msgs, new_offset = self._read_records(segment, offset, self.forward_batch_size)
+        if msgs:
+            self._forward_func(msgs)
+            segment.read_pos = new_offset
+            segment.write_offset(new_offset)
+            return True
+        with self._lock_for_write:
+            is_sealed = segment is not self._write_segment
+        if is_sealed:  # 写入已经切换到后面的段文件了，这个段文件转发完了
+            msgs, _ = self._read_records(segment, offset, 1)
+            if not msgs:
+                self._read_segments.pop(0)
+                segment.remove()
+                return True
+        return False
+
+    def _drain_forever(self):
+        retry_sleep = 0.1
+        while True:
+            self._has_new_msg_event.clear()  # 先清除再转发，转发期间写入的消息会重新设置事件，不会错过。
+            try:
+                while self._drain_once():
+                    pass
+                retry_sleep = 0.1
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f'本地spool转发消息到中间件 {self.queue_name} 失败，{retry_sleep} 秒后重试，{type(e)} {e}')
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 5)
+                continue
+            if not self._has_new_msg_event.wait(1):
+                self._write_segment.mm.flush()  # 空闲时候把写入的内容刷到磁盘，机器掉电也尽量少丢消息。
+
+    def get_pending_msg_count(self) -> int:
+        """还没有转发到中间件的消息数量，需要遍历段文件，只用于查看状态"""
+        count = 0
+        for segment in list(self._read_segments):
+            offset = segment.read_pos if segment.read_pos is not None else segment.read_offset()
+            while True:
+                msgs, offset = self._read_records(segment, offset, 10000)
+                if not msgs:
+                    break
+                count += len(msgs)
+        return count
+
+    def wait_drained(self, timeout: float = None) -> bool:
+        """等待本地缓冲的消息全部转发到中间件"""
+        t_start = time.time()
+        while self.get_pending_msg_count():
+            if timeout is not None and time.time() - t_start > timeout:
+                return False
+            self._has_new_msg_event.set()
+            time.sleep(0.05)
+        return True
@@ -1,9 +1,14 @@
+import multiprocessing
 import os
+import queue
 import signal
 from multiprocessing import Process
 import time
-from typing import List
-from concurrent.futures import ProcessPoolExecutor
+import typing
+from pathlib import Path
+
+import orjson
+
 from funboost.core.booster import Booster
 from funboost.core.helper_funs import run_forever
 from funboost.core.loggers import flogger
@@ -48,14 +53,6 @@ def run_consumer_with_multi_process(booster: Booster, process_num=1):
                     args=(booster.queue_name,)).start()
 
 
-def _multi_process_pub_params_list_in_new_process(queue_name, msgs: List[dict]):
-    booster_current_pid = funboost_lazy_impoter.BoostersManager.get_or_create_booster_by_queue_name(queue_name)
-    publisher = booster_current_pid.publisher
-    publisher.set_log_level(20)  # 超高速发布，如果打印详细debug日志会卡死屏幕和严重降低代码速度。
-    for msg in msgs:
-        publisher.publish(msg)
-
-
 def multi_process_pub_params_list(booster: Booster, params_list, process_num=16):
     """超高速多进程发布任务，充分利用多核"""
     if not isinstance(booster, Booster):
@@ -63,12 +60,141 @@ def multi_process_pub_params_list(booster: Booster, params_list, process_num=16)
     params_list_len = len(params_list)
     if params_list_len < 1000 * 100:
         raise ValueError(f'要要发布的任务数量是 {params_list_len} 个,要求必须至少发布10万任务才使用此方法')
-    ava_len = params_list_len // process_num + 1
-    with ProcessPoolExecutor(process_num) as pool:
-        t0 = time.time()
-        for i in range(process_num):
-            msgs = params_list[i * ava_len: (i + 1) * ava_len]
-            # print(msgs)
-            pool.submit(_multi_process_pub_params_list_in_new_process, booster.queue_name,
-                        msgs)
-    flogger.info(f'\n 通过 multi_process_pub_params_list 多进程子进程的发布方式，发布了 {params_list_len} 个任务。耗时 {time.time() - t0} 秒')
+    # 以前是把列表切片后整片pickle给进程池，现在和流式发布一样分成小块通过管道发送给子进程。
+    multi_process_pub_params_stream(booster, params_list, process_num)
+
+
+def _iter_jsonl_chunks(source: typing.Union[str, Path, typing.Iterable], chunk_size: int) -> typing.Iterator[typing.Tuple[bytes, int]]:
+    """把消息源切成 (多行json的bytes, 消息条数) 的小块，文件和迭代器都是边读边发，不会全部加载到内存。"""
+    if isinstance(source, (str, Path)):
+        def _iter_lines():
+            with open(source, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield line  # 文件的每一行已经是json了，父进程不需要解析。
+    else:
+        def _iter_lines():
+            for msg in source:
+                if isinstance(msg, bytes):
+                    yield msg
+                elif isinstance(msg, str):
+                    yield msg.encode()
+                else:
+                    yield orjson.dumps(msg)
+
+    lines = []
+    for line in _iter_lines():
+        lines.append(line)
+        if len(lines) >= chunk_size:
+            yield b'\n'.join(lines), len(lines)
+            lines = []
+    if lines:
+        yield b'\n'.join(lines), len(lines)
+
+
+def _multi_process_pub_params_stream_in_new_process(queue_name, task_queue: multiprocessing.Queue, result_queue: multiprocessing.Queue, batch_size: int):
+    publish_num = 0
+    error = None
+    t_start = time.time()
+    try:
+        booster_current_pid = funboost_lazy_impoter.BoostersManager.get_or_create_booster_by_queue_name(queue_name)
+        publisher = booster_current_pid.publisher
+        publisher.set_log_level(20)  # 超高速发布，如果打印详细debug日志会卡死屏幕和严重降低代码速度。
+        while True:
+            chunk = task_queue.get()
+            if chunk is None:
+                break
+            msgs = [orjson.loads(line) for line in chunk.split(b'\n')]
+            publish_num += publisher.publish_many(msgs, batch_size=batch_size)  # 批量发布，中间件有批量接口的一次网络交互发布一批
+    except BaseException as e:
+        error = f'{type(e)} {e}'
+        flogger.exception(f'进程 {os.getpid()} 发布 {queue_name} 的消息出错')
+    finally:
+        result_queue.put((os.getpid(), publish_num, time.time() - t_start, error))
+
+
+def _terminate_processes(processes: typing.List[Process], task_queue: multiprocessing.Queue):
+    task_queue.cancel_join_thread()  # 队列里还没被子进程取走的数据不要了，否则父进程退出时候会等待把它们写入管道
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
+    for p in processes:
+        p.join()
+
+
+def multi_process_pub_params_stream(booster: Booster, source: typing.Union[str, Path, typing.Iterable],
+                                    process_num=16, chunk_size=5000, batch_size=1000, progress_interval=10) -> int:
+    """
+    流式的超高速多进程发布，父进程不需要把全部消息保存在内存中。
+    :param source: 消息的迭代器/生成器(元素是字典或者json字符串)，或者每行一个json消息的jsonl文件路径。
+    :param chunk_size: 父进程每凑够多少条消息，作为一块通过管道发给子进程。
+    :param batch_size: 子进程使用 publish_many 批量发布时候每批的数量。
+    :param progress_interval: 父进程每隔多少秒打印一次发布进度。
+    :return: 实际发布成功的消息数量
+    消息源抛出错误时候，已经分发给子进程的消息照常发布完再抛出这个错误；Ctrl-C 时候直接终止子进程。
+    """
+    if not isinstance(booster, Booster):
+        raise ValueError(f'{booster} 参数必须是一个被 boost 装饰的函数')
+    task_queue = multiprocessing.Queue(maxsize=process_num * 2)  # 有界队列，子进程发布慢时候父进程读取消息源也会等待，内存占用有上限。
+    result_queue = multiprocessing.Queue()
+    processes = [Process(target=_multi_process_pub_params_stream_in_new_process,
+                         args=(booster.queue_name, task_queue, result_queue, batch_size)) for _ in range(process_num)]
+    for p in processes:
+        p.start()
+
+    def _put(item):
+        while True:
+            try:
+                task_queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                if not any(p.is_alive() for p in processes):
+                    raise RuntimeError(f'发布 {booster.queue_name} 消息的子进程全部退出了')
+
+    t0 = time.time()
+    last_progress_time = t0
+    dispatch_num = 0
+    dispatch_error = None
+    try:
+        for chunk, chunk_msg_num in _iter_jsonl_chunks(source, chunk_size):
+            _put(chunk)
+            dispatch_num += chunk_msg_num
+            if time.time() - last_progress_time > progress_interval:
+                last_progress_time = time.time()
+                flogger.info(f'multi_process_pub_params_stream 已经分发了 {dispatch_num} 个任务到 {process_num} 个发布子进程，'
+                             f'平均每秒 {round(dispatch_num / (last_progress_time - t0))} 个')
+    except Exception as e:  # 消息源出错，已经分发的消息照常发布完，然后再抛出错误
+        flogger.exception(f'multi_process_pub_params_stream 读取消息源出错，已经分发了 {dispatch_num} 个任务，等待子进程发布完后退出')
+        dispatch_error = e
+    except BaseException:  # Ctrl-C 等，子进程还在 task_queue.get() 等待，不终止的话父进程退出时候会一直等待这些非守护子进程
+        _terminate_processes(processes, task_queue)
+        raise
+
+    publish_num_total = 0
+    try:
+        for _ in processes:
+            _put(None)
+        result_num = 0
+        while result_num < process_num:
+            try:
+                pid, publish_num, cost, error = result_queue.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):  # 子进程被强制杀死，没有机会返回结果
+                    break
+                continue
+            result_num += 1
+            publish_num_total += publish_num
+            if error:
+                flogger.error(f'发布子进程 {pid} 出错退出，发布了 {publish_num} 个任务，错误是 {error}')
+        for p in processes:
+            p.join()
+    except BaseException:
+        _terminate_processes(processes, task_queue)
+        raise
+    cost_total = time.time() - t0
+    flogger.info(f'\n 通过 multi_process_pub_params_stream 多进程子进程的发布方式，分发了 {dispatch_num} 个任务，成功发布了 {publish_num_total} 个任务。'
+                 f'耗时 {round(cost_total, 2)} 秒，平均每秒发布 {round(publish_num_total / max(cost_total, 0.001))} 个')
+    if dispatch_error is not None:
+        raise dispatch_error
+    return publish_num_total
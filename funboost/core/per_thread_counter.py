@@ -0,0 +1,48 @@
+"""
+多线程无锁计数器，发布者用来统计发布消息数量。
+
+每个线程只加自己的计数(只有一个写者，不需要锁)，由汇总的线程定时读取所有线程的计数，返回上次汇总以来的增量。
+"""
+import threading
+import typing
+
+
+class _ThreadCount:
+    __slots__ = ('count', 'thread')
+
+    def __init__(self, thread: threading.Thread):
+        self.count = 0
+        self.thread = thread
+
+
+class PerThreadCounter:
+    def __init__(self):
+        self._thread_local = threading.local()
+        self._thread_counts = []  # type: typing.List[_ThreadCount]
+        self._lock_for_register = threading.Lock()  # 只有每个线程第一次计数和汇总时候才会用到这个锁。
+        self._dead_threads_count = 0  # 已经退出的线程的计数
+        self._collected_count = 0
+
+    def incr(self, num: int = 1):
+        thread_count = getattr(self._thread_local, 'thread_count', None)
+        if thread_count is None:
+            thread_count = _ThreadCount(threading.current_thread())
+            with self._lock_for_register:
+                self._thread_counts.append(thread_count)
+            self._thread_local.thread_count = thread_count
+        thread_count.count += num
+
+    def collect(self) -> int:
+        """返回上次汇总以来所有线程增加的计数。调用者自己保证同一时刻只有一个线程在汇总。"""
+        with self._lock_for_register:
+            alive_count = 0
+            for thread_count in list(self._thread_counts):
+                if thread_count.thread.is_alive():
+                    alive_count += thread_count.count
+                else:  # 线程已经退出，计数不会再变了，合并后不再保留它
+                    self._dead_threads_count += thread_count.count
+                    self._thread_counts.remove(thread_count)
+            total = self._dead_threads_count + alive_count
+        increment = total - self._collected_count
+        self._collected_count = total
+        return increment
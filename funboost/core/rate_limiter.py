@@ -0,0 +1,152 @@
+"""
+消费控频的限流器。
+
+AbstractConsumer._frequency_control 原来的三段式控频(qps<=5 直接sleep，5到20 纠偏sleep，大于20按每秒计数)，
+qps大于20时候是每秒开头突发执行完qps次然后卡住等到下一秒，对下游接口来说是突发流量。
+这里的令牌桶和GCRA限流器在任何qps下都是匀速放行，可以通过 burst 允许少量突发。
+
+通过 BoosterParams 的 rate_limiter_kind 和 rate_limiter_burst 选择，
+默认 RateLimiterKindEnum.DEFAULT 仍然使用原来的控频方式。
+"""
+import abc
+import collections
+import threading
+import time
+
+from funboost.constant import RateLimiterKindEnum
+from funboost.utils.redis_manager import RedisMixin
+
+_TIME_EPSILON = 1e-9  # 浮点数累加的误差，小于这个的等待时间当作0，突发放行时候不会去 sleep 一个极小的时间。
+
+
+class AbstractRateLimiter(metaclass=abc.ABCMeta):
+    IS_DISTRIBUTED = False  # 为True时候传入的qps是所有消费者加起来的全局qps，不需要再除以活跃消费者数量。
+
+    def __init__(self, burst: int = 1):
+        """
+        :param burst: 允许的最大突发数量，为1时候完全匀速。
+        """
+        if burst < 1:
+            raise ValueError('burst 必须大于等于1')
+        self.burst = burst
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _compute_wait_seconds(self, qps: float, now: float) -> float:
+        """计算需要等待多久才能放行，同时记录本次放行。"""
+        raise NotImplementedError
+
+    def acquire(self, qps: float):
+        """阻塞直到允许执行一次。qps是每次传入的，因为分布式控频时候qps会随着活跃消费者数量变化。"""
+        if not qps:
+            return
+        with self._lock:  # 等待时候也持有锁，多个调度线程共用一个限流器时候也是严格匀速的。
+            wait_seconds = self._compute_wait_seconds(qps, time.monotonic())
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+
+
+class TokenBucketRateLimiter(AbstractRateLimiter):
+    def __init__(self, burst: int = 1):
+        super().__init__(burst)
+        self._tokens = float(burst)
+        self._last_time = time.monotonic()
+
+    def _compute_wait_seconds(self, qps: float, now: float) -> float:
+        tokens = min(self.burst, self._tokens + (now - self._last_time) * qps)
+        if tokens >= 1 - _TIME_EPSILON * qps:
+            self._tokens = max(tokens - 1, 0)
+            self._last_time = now
+            return 0
+        wait_seconds = (1 - tokens) / qps
+        self._tokens = 0  # 等待结束的时刻正好攒够一个令牌，并且马上用掉。
+        self._last_time = now + wait_seconds
+        return wait_seconds
+
+
+class GcraRateLimiter(AbstractRateLimiter):
+    def __init__(self, burst: int = 1):
+        super().__init__(burst)
+        self._tat = 0.0  # theoretical arrival time，理论上下一次可以放行的时间。
+
+    def _compute_wait_seconds(self, qps: float, now: float) -> float:
+        emission_interval = 1.0 / qps
+        delay_variation_tolerance = emission_interval * (self.burst - 1)
+        tat = max(self._tat, now)
+        allow_at = tat - delay_variation_tolerance
+        self._tat = tat + emission_interval
+        return allow_at - now if allow_at - now > _TIME_EPSILON else 0
+
+
+class RedisDistributedRateLimiter(AbstractRateLimiter, RedisMixin):
+    """
+    基于redis lua脚本的分布式GCRA限流器，同一个队列名的所有消费者共享一个redis键，传入的qps是全局总qps。
+
+    is_using_distributed_frequency_control 是用 qps / 活跃消费者数量 来控频，活跃消费者数量靠10秒一次的心跳统计，
+    扩容缩容或者进程崩溃时候，最多25秒内全局频率会偏高或偏低。这个限流器不依赖消费者数量，任何时候全局频率都是准确的。
+
+    每次向redis预约一批(大约 RESERVE_SECONDS 秒的量)连续的放行时间点，然后在本地按时间点匀速放行，
+    不需要每条消息都访问一次redis。进程崩溃时最多浪费它已预约但没用完的 RESERVE_SECONDS 秒的名额。
+    时间以redis服务端时间为准，不受各机器时钟不一致影响。
+    """
+    IS_DISTRIBUTED = True
+    RESERVE_SECONDS = 0.1
+    MAX_RESERVE_NUM = 100
+
+    _lua = """
+    redis.replicate_commands()
+    local interval = tonumber(ARGV[1])
+    local tolerance = tonumber(ARGV[2])
+    local num = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local tat = tonumber(redis.call('GET', KEYS[1]))
+    if (not tat) or tat < now then
+        tat = now
+    end
+    local new_tat = tat + interval * num
+    redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', math.ceil((new_tat - now + tolerance) * 1000) + 1000)
+    return {string.format('%.6f', now), string.format('%.6f', tat - tolerance)}
+    """
+
+    def __init__(self, queue_name: str, burst: int = 1):
+        super().__init__(burst)
+        self._redis_key_name = f'funboost_rate_limiter:{queue_name}'
+        self._script = self.redis_db_frame.register_script(self._lua)
+        self._release_time_deque = collections.deque()
+
+    def _reserve(self, qps: float):
+        emission_interval = 1.0 / qps
+        num = max(1, min(self.MAX_RESERVE_NUM, int(qps * self.RESERVE_SECONDS)))
+        redis_now_str, start_str = self._script(keys=[self._redis_key_name],
+                                                args=[emission_interval, emission_interval * (self.burst - 1), num])
+        start_local = float(start_str) - float(redis_now_str) + time.time()  # 转换成本机时间
+        self._release_time_deque.extend(start_local + i * emission_interval for i in range(num))
+
+    def _compute_wait_seconds(self, qps: float, now: float) -> float:
+        local_now = time.time()
+        if self._release_time_deque and self._release_time_deque[-1] < local_now - self.RESERVE_SECONDS:
+            self._release_time_deque.clear()  # 例如暂停消费后，之前预约的时间点早已过期，不能一下子突发放行。
+        if not self._release_time_deque:
+            self._reserve(qps)
+        return self._release_time_deque.popleft() - local_now
+
+
+def build_rate_limiter(rate_limiter_kind: str, burst: int = 1, queue_name: str = None):
+    if rate_limiter_kind == RateLimiterKindEnum.DEFAULT:
+        return None
+    if rate_limiter_kind == RateLimiterKindEnum.TOKEN_BUCKET:
+        return TokenBucketRateLimiter(burst)
+    if rate_limiter_kind == RateLimiterKindEnum.GCRA:
+        return GcraRateLimiter(burst)
+    if rate_limiter_kind == RateLimiterKindEnum.REDIS_DISTRIBUTED_GCRA:
+        return RedisDistributedRateLimiter(queue_name, burst)
+    raise ValueError(f'不支持的限流器类型 {rate_limiter_kind}')
+
+
+if __name__ == '__main__':
+    for limiter in [TokenBucketRateLimiter(1), GcraRateLimiter(1), GcraRateLimiter(10)]:
+        t1 = time.time()
+        for i in range(200):
+            limiter.acquire(100)
+        print(type(limiter).__name__, limiter.burst, round(time.time() - t1, 3))
@@ -0,0 +1,65 @@
+"""
+预先构建好的重试策略。
+
+以前发布消息每次都要 decorators.handle_exception(...)(func) 重新生成装饰器闭包，并且是固定间隔0.1秒重试。
+这里在发布者实例化时候构建一次，成功时候只是一次普通的函数调用，
+失败时候才进入重试循环，重试间隔指数增长并且带随机抖动，中间件故障恢复时候大量发布者不会同时一起重试。
+"""
+import asyncio
+import logging
+import random
+import time
+import typing
+
+
+class RetryPolicy:
+    def __init__(self, retry_times: int = 10, base_sleep_seconds: float = 0.1, max_sleep_seconds: float = 2,
+                 jitter_ratio: float = 0.5, logger: logging.Logger = None):
+        """
+        :param retry_times: 第一次失败后最多重试多少次，全部失败后抛出最后一次的错误。
+        :param base_sleep_seconds: 第一次重试前的等待时间，之后每次翻倍。
+        :param max_sleep_seconds: 每次重试等待时间的上限。
+        :param jitter_ratio: 每次等待时间随机减少的最大比例。
+        """
+        self.retry_times = retry_times
+        self.base_sleep_seconds = base_sleep_seconds
+        self.max_sleep_seconds = max_sleep_seconds
+        self.jitter_ratio = jitter_ratio
+        self.logger = logger or logging.getLogger(__name__)
+
+    def get_sleep_seconds(self, retry_index: int) -> float:
+        sleep_seconds = min(self.max_sleep_seconds, self.base_sleep_seconds * (2 ** retry_index))
+        return sleep_seconds * (1 - self.jitter_ratio * random.random())
+
+    def _log_retry(self, func: typing.Callable, retry_index: int, e: BaseException, sleep_seconds: float):
+        self.logger.error('调用 %s 出错 %s %s ,%.3f 秒后进行第 %s 次重试', getattr(func, '__name__', func), type(e), e, sleep_seconds, retry_index + 1)
+
+    def call(self, func: typing.Callable, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)  # 快速路径，成功时候没有任何额外开销。
+        except Exception as e:
+            last_exception = e
+        for retry_index in range(self.retry_times):
+            sleep_seconds = self.get_sleep_seconds(retry_index)
+            self._log_retry(func, retry_index, last_exception, sleep_seconds)
+            time.sleep(sleep_seconds)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                last_exception = e
+        raise last_exception
+
+    async def aio_call(self, coro_func: typing.Callable[..., typing.Awaitable], *args, **kwargs):
+        try:
+            return await coro_func(*args, **kwargs)
+        except Exception as e:
+            last_exception = e
+        for retry_index in range(self.retry_times):
+            sleep_seconds = self.get_sleep_seconds(retry_index)
+            self._log_retry(coro_func, retry_index, last_exception, sleep_seconds)
+            await asyncio.sleep(sleep_seconds)
+            try:
+                return await coro_func(*args, **kwargs)
+            except Exception as e:
+                last_exception = e
+        raise last_exception
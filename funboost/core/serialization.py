@@ -1,7 +1,115 @@
+import abc
+import base64
+import datetime
+import pickle
+import struct
 import typing
 
 import orjson
+
+"""
+消息序列化编解码器。
+
+默认 SerializerEnum.JSON 仍然是 orjson 转成 str，和以前完全一样。
+其他编解码器由 BoosterParams 的 serializer 选择，编码后的消息前面带有编解码器名字的帧头，
+消费者看帧头就知道用哪个编解码器解码，发布者和消费者不需要额外约定，不同编码的消息也可以在同一个队列里面共存。
+
+支持二进制的中间件(发布者类的 SUPPORT_BINARY_MSG 为True)直接发送二进制，
+只能传字符串的中间件，二进制内容会转成base64文本发送。
+"""
+
+BINARY_FRAME_PREFIX = b'FBCODEC:'  # 二进制帧 FBCODEC:<编解码器名字>:<二进制内容>
+TEXT_FRAME_PREFIX = 'FBCODEC64:'  # 文本帧 FBCODEC64:<编解码器名字>:<base64内容>
+_TEXT_FRAME_PREFIX_BYTES = TEXT_FRAME_PREFIX.encode()
+
+
+class AbstractSerializerCodec(metaclass=abc.ABCMeta):
+    name = ''
+    is_safe = True  # 反序列化来自不可信来源的消息是否安全, pickle 反序列化可以执行任意代码,是不安全的.
+    is_json_compatible = False  # 编码结果本身就是json,不需要帧头,任何消费者都能直接解析.
+
+    @abc.abstractmethod
+    def dumps(self, msg: dict) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def loads(self, data: typing.Union[bytes, memoryview]) -> dict:
+        raise NotImplementedError
+
+
+class OrjsonBytesCodec(AbstractSerializerCodec):
+    """orjson 的 bytes 结果直接发送给支持二进制的中间件，省去 decode 成 str 再 encode 回 bytes。"""
+    name = 'orjson_bytes'
+    is_json_compatible = True
+
+    def dumps(self, msg: dict) -> bytes:
+        return orjson.dumps(msg)
+
+    def loads(self, data) -> dict:
+        return orjson.loads(data)
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):  # 例如 eta, 和orjson一样转成iso格式字符串.
+        return obj.isoformat()
+    raise TypeError(f'msgpack 不能序列化 {type(obj)} 类型')
+
+
+class MsgpackCodec(AbstractSerializerCodec):
+    name = 'msgpack'
+
+    def __init__(self):
+        import msgpack  # 用户选择了msgpack才需要安装, pip install msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, msg: dict) -> bytes:
+        return self._msgpack.packb(msg, use_bin_type=True, default=_msgpack_default)
+
+    def loads(self, data) -> dict:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+class Pickle5Codec(AbstractSerializerCodec):
+    """
+    pickle 协议5，numpy数组等支持缓冲区协议的大对象作为带外缓冲区直接拼接在消息后面，序列化时候不需要拷贝进pickle数据流，
+    反序列化时候直接引用消息里面的内存(得到的numpy数组是只读的)。
+    只有消费者自己的 serializer 也是 pickle5 时候才会解码这种消息，因为反序列化pickle可以执行任意代码，中间件必须是可信的。
+
+    帧格式: 缓冲区数量(4字节) + 每段长度(8字节) + pickle数据 + 各个带外缓冲区
+    """
+    name = 'pickle5'
+    is_safe = False
+
+    def __init__(self):
+        if pickle.HIGHEST_PROTOCOL >= 5:
+            self._pickle = pickle
+        else:
+            import pickle5  # python3.8以下需要 pip install pickle5
+            self._pickle = pickle5
+
+    def dumps(self, msg: dict) -> bytes:
+        buffers = []
+        data = self._pickle.dumps(msg, protocol=5, buffer_callback=buffers.append)
+        raw_buffers = [buf.raw() for buf in buffers]
+        header = struct.pack(f'<I{len(raw_buffers) + 1}Q', len(raw_buffers), len(data), *[raw.nbytes for raw in raw_buffers])
+        return b''.join([header, data, *raw_buffers])
+
+    def loads(self, data) -> dict:
+        view = memoryview(data)
+        buffer_num, = struct.unpack_from('<I', view, 0)
+        lengths = struct.unpack_from(f'<{buffer_num + 1}Q', view, 4)
+        offset = 4 + 8 * (buffer_num + 1)
+        segments = []
+        for length in lengths:
+            segments.append(view[offset:offset + length])
+            offset += length
+        return self._pickle.loads(segments[0], buffers=segments[1:])
+
+
 class Serialization:
+    _codec_cls_map = {codec_cls.name: codec_cls for codec_cls in [OrjsonBytesCodec, MsgpackCodec, Pickle5Codec]}
+    _codec_name__codec_map = {}  # type: typing.Dict[str,AbstractSerializerCodec]
+
     @staticmethod
     def to_json_str(dic:typing.Union[dict,str]):
         if isinstance(dic,str):
@@ -9,8 +117,55 @@ class Serialization:
         str1 =orjson.dumps(dic)
         return str1.decode('utf8')
 
-    @staticmethod
-    def to_dict(strx:typing.Union[str,dict]):
+    @classmethod
+    def to_dict(cls, strx: typing.Union[str, bytes, dict], allowed_unsafe_codec_name: str = None):
+        """
+        :param allowed_unsafe_codec_name: 允许解码的不安全编解码器名字，消费者传自己的 serializer，没有传的情况下收到pickle消息会报错。
+        """
         if isinstance(strx,dict):
             return strx
+        if isinstance(strx, str):
+            if strx.startswith(TEXT_FRAME_PREFIX):
+                codec_name, b64_str = strx[len(TEXT_FRAME_PREFIX):].split(':', 1)
+                return cls._loads_by_codec_name(codec_name, base64.b64decode(b64_str), allowed_unsafe_codec_name)
+        elif isinstance(strx, (bytes, bytearray)):
+            if strx.startswith(BINARY_FRAME_PREFIX):
+                name_end = strx.index(b':', len(BINARY_FRAME_PREFIX))
+                codec_name = strx[len(BINARY_FRAME_PREFIX):name_end].decode()
+                return cls._loads_by_codec_name(codec_name, memoryview(strx)[name_end + 1:], allowed_unsafe_codec_name)
+            if strx.startswith(_TEXT_FRAME_PREFIX_BYTES):  # 中间件客户端没有把文本帧解码成str
+                return cls.to_dict(strx.decode(), allowed_unsafe_codec_name)
         return orjson.loads(strx)
+
+    @classmethod
+    def get_codec(cls, codec_name: str) -> AbstractSerializerCodec:
+        if codec_name not in cls._codec_name__codec_map:
+            if codec_name not in cls._codec_cls_map:
+                raise ValueError(f'不支持的序列化方式 {codec_name}')
+            cls._codec_name__codec_map[codec_name] = cls._codec_cls_map[codec_name]()
+        return cls._codec_name__codec_map[codec_name]
+
+    @classmethod
+    def register_codec(cls, codec_cls: typing.Type[AbstractSerializerCodec]):
+        """用户可以注册自己的编解码器,然后 serializer 传编解码器的name"""
+        cls._codec_cls_map[codec_cls.name] = codec_cls
+        cls._codec_name__codec_map.pop(codec_cls.name, None)
+
+    @classmethod
+    def dumps_by_codec(cls, msg: dict, codec: AbstractSerializerCodec, binary: bool) -> typing.Union[str, bytes]:
+        """
+        :param binary: 中间件是否支持发送二进制，不支持就返回base64文本帧。
+        """
+        data = codec.dumps(msg)
+        if codec.is_json_compatible:
+            return data if binary else data.decode('utf8')
+        if binary:
+            return b''.join([BINARY_FRAME_PREFIX, codec.name.encode(), b':', data])
+        return f'{TEXT_FRAME_PREFIX}{codec.name}:{base64.b64encode(data).decode()}'
+
+    @classmethod
+    def _loads_by_codec_name(cls, codec_name: str, data, allowed_unsafe_codec_name: str = None) -> dict:
+        codec = cls.get_codec(codec_name)
+        if not codec.is_safe and codec_name != allowed_unsafe_codec_name:
+            raise ValueError(f'收到了 {codec_name} 编码的消息,但当前没有设置使用 {codec_name} 序列化,反序列化这种消息不安全,拒绝解码')
+        return codec.loads(data)
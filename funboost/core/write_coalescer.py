@@ -0,0 +1,106 @@
+"""
+自适应的批量写入合并器。
+
+以前 RedisPublisher 批量推送是所有发布线程抢一把全局锁往列表里添加消息，凑满1000条推送一次，
+不满1000条的靠后台线程每0.1秒轮询推送，轻负载时候一条消息最多要等0.1秒才进入中间件。
+
+现在按 消息条数 字节数 最大等待时间 三个条件任意一个满足就推送:
+  发布线程只是 deque.append (cpython中deque的append和popleft是原子的，多个生产者一个消费者不需要锁)，
+  只有缓冲从空变成非空，或者缓冲达到了条数/字节数阈值时候，才去获取条件变量的锁唤醒推送线程。
+  推送线程没有消息时候在条件变量上等待，不再轮询；收到第一条消息后最多等待 max_latency 秒，
+  期间消息达到阈值会被立即唤醒。
+所以轻负载时候一条消息的延迟就是 max_latency(默认2毫秒)，重负载时候每次推送都是满批量的。
+"""
+import collections
+import threading
+import time
+import typing
+
+
+class WriteCoalescer:
+    def __init__(self, flush_func: typing.Callable[[list], typing.Any], max_msg_num: int = 1000,
+                 max_bytes: int = 1024 * 1024, max_latency: float = 0.002, logger=None, thread_name: str = 'write_coalescer'):
+        """
+        :param flush_func: 真正批量写入的函数，入参是消息列表。
+        :param max_msg_num: 每批最多多少条消息。
+        :param max_bytes: 每批消息最多多少字节，超过就分成多批写入。
+        :param max_latency: 一条消息进入缓冲后，最多等待多少秒就写入。
+        """
+        self._flush_func = flush_func
+        self.max_msg_num = max_msg_num
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.logger = logger
+        self._buffer = collections.deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._lock_for_flush = threading.Lock()  # 推送线程和 flush() 之间互斥,保证消息先后顺序,发布线程不用这个锁.
+        self._flusher_is_idle = False
+        self._flush_requested = False
+        self._flusher_thread = threading.Thread(target=self._flusher_loop, name=thread_name, daemon=True)
+        self._flusher_thread.start()
+
+    def put(self, msg: typing.Union[str, bytes]):
+        buffer = self._buffer
+        buffer.append(msg)
+        if self._flusher_is_idle:  # 推送线程在无限等待，需要唤醒它开始计时。
+            self._notify()
+            return
+        msg_num = len(buffer)
+        # 字节数用 当前条数*这条消息的长度 估算，不需要多线程共享累加一个字节计数。真正分批时候按实际字节数。
+        if not self._flush_requested and (msg_num >= self.max_msg_num or msg_num * len(msg) >= self.max_bytes):
+            self._flush_requested = True
+            self._notify()
+
+    def _notify(self):
+        with self._condition:
+            self._condition.notify()
+
+    def _is_full(self):
+        return self._flush_requested or len(self._buffer) >= self.max_msg_num
+
+    def _flusher_loop(self):
+        condition = self._condition
+        while True:
+            with condition:
+                self._flusher_is_idle = True  # 必须先设置标志再检查缓冲，发布线程才不会错过唤醒。
+                while not self._buffer:
+                    condition.wait(1)
+                self._flusher_is_idle = False
+                deadline = time.monotonic() + self.max_latency
+                while not self._is_full():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+            try:
+                self.flush()
+            except BaseException as e:  # 推送线程不能退出，和 keep_circulating 一样记录错误后继续。
+                if self.logger:
+                    self.logger.exception(f'批量写入出错 {type(e)} {e}')
+                time.sleep(0.1)
+
+    def _pop_chunk(self) -> list:
+        buffer = self._buffer
+        chunk = []
+        chunk_bytes = 0
+        while buffer and len(chunk) < self.max_msg_num:
+            msg = buffer.popleft()
+            chunk.append(msg)
+            chunk_bytes += len(msg)
+            if chunk_bytes >= self.max_bytes:
+                break
+        return chunk
+
+    def flush(self):
+        """把缓冲中的消息全部写入,批量发布前和程序退出前调用,先写入之前单条发布的消息,保持先后顺序。"""
+        with self._lock_for_flush:
+            self._flush_requested = False
+            while True:
+                chunk = self._pop_chunk()
+                if not chunk:
+                    break
+                try:
+                    self._flush_func(chunk)
+                except BaseException:
+                    self._buffer.extendleft(reversed(chunk))  # 写入失败的消息放回缓冲最前面，下次重新写入，不丢失。
+                    raise
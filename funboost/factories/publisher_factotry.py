@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 # @Author  : ydf
 # @Time    : 2022/8/8 0008 13:16
+import asyncio
 import copy
+import functools
+import typing
+import weakref
 
 from typing import Callable
 from funboost.publishers.base_publisher import AbstractPublisher
 from funboost.core.func_params_model import PublisherParams
+from funboost.publishers.base_aio_publisher import AbstractAioPublisher
 
 
 # broker_kind__publisher_type_map
@@ -42,3 +47,46 @@ def get_publisher(publisher_params: PublisherParams) -> AbstractPublisher:
 
         return PublsiherClsOverride(publisher_params)
 
+
+
+@functools.lru_cache()
+def _get_publisher_cls__aio_publisher_cls_map() -> dict:
+    """延迟导入,没有使用对应中间件的不需要安装三方包"""
+    from funboost.publishers.redis_publisher import RedisPublisher
+    from funboost.publishers.redis_publisher_lpush import RedisPublisherLpush
+    from funboost.publishers.redis_publisher_priority import RedisPriorityPublisher
+    from funboost.publishers.http_publisher import HTTPPublisher
+    from funboost.publishers.redis_aio_publisher import AioRedisPublisher, AioRedisPriorityPublisher
+    from funboost.publishers.http_aio_publisher import AioHTTPPublisher
+    from funboost.publishers.rabbitmq_aio_publisher import AioRabbitmqPublisher
+    publisher_cls__aio_publisher_cls_map = {
+        RedisPublisher: AioRedisPublisher,
+        RedisPublisherLpush: AioRedisPublisher,
+        RedisPriorityPublisher: AioRedisPriorityPublisher,
+        HTTPPublisher: AioHTTPPublisher,
+    }
+    try:
+        from funboost.publishers.rabbitmq_amqpstorm_publisher import RabbitmqPublisherUsingAmqpStorm
+        publisher_cls__aio_publisher_cls_map[RabbitmqPublisherUsingAmqpStorm] = AioRabbitmqPublisher
+    except ImportError:
+        pass
+    return publisher_cls__aio_publisher_cls_map
+
+
+_publisher__loop__aio_publisher_map = weakref.WeakKeyDictionary()  # type: typing.MutableMapping[AbstractPublisher,typing.MutableMapping[asyncio.AbstractEventLoop,AbstractAioPublisher]]
+
+
+def get_aio_publisher(publisher: AbstractPublisher) -> typing.Optional[AbstractAioPublisher]:
+    """
+    获取同步发布者对应的asyncio原生发布者,每个事件循环一个实例。
+    没有对应异步实现的中间件,或者用户使用了 publisher_override_cls 自定义了发布者的,返回None,调用方继续使用 run_in_executor 的方式。
+    必须在事件循环里面调用。
+    """
+    aio_publisher_cls = _get_publisher_cls__aio_publisher_cls_map().get(type(publisher))
+    if aio_publisher_cls is None:
+        return None
+    loop = asyncio.get_running_loop()
+    loop__aio_publisher_map = _publisher__loop__aio_publisher_map.setdefault(publisher, weakref.WeakKeyDictionary())
+    if loop not in loop__aio_publisher_map:
+        loop__aio_publisher_map[loop] = aio_publisher_cls(publisher)
+    return loop__aio_publisher_map[loop]
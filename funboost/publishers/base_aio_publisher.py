@@ -0,0 +1,75 @@
+import abc
+import asyncio
+import logging
+import time
+import typing
+
+from funboost.core.func_params_model import PriorityConsumingControlConfig
+from funboost.core.msg_result_getter import AioAsyncResult
+from funboost.publishers.base_publisher import AbstractPublisher
+
+
+class AbstractAioPublisher(metaclass=abc.ABCMeta):
+    """
+    asyncio 原生的发布者，不再通过 run_in_executor 把同步发布丢到线程池里面执行。
+
+    入参检查 生成task_id 序列化 这些纯cpu的操作仍然复用同步发布者的方法，保证两种方式发布的消息完全一样，
+    只有和中间件的网络交互是异步的。
+    异步客户端的连接不能跨事件循环使用，所以每个事件循环一个实例，由 publisher_factotry.get_aio_publisher 创建和缓存。
+    """
+    def __init__(self, publisher: AbstractPublisher):
+        self.publisher = publisher
+        self.publisher_params = publisher.publisher_params
+        self.queue_name = self._queue_name = publisher.queue_name
+        self.logger = publisher.logger
+        self._has_init_broker = False
+        self._lock_for_init_broker = asyncio.Lock()
+        self.custom_init()
+
+    def custom_init(self):
+        pass
+
+    async def init_broker(self):
+        pass
+
+    async def _ensure_init_broker(self):
+        if self._has_init_broker:
+            return
+        async with self._lock_for_init_broker:
+            if not self._has_init_broker:
+                await self.init_broker()
+                self._has_init_broker = True
+
+    async def _init_broker_and_publish(self, msg: typing.Union[str, bytes]):
+        await self._ensure_init_broker()
+        return await self.concrete_realization_of_publish(msg)
+
+    async def _publish_with_retry(self, msg: typing.Union[str, bytes]):
+        return await self.publisher._publish_retry_policy.aio_call(self._init_broker_and_publish, msg)
+
+    async def publish(self, msg: typing.Union[str, dict], task_id=None,
+                      priority_control_config: PriorityConsumingControlConfig = None) -> AioAsyncResult:
+        msg, msg_function_kw, extra_params, task_id = self.publisher._convert_msg(msg, task_id, priority_control_config)
+        is_debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        if is_debug_enabled:
+            t_start = time.time()
+        if self.publisher._local_spool is not None:
+            self.publisher._local_spool.put(self.publisher._serialize_msg(msg))  # 写本地内存映射文件，不会阻塞事件循环。
+        else:
+            await self._publish_with_retry(self.publisher._serialize_msg(msg))
+        if is_debug_enabled:
+            self.logger.debug(f'向{self._queue_name} 队列，异步推送消息 耗时{round(time.time() - t_start, 4)}秒  {msg_function_kw}', extra={'task_id': task_id})
+        self.publisher._record_publish_count(1)  # 和同步发布共用计数
+        return AioAsyncResult(task_id)
+
+    async def push(self, *func_args, **func_kwargs) -> AioAsyncResult:
+        return await self.publish(self.publisher._convert_push_args_to_msg_dict(func_args, func_kwargs))
+
+    delay = push
+
+    @abc.abstractmethod
+    async def concrete_realization_of_publish(self, msg: typing.Union[str, bytes]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
@@ -3,7 +3,6 @@
 # @Time    : 2022/8/8 0008 11:57
 import abc
 import atexit
-import copy
 import inspect
 import logging
 import multiprocessing
@@ -16,18 +15,20 @@ from pathlib import Path
 from threading import Lock
 
 import nb_log
+import pydantic
 from nb_libs.path_helper import PathHelper
 
-from funboost.constant import ConstStrForClassMethod, FunctionKind
+from funboost.constant import ConstStrForClassMethod, FunctionKind, SerializerEnum
+from funboost.core.per_thread_counter import PerThreadCounter
 from funboost.core.func_params_model import PublisherParams, PriorityConsumingControlConfig
-from funboost.core.helper_funs import MsgGenerater
+from funboost.core.helper_funs import MsgGenerater, delete_keys_and_return_new_dict
 # from nb_log import LoggerLevelSetterMixin, LoggerMixin
 from funboost.core.loggers import LoggerLevelSetterMixin, FunboostFileLoggerMixin
 from funboost.core.msg_result_getter import AsyncResult, AioAsyncResult
+from funboost.core.retry_policy import RetryPolicy
 from funboost.core.serialization import Serialization
 from funboost.core.task_id_logger import TaskIdLogger
 from funboost.funboost_config_deafult import FunboostCommonConfig
-from funboost.utils import decorators
 
 RedisAsyncResult = AsyncResult  # 别名
 RedisAioAsyncResult = AioAsyncResult  # 别名
@@ -98,17 +99,28 @@ RedisAioAsyncResult = AioAsyncResult  # 别名
 #         return priority_consuming_control_config_dict
 
 
+_IS_PYDANTIC_V2 = int(pydantic.VERSION.split('.')[0]) >= 2
+_PYDANTIC_V1_STRICT_TYPE_MAP = {int: pydantic.StrictInt, float: typing.Union[pydantic.StrictFloat, pydantic.StrictInt], str: pydantic.StrictStr,  # 和v2严格模式一样，float接受int
+                                bool: pydantic.StrictBool, bytes: pydantic.StrictBytes}
+
+
 class PublishParamsChecker(FunboostFileLoggerMixin):
     """
     发布的任务的函数参数检查，使发布的任务在消费时候不会出现低级错误。
+    函数的入参信息在Booster创建发布者时候解析一次，每条消息只做不需要创建临时对象的集合比较。
     """
 
-    def __init__(self, func: typing.Callable):
+    def __init__(self, func: typing.Callable, is_check_type: bool = False, func_kind: str = None):
+        """
+        :param is_check_type: 是否按照函数入参的类型注解校验参数类型，会预先生成pydantic模型。
+        :param func_kind: FunctionKind，类方法和实例方法的第一个参数不校验类型。
+        """
         # print(func)
         spec = inspect.getfullargspec(func)
         # 这个是什么作用
         self.all_arg_name = spec.args
         self.all_arg_name_set = set(spec.args)
+        self._all_arg_name_tuple = tuple(spec.args)
         # print(spec.args)
         if spec.defaults:
             len_deafult_args = len(spec.defaults)
@@ -121,34 +133,89 @@ class PublishParamsChecker(FunboostFileLoggerMixin):
             self.position_arg_name_set = set(self.position_arg_name_list)
             self.keyword_arg_name_list = []
             self.keyword_arg_name_set = set()
+        self._type_check_model = self._build_type_check_model(func, spec, func_kind) if is_check_type else None
         self.logger.debug(f'{func} 函数的入参要求是 全字段 {self.all_arg_name_set} ,必须字段为 {self.position_arg_name_set} ')
         # 最终获取到了所有的参数名，以及所有的位置参数名
+
+    @staticmethod
+    def _build_type_check_model(func: typing.Callable, spec: inspect.FullArgSpec, func_kind: str = None):
+        try:
+            annotations = typing.get_type_hints(func)
+        except Exception:  # 注解是字符串并且无法解析时候，使用原始注解。
+            annotations = spec.annotations
+        arg_name__default_map = dict(zip(spec.args[-len(spec.defaults):], spec.defaults)) if spec.defaults else {}
+        arg_names = spec.args[1:] if func_kind in (FunctionKind.CLASS_METHOD, FunctionKind.INSTANCE_METHOD) else spec.args
+        fields = {}
+        for arg_name in arg_names:
+            if arg_name in annotations:
+                fields[arg_name] = (annotations[arg_name], arg_name__default_map.get(arg_name, ...))
+        if not fields:
+            return None
+        # 使用严格模式，不做类型转换，例如注解是int时候 "1" 校验不通过。宽松模式下 "1" 能通过校验，但发布出去的仍然是字符串，消费函数收到的类型和注解不一致。
+        if _IS_PYDANTIC_V2:
+            return pydantic.create_model(f'{func.__name__}_PublishParamsModel',
+                                         __config__=pydantic.ConfigDict(strict=True, arbitrary_types_allowed=True), **fields)
+        fields = {arg_name: (_PYDANTIC_V1_STRICT_TYPE_MAP.get(annotation, annotation), default)
+                  for arg_name, (annotation, default) in fields.items()}  # pydantic v1 没有严格模式，只能把基本类型换成严格类型
+        return pydantic.create_model(f'{func.__name__}_PublishParamsModel', **fields)
+
     def check_params(self, publish_params: dict):
-        publish_params_keys_set = set(publish_params.keys())
-        if publish_params_keys_set.issubset(self.all_arg_name_set) and publish_params_keys_set.issuperset(
-                self.position_arg_name_set):
-            return True
-        else:
-            raise ValueError(f'你发布的参数不正确，你发布的任务的所有键是 {publish_params_keys_set}， '
+        publish_params_keys = publish_params.keys()  # dict的keys视图可以直接和set比较，不需要每次创建一个新的set
+        if not (publish_params_keys <= self.all_arg_name_set and publish_params_keys >= self.position_arg_name_set):
+            raise ValueError(f'你发布的参数不正确，你发布的任务的所有键是 {set(publish_params_keys)}， '
                              f'必须是 {self.all_arg_name_set} 的子集， 必须是 {self.position_arg_name_set} 的超集')
+        if self._type_check_model is not None:
+            try:
+                self._type_check_model(**publish_params)
+            except pydantic.ValidationError as e:
+                raise ValueError(f'你发布的参数类型和消费函数的类型注解不一致, {e}')
+        return True
+
+    def bind_push_args(self, func_args: typing.Sequence, func_kwargs: dict) -> dict:
+        """普通函数 push(*args, **kwargs) 转成入参字典的快速路径"""
+        if len(func_args) > len(self._all_arg_name_tuple):
+            raise ValueError(f'你push的位置参数个数是 {len(func_args)}，超过了函数的入参个数 {len(self._all_arg_name_tuple)}')
+        if not func_kwargs:
+            return dict(zip(self._all_arg_name_tuple, func_args))
+        func_kwargs.update(zip(self._all_arg_name_tuple, func_args))  # func_kwargs 是 **kwargs 新建的字典，可以直接修改。
+        return func_kwargs
 
 
 class AbstractPublisher(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
+    SUPPORT_BINARY_MSG = False  # concrete_realization_of_publish 能否直接发送bytes,为False时候非json序列化的消息转成base64文本发送.
+    SUPPORT_NON_JSON_SERIALIZER = True  # 发布时候需要把消息json.loads交给三方框架的发布者,只能使用json序列化.
+
     def __init__(self, publisher_params: PublisherParams, ):
         self.publisher_params = publisher_params
         self.queue_name = self._queue_name = publisher_params.queue_name
         self.logger: logging.Logger
         self._build_logger()
-        self.publish_params_checker = PublishParamsChecker(publisher_params.consuming_function) if publisher_params.consuming_function else None
+        self._serializer_codec = None
+        if publisher_params.serializer != SerializerEnum.JSON:
+            if not self.SUPPORT_NON_JSON_SERIALIZER:
+                raise ValueError(f'{self.__class__.__name__} 只支持 json 序列化,不支持 {publisher_params.serializer}')
+            self._serializer_codec = Serialization.get_codec(publisher_params.serializer)
+        self.publish_params_checker = PublishParamsChecker(
+            publisher_params.consuming_function, is_check_type=publisher_params.check_publish_func_params_type,
+            func_kind=publisher_params.consuming_function_kind) if publisher_params.consuming_function else None
+        self._is_publish_params_check_enabled = bool(self.publish_params_checker and publisher_params.should_check_publish_func_params)
+        self._is_method_consuming_function = publisher_params.consuming_function_kind in (FunctionKind.CLASS_METHOD, FunctionKind.INSTANCE_METHOD)
 
         self.has_init_broker = 0
-        self._lock_for_count = Lock()
+        self._publish_retry_policy = RetryPolicy(retry_times=10, base_sleep_seconds=0.1, max_sleep_seconds=2, logger=self.logger)
+        self._publish_counter = PerThreadCounter()  # 每个线程只加自己的计数，发布时候不再抢锁。
+        self._lock_for_count = Lock()  # 只有每10秒汇总计数的那一个线程才会用到这个锁。
         self._current_time = None
         self.count_per_minute = None
+        self.publish_msg_num_total = 0
         self._init_count()
         self.custom_init()
+        self._local_spool = None
+        if publisher_params.publish_local_spool_dir:
+            from funboost.core.local_spool import LocalSpool
+            self._local_spool = LocalSpool(publisher_params.publish_local_spool_dir, self._queue_name,
+                                           self.concrete_realization_of_publish_batch, logger=self.logger)
         self.logger.info(f'{self.__class__} 被实例化了')
-        self.publish_msg_num_total = 0
 
         self.__init_time = time.time()
         atexit.register(self._at_exit)
@@ -171,25 +238,45 @@ class AbstractPublisher(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         self._current_time = time.time()
         self.count_per_minute = 0
 
+    def _collect_publish_count(self):
+        """把各线程的发布计数汇总到 count_per_minute 和 publish_msg_num_total，调用者需要持有 _lock_for_count"""
+        publish_num = self._publish_counter.collect()
+        self.count_per_minute += publish_num
+        self.publish_msg_num_total += publish_num
+
+    def _record_publish_count(self, publish_num: int = 1):
+        """发布成功后调用，平时只是当前线程的计数器做加法，每10秒才由一个线程汇总并打印日志。"""
+        self._publish_counter.incr(publish_num)
+        now = time.time()
+        if now - self._current_time > 10:
+            with self._lock_for_count:
+                if now - self._current_time <= 10:  # 其他线程刚刚汇总过了
+                    return
+                self._collect_publish_count()
+                self.logger.info(
+                    f'10秒内推送了 {self.count_per_minute} 条消息,累计推送了 {self.publish_msg_num_total} 条消息到 {self._queue_name} 队列中')
+                self._init_count()
+
     def custom_init(self):
         pass
 
-    @staticmethod
-    def _get_from_other_extra_params(k: str, msg):
+    def _serialize_msg(self, msg: dict) -> typing.Union[str, bytes]:
+        if self._serializer_codec is None:
+            return Serialization.to_json_str(msg)
+        return Serialization.dumps_by_codec(msg, self._serializer_codec, self.SUPPORT_BINARY_MSG)
+
+    def _get_from_other_extra_params(self, k: str, msg):
         # msg_dict = json.loads(msg) if isinstance(msg, str) else msg
-        msg_dict = Serialization.to_dict(msg)
+        msg_dict = Serialization.to_dict(msg, self.publisher_params.serializer)  # 是自己刚序列化的消息,可以解码
         return msg_dict['extra'].get('other_extra_params', {}).get(k, None)
 
     def _convert_msg(self, msg: typing.Union[str, dict], task_id=None,
                      priority_control_config: PriorityConsumingControlConfig = None) -> (typing.Dict, typing.Dict, typing.Dict, str):
-        msg = Serialization.to_dict(msg)
-        msg_function_kw = copy.deepcopy(msg)
-        raw_extra = {}
-        if 'extra' in msg:
-            msg_function_kw.pop('extra')
-            raw_extra = msg['extra']
+        msg = dict(Serialization.to_dict(msg, self.publisher_params.serializer))  # 重回队列时候会发布已经编码的消息。下面只会给一级键 extra 重新赋值,浅拷贝就不会改变用户自身的传参字典,不需要deepcopy.
+        msg_function_kw = delete_keys_and_return_new_dict(msg, ['extra'])
+        raw_extra = msg.get('extra', {})
             # 参数检查功能
-        if self.publish_params_checker and self.publisher_params.should_check_publish_func_params:
+        if self._is_publish_params_check_enabled:
             self.publish_params_checker.check_params(msg_function_kw)
         task_id = task_id or MsgGenerater.generate_task_id(self._queue_name)
         extra_params = MsgGenerater.generate_pulish_time_and_task_id(self._queue_name, task_id=task_id)
@@ -208,26 +295,26 @@ class AbstractPublisher(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         :param priority_control_config:优先级配置，消息可以携带优先级配置，覆盖boost的配置。
         :return:
         """
-        msg = copy.deepcopy(msg)  # 字典是可变对象,不要改变影响用户自身的传参字典. 用户可能继续使用这个传参字典.
         msg, msg_function_kw, extra_params, task_id = self._convert_msg(msg, task_id, priority_control_config)
-        t_start = time.time()
-        decorators.handle_exception(retry_times=10, is_throw_error=True, time_sleep=0.1)(
-            self.concrete_realization_of_publish)(Serialization.to_json_str(msg))
-
-        self.logger.debug(f'向{self._queue_name} 队列，推送消息 耗时{round(time.time() - t_start, 4)}秒  {msg_function_kw}', extra={'task_id': task_id})  # 显示msg太长了。
-        with self._lock_for_count:
-            self.count_per_minute += 1
-            self.publish_msg_num_total += 1
-            if time.time() - self._current_time > 10:
-                self.logger.info(
-                    f'10秒内推送了 {self.count_per_minute} 条消息,累计推送了 {self.publish_msg_num_total} 条消息到 {self._queue_name} 队列中')
-                self._init_count()
+        is_debug_enabled = self.logger.isEnabledFor(logging.DEBUG)  # 不打印debug日志时候不计时也不拼接日志字符串
+        if is_debug_enabled:
+            t_start = time.time()
+        if self._local_spool is not None:
+            self._local_spool.put(self._serialize_msg(msg))  # 只写入本地，由后台线程转发到中间件。
+        else:
+            self._publish_retry_policy.call(self.concrete_realization_of_publish, self._serialize_msg(msg))
+        if is_debug_enabled:
+            self.logger.debug(f'向{self._queue_name} 队列，推送消息 耗时{round(time.time() - t_start, 4)}秒  {msg_function_kw}', extra={'task_id': task_id})  # 显示msg太长了。
+        self._record_publish_count(1)
         return AsyncResult(task_id)
 
     def send_msg(self, msg: typing.Union[dict, str]):
         """直接发送任意消息内容到消息队列,不生成辅助参数,无视函数入参名字,不校验入参个数和键名"""
-        decorators.handle_exception(retry_times=10, is_throw_error=True, time_sleep=0.1)(
-            self.concrete_realization_of_publish)(Serialization.to_json_str(msg))
+        msg = msg if isinstance(msg, (str, bytes)) else self._serialize_msg(msg)
+        if self._local_spool is not None:
+            self._local_spool.put(msg)
+        else:
+            self._publish_retry_policy.call(self.concrete_realization_of_publish, msg)
 
     @staticmethod
     def __get_cls_file(cls: type):
@@ -251,6 +338,14 @@ class AbstractPublisher(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
         :param func_kwargs:
         :return:
         """
+        return self.publish(self._convert_push_args_to_msg_dict(func_args, func_kwargs))
+
+    delay = push  # 那就来个别名吧，两者都可以。
+
+    def _convert_push_args_to_msg_dict(self, func_args: typing.Sequence, func_kwargs: dict) -> dict:
+        """把push的位置参数和关键字参数转成publish的入参字典"""
+        if not self._is_method_consuming_function:
+            return self.publish_params_checker.bind_push_args(func_args, func_kwargs)
         # print(func_args, func_kwargs, self.publish_params_checker.all_arg_name)
         msg_dict = func_kwargs
         # print(msg_dict)
@@ -291,14 +386,80 @@ class AbstractPublisher(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
 
         # print(msg_dict)
         # 这里会更新msg_dict中的内容为函数的入参，self参数会因为前面做的func_args_list[0]进行修改
-        return self.publish(msg_dict)
+        return msg_dict
 
-    delay = push  # 那就来个别名吧，两者都可以。
+    def publish_many(self, msgs: typing.Iterable[typing.Union[str, dict]], priority_control_config: PriorityConsumingControlConfig = None,
+                     batch_size: int = 1000) -> int:
+        """
+        批量发布，适合一次性快速发布几百万上千万任务。
+        入参检查 生成task_id 序列化 在一个紧凑的循环里面完成，每 batch_size 条消息调用一次 concrete_realization_of_publish_batch，
+        各种中间件在这个方法里面使用自己的批量发送方式(redis一次rpush多条，kafka发送完统一flush，数据库executemany等)。
+
+        :param msgs: 消息的可迭代对象，可以是生成器，不需要一次性把所有消息放在内存里面。
+        :param priority_control_config: 所有消息共用的控制参数
+        :param batch_size: 每批发送多少条
+        :return: 发布的消息数量。需要每条消息的task_id获取rpc结果的，用publish。
+
+        一批消息中途发送失败时候会重试，是至少一次(at-least-once)语义：
+        逐条发送的中间件和 rabbitmq 只重发还没发送成功的部分；redis 一次rpush多条 数据库一个事务插入 是原子的，不会重复；
+        kafka 是异步发送然后统一flush的，不知道哪些已经发送成功，会整批重发，已经发送成功的那部分消息会重复，消费函数需要能承受重复消息。
+        使用 publish_local_spool_dir 时候，本地spool转发失败也是整批重发。
+        """
+        t_start = time.time()
+        publish_num = 0
+        batch = []
+        for msg in msgs:
+            msg, msg_function_kw, extra_params, task_id = self._convert_msg(msg, None, priority_control_config)
+            batch.append(self._serialize_msg(msg))
+            if len(batch) >= batch_size:
+                publish_num += self._publish_batch(batch)
+                batch = []
+        if batch:
+            publish_num += self._publish_batch(batch)
+        self.logger.info(f'向{self._queue_name} 队列，批量推送了 {publish_num} 条消息 耗时{round(time.time() - t_start, 4)}秒')
+        return publish_num
+
+    def push_many(self, args_iter: typing.Iterable[typing.Union[tuple, dict, typing.Any]], batch_size: int = 1000) -> int:
+        """
+        批量的push，每个元素是消费函数的位置参数元组，或者是消费函数的关键字参数字典，其他类型的元素当作消费函数唯一的位置参数。
+        例如消费函数是 def add(x,y) ，可以 push_many((i, i * 2) for i in range(10000000))
+        """
+        return self.publish_many((self._convert_push_args_to_msg_dict(*self._split_push_many_item(args)) for args in args_iter), batch_size=batch_size)
+
+    @staticmethod
+    def _split_push_many_item(args) -> (tuple, dict):
+        if isinstance(args, tuple):
+            return args, {}
+        if isinstance(args, dict):
+            return (), dict(args)
+        return (args,), {}
+
+    def _publish_batch(self, msg_list: list) -> int:
+        msg_num = len(msg_list)  # concrete_realization_of_publish_batch 会删掉已经发送成功的消息
+        if self._local_spool is not None:
+            self._local_spool.put_many(msg_list)
+        else:
+            self._publish_retry_policy.call(self.concrete_realization_of_publish_batch, msg_list)
+        self._record_publish_count(msg_num)
+        return msg_num
 
     @abc.abstractmethod
     def concrete_realization_of_publish(self, msg: str):
         raise NotImplementedError
 
+    def concrete_realization_of_publish_batch(self, msg_list: typing.List[typing.Union[str, bytes]]):
+        """
+        批量发送已经序列化好的消息，中间件有批量接口的子类重写这个方法，默认是逐条发送。
+        能知道哪些消息已经发送成功的实现，要把它们从 msg_list 前面删掉，出错重试时候传入的是同一个列表，只会重发剩下的消息。
+        """
+        sent_num = 0
+        try:
+            for msg in msg_list:
+                self.concrete_realization_of_publish(msg)
+                sent_num += 1
+        finally:
+            del msg_list[:sent_num]
+
     @abc.abstractmethod
     def clear(self):
         raise NotImplementedError
@@ -316,10 +477,18 @@ class AbstractPublisher(LoggerLevelSetterMixin, metaclass=abc.ABCMeta, ):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+        with self._lock_for_count:
+            self._collect_publish_count()
         self.logger.warning(f'with中自动关闭publisher连接，累计推送了 {self.publish_msg_num_total} 条消息 ')
 
     def _at_exit(self):
         if multiprocessing.current_process().name == 'MainProcess':
+            with self._lock_for_count:
+                self._collect_publish_count()
+            if self._local_spool is not None:
+                pending_msg_count = self._local_spool.get_pending_msg_count()
+                if pending_msg_count:
+                    self.logger.warning(f'本地spool中还有 {pending_msg_count} 条消息没有转发到 {self._queue_name} 中间件，下次启动发布者时候会继续转发')
             self.logger.warning(
                 f'程序关闭前，{round(time.time() - self.__init_time)} 秒内，累计推送了 {self.publish_msg_num_total} 条消息 到 {self._queue_name} 中')
 
@@ -16,6 +16,7 @@ class CeleryPublisher(AbstractPublisher, ):
     """
     使用celery作为中间件
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
 
     def publish(self, msg: typing.Union[str, dict], task_id=None,
                 priority_control_config: PriorityConsumingControlConfig = None) -> celery.result.AsyncResult:
@@ -23,13 +24,7 @@ class CeleryPublisher(AbstractPublisher, ):
         t_start = time.time()
         celery_result = celery_app.send_task(name=self.queue_name, kwargs=msg_function_kw, task_id=extra_params['task_id'])  # type: celery.result.AsyncResult
         self.logger.debug(f'向{self._queue_name} 队列，推送消息 耗时{round(time.time() - t_start, 4)}秒  {msg_function_kw}')  # 显示msg太长了。
-        with self._lock_for_count:
-            self.count_per_minute += 1
-            self.publish_msg_num_total += 1
-            if time.time() - self._current_time > 10:
-                self.logger.info(
-                    f'10秒内推送了 {self.count_per_minute} 条消息,累计推送了 {self.publish_msg_num_total} 条消息到 {self._queue_name} 队列中')
-                self._init_count()
+        self._record_publish_count(1)
         # return AsyncResult(task_id)
         return celery_result  # 这里返回celery结果原生对象，类型是 celery.result.AsyncResult。
 
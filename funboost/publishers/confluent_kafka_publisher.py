@@ -36,6 +36,7 @@ class ConfluentKafkaPublisher(AbstractPublisher, ):
     """
     使用kafka作为中间件，这个confluent_kafka包的性能远强于 kafka-pyhton
     """
+    SUPPORT_BINARY_MSG = True
 
     # noinspection PyAttributeOutsideInit
     def custom_init(self):
@@ -57,11 +58,23 @@ class ConfluentKafkaPublisher(AbstractPublisher, ):
     def concrete_realization_of_publish(self, msg):
         # noinspection PyTypeChecker
         # self.logger.debug(msg)
-        self._confluent_producer.produce(self._queue_name, msg.encode(), )
+        self._confluent_producer.produce(self._queue_name, msg if isinstance(msg, bytes) else msg.encode(), )
         if time.time() - self._recent_produce_time > 1:
             self._confluent_producer.flush()
             self._recent_produce_time = time.time()
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        produce = self._confluent_producer.produce
+        for msg in msg_list:
+            value = msg if isinstance(msg, bytes) else msg.encode()
+            try:
+                produce(self._queue_name, value, )
+            except BufferError:  # 本地发送缓冲区满了，先等待发送出去一部分。
+                self._confluent_producer.flush()
+                produce(self._queue_name, value, )
+        self._confluent_producer.flush()
+        self._recent_produce_time = time.time()
+
     def clear(self):
         self.logger.warning('还没开始实现 kafka 清空 消息')
         # self._consumer.seek_to_end()
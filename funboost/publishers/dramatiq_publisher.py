@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 # @Author  : ydf
 
-import copy
 import json
 
 from funboost.funboost_config_deafult import BrokerConnConfig
 from funboost.assist.dramatiq_helper import DramatiqHelper
+from funboost.core.helper_funs import delete_keys_and_return_new_dict
 from funboost.publishers.base_publisher import AbstractPublisher
 from funboost.utils.redis_manager import RedisMixin
 
@@ -14,6 +14,7 @@ class DramatiqPublisher(AbstractPublisher, ):
     """
     使用dramatiq框架作为中间件
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
 
     # noinspection PyAttributeOutsideInit
     def custom_init(self):
@@ -22,9 +23,7 @@ class DramatiqPublisher(AbstractPublisher, ):
     def concrete_realization_of_publish(self, msg):
         if isinstance(msg, str):
             msg = json.loads(msg)
-        msg_function_kw = copy.deepcopy(msg)
-        if 'extra' in msg:
-            msg_function_kw.pop('extra')
+        msg_function_kw = delete_keys_and_return_new_dict(msg, ['extra'])
         DramatiqHelper.queue_name__actor_map[self.queue_name].send(**msg_function_kw)
 
     def clear(self):
@@ -19,6 +19,7 @@ class FastStreamPublisher(AbstractPublisher, metaclass=abc.ABCMeta):
     """
     空的发布者，空的实现，需要搭配 boost入参的 consumer_override_cls 和 publisher_override_cls使用，或者被继承。
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
     def custom_init(self):
         pass
         # asyncio.get_event_loop().run_until_complete(broker.start())
@@ -31,13 +32,7 @@ class FastStreamPublisher(AbstractPublisher, metaclass=abc.ABCMeta):
         t_start = time.time()
         faststream_result =  asyncio.get_event_loop().run_until_complete(self.broker.publish(Serialization.to_json_str(msg), self.queue_name))
         self.logger.debug(f'向{self._queue_name} 队列，推送消息 耗时{round(time.time() - t_start, 4)}秒  {msg_function_kw}')  # 显示msg太长了。
-        with self._lock_for_count:
-            self.count_per_minute += 1
-            self.publish_msg_num_total += 1
-            if time.time() - self._current_time > 10:
-                self.logger.info(
-                    f'10秒内推送了 {self.count_per_minute} 条消息,累计推送了 {self.publish_msg_num_total} 条消息到 {self._queue_name} 队列中')
-                self._init_count()
+        self._record_publish_count(1)
         # return AsyncResult(task_id)
         return faststream_result  #
 
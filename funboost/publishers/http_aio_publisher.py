@@ -0,0 +1,23 @@
+from funboost.core.lazy_impoter import AioHttpImporter
+from funboost.publishers.base_aio_publisher import AbstractAioPublisher
+
+
+class AioHTTPPublisher(AbstractAioPublisher):
+    """HTTPPublisher 对应的异步发布者，使用 aiohttp 。"""
+
+    # noinspection PyAttributeOutsideInit
+    def custom_init(self):
+        url = self.queue_name + '/queue'
+        self._url = url if url.startswith('http') else f'http://{url}'
+
+    # noinspection PyAttributeOutsideInit
+    async def init_broker(self):
+        self._session = AioHttpImporter().aiohttp.ClientSession()
+
+    async def concrete_realization_of_publish(self, msg):
+        async with self._session.post(self._url, data={'msg': msg}) as resp:
+            await resp.read()
+
+    async def close(self):
+        if self._has_init_broker:
+            await self._session.close()
@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 # @Author  : ydf
 
-import copy
 import json
 
 from huey import RedisHuey
 
 from funboost.funboost_config_deafult import BrokerConnConfig
 from funboost.assist.huey_helper import HueyHelper
+from funboost.core.helper_funs import delete_keys_and_return_new_dict
 from funboost.publishers.base_publisher import AbstractPublisher
 from funboost.utils.redis_manager import RedisMixin
 
@@ -16,6 +16,7 @@ class HueyPublisher(AbstractPublisher, ):
     """
     使用huey框架作为中间件
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
 
     # noinspection PyAttributeOutsideInit
     def custom_init(self):
@@ -25,9 +26,7 @@ class HueyPublisher(AbstractPublisher, ):
     def concrete_realization_of_publish(self, msg):
         if isinstance(msg, str):
             msg = json.loads(msg)
-        msg_function_kw = copy.deepcopy(msg)
-        if 'extra' in msg:
-            msg_function_kw.pop('extra')
+        msg_function_kw = delete_keys_and_return_new_dict(msg, ['extra'])
         self._huey_task_fun(**msg_function_kw)
 
     def clear(self):
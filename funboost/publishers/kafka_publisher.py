@@ -14,6 +14,7 @@ class KafkaPublisher(AbstractPublisher, ):
     """
     使用kafka作为中间件
     """
+    SUPPORT_BINARY_MSG = True
 
     # noinspection PyAttributeOutsideInit
     def custom_init(self):
@@ -32,7 +33,12 @@ class KafkaPublisher(AbstractPublisher, ):
         # noinspection PyTypeChecker
         # self.logger.debug(msg)
         # print(msg)
-        self._producer.send(self._queue_name, msg.encode(), )
+        self._producer.send(self._queue_name, msg if isinstance(msg, bytes) else msg.encode(), )
+
+    def concrete_realization_of_publish_batch(self, msg_list):
+        for msg in msg_list:
+            self._producer.send(self._queue_name, msg if isinstance(msg, bytes) else msg.encode(), )
+        self._producer.flush()
 
     def clear(self):
         self.logger.warning('还没开始实现 kafka 清空 消息')
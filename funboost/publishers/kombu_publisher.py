@@ -43,6 +43,7 @@ class KombuPublisher(AbstractPublisher, ):
     """
     使用kombu作为中间件,这个能直接一次性支持很多种小众中间件，但性能很差，除非是分布式函数调度框架没实现的中间件种类用户才可以用这种，用户也可以自己对比性能。
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
 
     def custom_init(self):
         self.kombu_url = self.publisher_params.broker_exclusive_config['kombu_url'] or BrokerConnConfig.KOMBU_URL
@@ -14,6 +14,7 @@ class LocalPythonQueuePublisher(AbstractPublisher):
     """
     使用python内置queue对象作为中间件。方便测试，每个中间件的消费者类是鸭子类，多态可以互相替换。
     """
+    SUPPORT_BINARY_MSG = True
 
     # noinspection PyAttributeOutsideInit
 
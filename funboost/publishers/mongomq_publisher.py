@@ -11,6 +11,7 @@ from funboost.utils.mongo_util import MongoMixin
 
 
 class MongoMqPublisher(AbstractPublisher, MongoMixin):
+    SUPPORT_NON_JSON_SERIALIZER = False
     # 使用mongo-queue包实现的基于mongodb的队列。 队列是一个col，自动存放在consume_queues库中。
     # noinspection PyAttributeOutsideInit
 
@@ -21,6 +21,7 @@ class NamekoPublisher(AbstractPublisher, ):
     """
     使用nameko作为中间件
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
 
     def custom_init(self):
         self._rpc = ClusterRpcProxy(get_nameko_config())
@@ -20,6 +20,9 @@ class PeeweePublisher(AbstractPublisher):
         # print(msg)
         self.queue.push(body=msg, )
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        self.queue.bulk_push(msg_list)
+
     def clear(self):
         self.queue.clear_queue()
         self.logger.warning(f'清除 sqlalchemy 数据库队列 {self._queue_name} 中的消息成功')
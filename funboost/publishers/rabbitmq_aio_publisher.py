@@ -0,0 +1,33 @@
+from funboost.funboost_config_deafult import BrokerConnConfig
+from funboost.publishers.base_aio_publisher import AbstractAioPublisher
+
+
+class AioRabbitmqPublisher(AbstractAioPublisher):
+    """
+    RabbitmqPublisherUsingAmqpStorm 对应的异步发布者，使用 aio-pika 包，需要 pip install aio-pika 。
+    声明队列的参数和同步发布者一样，消费者仍然是 amqpstorm 消费者。
+    """
+
+    # noinspection PyAttributeOutsideInit
+    async def init_broker(self):
+        import aio_pika
+        self._aio_pika = aio_pika
+        self.logger.warning(f'使用aio-pika包 链接mq')
+        self.connection = await aio_pika.connect_robust(
+            f'amqp://{BrokerConnConfig.RABBITMQ_USER}:{BrokerConnConfig.RABBITMQ_PASS}@{BrokerConnConfig.RABBITMQ_HOST}:{BrokerConnConfig.RABBITMQ_PORT}/{BrokerConnConfig.RABBITMQ_VIRTUAL_HOST}',
+            heartbeat=60 * 10)
+        self.channel = await self.connection.channel()
+        queue_declare_params = self.publisher.queue_declare_params
+        await self.channel.declare_queue(queue_declare_params['queue'], durable=queue_declare_params['durable'],
+                                         auto_delete=queue_declare_params['auto_delete'], arguments=queue_declare_params['arguments'])
+
+    async def concrete_realization_of_publish(self, msg):
+        message = self._aio_pika.Message(body=msg if isinstance(msg, bytes) else msg.encode(),
+                                         delivery_mode=self._aio_pika.DeliveryMode.PERSISTENT,
+                                         priority=self.publisher._get_from_other_extra_params('priroty', msg))
+        await self.channel.default_exchange.publish(message, routing_key=self._queue_name)
+
+    async def close(self):
+        if self._has_init_broker:
+            await self.connection.close()
+            self.logger.warning('关闭aio-pika包 链接mq')
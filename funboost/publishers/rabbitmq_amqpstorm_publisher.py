@@ -7,6 +7,7 @@ from amqpstorm.queue import Queue as AmqpStormQueue
 from funboost.funboost_config_deafult import BrokerConnConfig
 from funboost.publishers.base_publisher import AbstractPublisher, deco_mq_conn_error
 from funboost.utils import decorators
+from funboost.utils.amqpstorm_channel_pool import AmqpStormChannelPool
 
 
 class RabbitmqPublisherUsingAmqpStorm(AbstractPublisher):
@@ -23,29 +24,53 @@ class RabbitmqPublisherUsingAmqpStorm(AbstractPublisher):
         if self.publisher_params.broker_exclusive_config['x-max-priority']:
             arguments['x-max-priority'] = self.publisher_params.broker_exclusive_config['x-max-priority']
         self.queue_declare_params = dict(queue=self._queue_name, durable=self.DURABLE, arguments=arguments,auto_delete=False)
+        # 发布消息使用channel池，多线程发布不再争抢同一个channel和全局锁。init_broker 创建的单独连接用于清空队列 查询消息数量和消费。
+        self._channel_pool = AmqpStormChannelPool(
+            self._build_amqp_uri(),
+            connection_num=self.publisher_params.broker_exclusive_config.get('publisher_connection_num', 1),
+            channel_num=self.publisher_params.broker_exclusive_config.get('publisher_channel_num', 8),
+            logger=self.logger, on_channel_created=self._declare_queue)
+
+    @staticmethod
+    def _build_amqp_uri():
+        return f'amqp://{BrokerConnConfig.RABBITMQ_USER}:{BrokerConnConfig.RABBITMQ_PASS}@{BrokerConnConfig.RABBITMQ_HOST}:{BrokerConnConfig.RABBITMQ_PORT}/{BrokerConnConfig.RABBITMQ_VIRTUAL_HOST}?heartbeat={60 * 10}&timeout=20000'
+
+    def _declare_queue(self, channel: amqpstorm.Channel):
+        AmqpStormQueue(channel).declare(**self.queue_declare_params)
 
     # noinspection PyAttributeOutsideInit
     # @decorators.synchronized
     def init_broker(self):
         # username=app_config.RABBITMQ_USER, password=app_config.RABBITMQ_PASS, host=app_config.RABBITMQ_HOST, port=app_config.RABBITMQ_PORT, virtual_host=app_config.RABBITMQ_VIRTUAL_HOST, heartbeat=60 * 10
         self.logger.warning(f'使用AmqpStorm包 链接mq')
-        self.connection = amqpstorm.UriConnection(
-            f'amqp://{BrokerConnConfig.RABBITMQ_USER}:{BrokerConnConfig.RABBITMQ_PASS}@{BrokerConnConfig.RABBITMQ_HOST}:{BrokerConnConfig.RABBITMQ_PORT}/{BrokerConnConfig.RABBITMQ_VIRTUAL_HOST}?heartbeat={60 * 10}&timeout=20000'
-        )
+        self.connection = amqpstorm.UriConnection(self._build_amqp_uri())
         self.channel = self.connection.channel()  # type:amqpstorm.Channel
         self.channel_wrapper_by_ampqstormbaic = AmqpStormBasic(self.channel)
         self.queue = AmqpStormQueue(self.channel)
         self.queue.declare(**self.queue_declare_params)
 
     # @decorators.tomorrow_threads(10)
-    @deco_mq_conn_error
     def concrete_realization_of_publish(self, msg: str):
-        self.channel_wrapper_by_ampqstormbaic.publish(exchange='',
-                                                      routing_key=self._queue_name,
-                                                      body=msg,
-                                                      properties={'delivery_mode': 2, 'priority': self._get_from_other_extra_params('priroty', msg)}, )
+        self._channel_pool.run_with_channel(lambda basic, channel: basic.publish(
+            exchange='', routing_key=self._queue_name, body=msg,
+            properties={'delivery_mode': 2, 'priority': self._get_from_other_extra_params('priroty', msg)}, ))
         # nb_print(msg)
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        """整批只获取一次当前线程channel的锁，连续 basic.publish 不逐条等待。已经发送的消息从 msg_list 删掉，出错重试时候不重复发送。"""
+
+        def _publish_batch(basic: AmqpStormBasic, channel):
+            sent_num = 0
+            try:
+                for msg in msg_list:
+                    basic.publish(exchange='', routing_key=self._queue_name, body=msg,
+                                  properties={'delivery_mode': 2, 'priority': self._get_from_other_extra_params('priroty', msg)}, )
+                    sent_num += 1
+            finally:
+                del msg_list[:sent_num]
+
+        self._channel_pool.run_with_channel(_publish_batch)
+
     @deco_mq_conn_error
     def clear(self):
         self.queue.purge(self._queue_name)
@@ -58,6 +83,8 @@ class RabbitmqPublisherUsingAmqpStorm(AbstractPublisher):
 
     # @deco_mq_conn_error
     def close(self):
-        self.channel.close()
-        self.connection.close()
+        self._channel_pool.close()
+        if self.has_init_broker:
+            self.channel.close()
+            self.connection.close()
         self.logger.warning('关闭amqpstorm包 链接mq')
@@ -0,0 +1,28 @@
+import redis5.asyncio
+
+from funboost.publishers.base_aio_publisher import AbstractAioPublisher
+from funboost.utils.redis_manager import get_redis_conn_kwargs
+
+
+class AioRedisPublisher(AbstractAioPublisher):
+    """
+    RedisPublisher RedisPublisherLpush 对应的异步发布者，使用 redis5.asyncio ，aioredis 包已经不再更新了。
+    """
+
+    # noinspection PyAttributeOutsideInit
+    def custom_init(self):
+        self._push_method = getattr(self.publisher, '_push_method', 'rpush')
+        self.aioredis_db_frame = redis5.asyncio.Redis(**get_redis_conn_kwargs(), decode_responses=True)
+
+    async def concrete_realization_of_publish(self, msg):
+        await getattr(self.aioredis_db_frame, self._push_method)(self._queue_name, msg)
+
+    async def close(self):
+        await self.aioredis_db_frame.close()
+
+
+class AioRedisPriorityPublisher(AioRedisPublisher):
+    """RedisPriorityPublisher 对应的异步发布者，按消息的优先级推送到不同的子队列。"""
+
+    async def concrete_realization_of_publish(self, msg):
+        await self.aioredis_db_frame.rpush(self.publisher.build_queue_name_by_msg(msg), msg)
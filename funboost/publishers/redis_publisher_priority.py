@@ -13,12 +13,12 @@ class RedisPriorityPublisher(FlushRedisQueueMixin,AbstractPublisher, RedisMixin,
     """
 
     def custom_init(self):
-        queue_list = [self._queue_name]
+        queue_list = []
         x_max_priority = self.publisher_params.broker_exclusive_config['x-max-priority']
         if x_max_priority:
-            for i in range(1, x_max_priority + 1):
+            for i in range(x_max_priority, 0, -1):  # 按数字从高到低，字符串排序的话 queue:10 会排在 queue:9 后面。
                 queue_list.append(f'{self.queue_name}:{i}')
-        queue_list.sort(reverse=True)
+        queue_list.append(self._queue_name)
         self.queue_list = queue_list
 
     def build_queue_name_by_msg(self, msg):
@@ -40,6 +40,14 @@ class RedisPriorityPublisher(FlushRedisQueueMixin,AbstractPublisher, RedisMixin,
         # self.logger.debug([queue_name, msg])
         self.redis_db_frame.rpush(queue_name, msg)
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        queue_name__msg_list_map = {}
+        for msg in msg_list:
+            queue_name__msg_list_map.setdefault(self.build_queue_name_by_msg(msg), []).append(msg)
+        with self.redis_db_frame.pipeline(transaction=False) as p:
+            for queue_name, msg_list_of_queue in queue_name__msg_list_map.items():
+                p.rpush(queue_name, *msg_list_of_queue)
+            p.execute()
 
     def get_message_count(self):
         count = 0
@@ -14,6 +14,9 @@ class RedisPublisher(FlushRedisQueueMixin, AbstractPublisher, RedisMixin, ):
     def concrete_realization_of_publish(self, msg):
         self.redis_db_frame.rpush(self._queue_name, msg)
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        self.redis_db_frame.rpush(self._queue_name, *msg_list)
+
     def get_message_count(self):
         # nb_print(self.redis_db7,self._queue_name)
         return self.redis_db_frame.llen(self._queue_name)
@@ -29,6 +29,14 @@ class RedisStreamPublisher(AbstractPublisher, RedisMixin):
             self._check_redis_version()
         self.redis_db_frame.xadd(self._queue_name, {"": msg})
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        if not self._has__check_redis_version:
+            self._check_redis_version()
+        with self.redis_db_frame.pipeline(transaction=False) as p:
+            for msg in msg_list:
+                p.xadd(self._queue_name, {"": msg})
+            p.execute()
+
     def clear(self):
         self.redis_db_frame.delete(self._queue_name)
         self.logger.warning(f'清除 {self._queue_name} 队列中的消息成功')
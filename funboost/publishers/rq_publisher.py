@@ -13,6 +13,7 @@ class RqPublisher(AbstractPublisher):
 
     这个是复杂版，批量推送，简单版在 funboost/publishers/redis_publisher_simple.py
     """
+    SUPPORT_NON_JSON_SERIALIZER = False
 
     def concrete_realization_of_publish(self, msg):
         func_kwargs = json.loads(msg)
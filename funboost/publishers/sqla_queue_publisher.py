@@ -20,6 +20,9 @@ class SqlachemyQueuePublisher(AbstractPublisher):
     def concrete_realization_of_publish(self, msg):
         self.queue.push(dict(body=msg, status=sqla_queue.TaskStatus.TO_BE_CONSUMED))
 
+    def concrete_realization_of_publish_batch(self, msg_list):
+        self.queue.bulk_push([dict(body=msg, status=sqla_queue.TaskStatus.TO_BE_CONSUMED) for msg in msg_list])
+
     def clear(self):
         self.queue.clear_queue()
         self.logger.warning(f'清除 sqlalchemy 数据库队列 {self._queue_name} 中的消息成功')
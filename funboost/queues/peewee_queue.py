@@ -56,6 +56,12 @@ class PeeweeQueue(FunboostFileLoggerMixin, LoggerLevelSetterMixin):
         msg = self.FunboostMessage(body=body, status=TaskStatus.TO_BE_CONSUMED, consume_start_timestamp=None)
         msg.save()
 
+    def bulk_push(self, body_list: list):
+        """一条 insert 语句插入多行"""
+        with self.FunboostMessage._meta.database.atomic():
+            self.FunboostMessage.insert_many([{'body': body, 'status': TaskStatus.TO_BE_CONSUMED, 'consume_start_timestamp': None}
+                                              for body in body_list]).execute()
+
     def get(self):
         while True:
             ten_minitues_ago_datetime = datetime.datetime.now() + datetime.timedelta(minutes=-10)
@@ -168,9 +168,8 @@ class SqlaQueue(FunboostFileLoggerMixin, LoggerLevelSetterMixin):
         :return:
         """
         with SessionContext(self.Session()) as ss:
-            self.logger.debug(sqla_task_dict_list)
-            sqla_task_list = [self.SqlaQueueModel(**sqla_task_dict) for sqla_task_dict in sqla_task_dict_list]
-            ss.add_all(sqla_task_list)
+            # 不实例化orm对象，直接 executemany 批量插入，没有传的列使用列的默认值。
+            ss.execute(self.SqlaQueueModel.__table__.insert(), sqla_task_dict_list)
 
     def get(self):
         # print(ss)
@@ -0,0 +1,128 @@
+"""
+amqpstorm 发布者的 channel 池。
+
+以前一个发布者只有一个连接一个channel，并且 deco_mq_conn_error 每次发布都要获取全局锁，
+200个线程同时发布时候全部排队在一个channel上。
+
+现在 N 个channel 分布在 M 个连接上，每个线程第一次发布时候轮流分配一个channel，之后一直使用这个channel，
+线程只和分到同一个channel的其他线程竞争这个channel自己的锁。
+连接和channel都是第一次使用时候才创建，出错后只重建出错的那个channel(连接断了也重建连接)。
+fork 之后子进程不能使用父进程的socket，发现进程号变化后丢弃全部连接(不关闭，关闭会影响父进程)，在子进程中重新创建。
+"""
+import itertools
+import os
+import threading
+import typing
+
+import amqpstorm
+from amqpstorm.basic import Basic as AmqpStormBasic
+
+
+class _ChannelSlot:
+    __slots__ = ('index', 'lock', 'channel', 'basic')
+
+    def __init__(self, index: int):
+        self.index = index
+        self.lock = threading.Lock()
+        self.channel = None  # type: typing.Optional[amqpstorm.Channel]
+        self.basic = None  # type: typing.Optional[AmqpStormBasic]
+
+
+class AmqpStormChannelPool:
+    def __init__(self, uri: str, connection_num: int = 1, channel_num: int = 8, logger=None,
+                 on_channel_created: typing.Callable[[amqpstorm.Channel], typing.Any] = None):
+        """
+        :param connection_num: 连接数量 M
+        :param channel_num: channel数量 N，第i个channel使用第 i % M 个连接。
+        :param on_channel_created: 新建channel后的回调，例如声明队列。
+        """
+        self._uri = uri
+        self.connection_num = max(1, connection_num)
+        self.channel_num = max(1, channel_num)
+        self.logger = logger
+        self._on_channel_created = on_channel_created
+        self._lock_for_connection = threading.Lock()  # 只有创建连接和fork后重置时候用到
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._connections = [None] * self.connection_num  # type: typing.List[typing.Optional[amqpstorm.UriConnection]]
+        self._slots = [_ChannelSlot(i) for i in range(self.channel_num)]
+        self._slot_index_counter = itertools.count()
+        self._thread_local = threading.local()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            with self._lock_for_connection:
+                if self._pid != os.getpid():
+                    if self.logger:
+                        self.logger.warning(f'检测到fork了子进程 {os.getpid()}，子进程中重新创建 rabbitmq 连接')
+                    self._reset()
+
+    def _get_connection(self, connection_index: int) -> amqpstorm.UriConnection:
+        connection = self._connections[connection_index]
+        if connection is not None and connection.is_open:
+            return connection
+        with self._lock_for_connection:
+            connection = self._connections[connection_index]
+            if connection is None or not connection.is_open:
+                if self.logger:
+                    self.logger.warning(f'amqpstorm channel池 创建第 {connection_index} 个连接')
+                connection = amqpstorm.UriConnection(self._uri)
+                self._connections[connection_index] = connection
+            return connection
+
+    def _open_channel(self, slot: _ChannelSlot):
+        channel = self._get_connection(slot.index % self.connection_num).channel()
+        if self._on_channel_created:
+            self._on_channel_created(channel)
+        slot.channel = channel
+        slot.basic = AmqpStormBasic(channel)
+
+    def _get_slot(self) -> _ChannelSlot:
+        self._check_fork()
+        slot = getattr(self._thread_local, 'slot', None)
+        if slot is None:
+            slot = self._slots[next(self._slot_index_counter) % self.channel_num]
+            self._thread_local.slot = slot
+        return slot
+
+    def run_with_channel(self, func: typing.Callable[[AmqpStormBasic, amqpstorm.Channel], typing.Any]):
+        """
+        使用当前线程分到的channel执行 func(basic, channel)，中间件连接错误时候重建这个channel再执行一次。
+        """
+        slot = self._get_slot()
+        with slot.lock:
+            if slot.channel is None or not slot.channel.is_open:
+                self._open_channel(slot)
+            try:
+                return func(slot.basic, slot.channel)
+            except amqpstorm.AMQPError as e:
+                if self.logger:
+                    self.logger.error(f'amqpstorm channel池 第 {slot.index} 个channel出错，重建channel后重试，{type(e)} {e}')
+                self._close_channel_quietly(slot)
+                self._open_channel(slot)
+                return func(slot.basic, slot.channel)
+
+    @staticmethod
+    def _close_channel_quietly(slot: _ChannelSlot):
+        """出错的channel可能还是打开的(例如只是这一次发布超时)，重建前先关闭，否则会一直占用连接的channel号。"""
+        channel = slot.channel
+        slot.channel = None
+        if channel is None:
+            return
+        try:
+            if channel.is_open:
+                channel.close()
+        except Exception:  # 连接已经断了时候关闭也会报错，不影响重建
+            pass
+
+    def close(self):
+        if self._pid != os.getpid():  # 父进程的连接不能在子进程里关闭
+            return
+        for slot in self._slots:
+            if slot.channel is not None and slot.channel.is_open:
+                slot.channel.close()
+        for connection in self._connections:
+            if connection is not None and connection.is_open:
+                connection.close()
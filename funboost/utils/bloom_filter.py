@@ -0,0 +1,67 @@
+"""
+纯python实现的进程内存布隆过滤器，不依赖第三方包。
+
+布隆过滤器判断不存在就一定不存在，判断存在则有 error_rate 的概率误判。
+适合放在redis等远程判重前面，拦截掉绝大部分一定不存在的查询，减少网络交互。
+"""
+
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        """
+        :param capacity: 预估的元素数量，超过这个数量后误判率会上升。
+        :param error_rate: 元素数量在capacity以内时候的误判率。
+        """
+        if capacity <= 0:
+            raise ValueError('capacity 必须大于0')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate 必须在0和1之间')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_num = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_num = max(int(round(self.bit_num / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.bit_num + 7) // 8)
+        self._lock_for_add = threading.Lock()  # bytearray 的 |= 是读改写,多线程同时写同一个字节会丢失bit，造成不能接受的漏判。
+        self.count = 0
+
+    def _get_positions(self, value: str):
+        digest = hashlib.md5(value.encode('utf8')).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        bit_num = self.bit_num
+        return [(h1 + i * h2) % bit_num for i in range(self.hash_num)]
+
+    def add(self, value: str):
+        positions = self._get_positions(value)
+        bits = self._bits
+        with self._lock_for_add:
+            for pos in positions:
+                bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        bits = self._bits
+        for pos in self._get_positions(value):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+
+if __name__ == '__main__':
+    import time
+
+    bf = BloomFilter(1000000, 0.001)
+    t1 = time.time()
+    for i in range(1000000):
+        bf.add(f'{{"x": {i}}}')
+    print('添加耗时', time.time() - t1)
+    t2 = time.time()
+    false_positive_num = sum(1 for i in range(1000000, 2000000) if f'{{"x": {i}}}' in bf)
+    print('查询耗时', time.time() - t2, '误判数量', false_positive_num)
@@ -0,0 +1,53 @@
+"""
+test_frame 下 pytest 测试共用的 fixture 。
+"""
+import threading
+import time
+
+import pytest
+
+
+def _wait_until(predicate, timeout: float = 3) -> bool:
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        if predicate():
+            return True
+        time.sleep(0.001)
+    return False
+
+
+class FailingCallRecorder:
+    """代替写入中间件的函数，记录每次调用传入的一批消息，前 fail_times 次调用抛出异常模拟中间件不可用。"""
+
+    def __init__(self, fail_times: int = 0):
+        self.chunks = []
+        self.call_times = []
+        self.call_count = 0
+        self.fail_times = fail_times
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk: list):
+        with self._lock:
+            self.call_count += 1
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise IOError('模拟中间件写入失败')
+            self.chunks.append(list(chunk))
+            self.call_times.append(time.monotonic())
+        self.event.set()
+
+    @property
+    def msgs(self):
+        return [msg for chunk in self.chunks for msg in chunk]
+
+
+@pytest.fixture
+def wait_until():
+    """返回 wait_until(predicate, timeout=3) ，轮询直到 predicate() 为真，超时返回False。"""
+    return _wait_until
+
+
+@pytest.fixture
+def call_recorder_cls():
+    return FailingCallRecorder
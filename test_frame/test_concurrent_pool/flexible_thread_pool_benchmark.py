@@ -0,0 +1,59 @@
+"""
+FlexibleThreadPool 和 concurrent.futures.ThreadPoolExecutor 的调度开销对比。
+
+空函数测试的是每条任务 submit 到运行完成的框架开销，sleep函数测试的是io型任务的并发能力。
+两种线程池 submit 都会在队列满时阻塞(ThreadPoolExecutor 是无界队列，不会阻塞)，统计的是全部任务运行完成的耗时。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from funboost.concurrent_pool.flexible_thread_pool import FlexibleThreadPool
+
+
+class _FinishCounter:
+    def __init__(self, total: int):
+        self.total = total
+        self._count = 0
+        self._lock = threading.Lock()
+        self.event = threading.Event()
+
+    def incr(self):
+        with self._lock:
+            self._count += 1
+            if self._count == self.total:
+                self.event.set()
+
+
+def f_empty(counter: _FinishCounter, x):
+    counter.incr()
+
+
+def f_sleep(counter: _FinishCounter, x):
+    time.sleep(0.001)
+    counter.incr()
+
+
+async def af_empty(counter: _FinishCounter, x):
+    counter.incr()
+
+
+def bench(pool_name: str, pool, func, total: int):
+    counter = _FinishCounter(total)
+    t_start = time.perf_counter()
+    for i in range(total):
+        pool.submit(func, counter, i)
+    counter.event.wait()
+    cost = time.perf_counter() - t_start
+    print(f'{pool_name:<22} {func.__name__:<10} {total} 个任务 耗时 {cost:.3f} 秒，每秒 {int(total / cost)} 个')
+    return cost
+
+
+if __name__ == '__main__':
+    for func, total in [(f_empty, 200000), (f_sleep, 20000), (af_empty, 50000)]:
+        if asyncio.iscoroutinefunction(func):
+            bench('FlexibleThreadPool', FlexibleThreadPool(100), func, total)  # ThreadPoolExecutor 不能直接运行 async def 函数
+            continue
+        bench('FlexibleThreadPool', FlexibleThreadPool(100), func, total)
+        bench('ThreadPoolExecutor', ThreadPoolExecutor(100), func, total)
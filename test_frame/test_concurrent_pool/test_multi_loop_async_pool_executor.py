@@ -0,0 +1,164 @@
+"""
+MultiLoopAsyncPoolExecutor 的分片测试，轮流放入时候跳过满了的loop，按分片键放入时候固定在同一个loop，分片满了就等待不换loop。
+
+每个分片的池大小是 size/loop_num ，正在运行的协程数量等于池大小，池的队列中还能再排队同样多个，再放入就满了。
+"""
+import asyncio
+import threading
+import time
+
+from funboost.concurrent_pool.multi_loop_async_pool_executor import MultiLoopAsyncPoolExecutor, shard_key_by_task_id
+
+
+async def record_loop(name, records: list):
+    records.append((name, asyncio.get_running_loop()))
+
+
+async def wait_event(event: threading.Event):
+    while not event.is_set():
+        await asyncio.sleep(0.01)
+
+
+def _fill_shard(shard, event: threading.Event):
+    for _ in range(shard._size * 2):  # 池大小个正在运行，池大小个在队列中排队
+        shard.submit(wait_event, event)
+    assert not shard.submit_nowait(record_loop, ('probe', []))
+
+
+def _submit_in_thread(pool, func, *args) -> threading.Thread:
+    """在线程中 submit ，阻塞时候测试断言失败，而不是一直卡住。"""
+    t = threading.Thread(target=pool.submit, args=(func, *args), daemon=True)
+    t.start()
+    return t
+
+
+def _key_func(func, args, kwargs):
+    return args[0]
+
+
+def _find_keys_for_each_shard(pool: MultiLoopAsyncPoolExecutor) -> list:
+    keys = [None] * pool.loop_num
+    i = 0
+    while None in keys:
+        key = f'key{i}'
+        keys[pool.shards.index(pool._get_shard_by_key(record_loop, (key,), {}))] = key
+        i += 1
+    return keys
+
+
+def test_round_robin_spreads_over_loops(wait_until):
+    pool = MultiLoopAsyncPoolExecutor(40, loop_num=4)
+    records = []
+    for i in range(40):
+        pool.submit(record_loop, i, records)
+    assert wait_until(lambda: len(records) == 40)
+    loops = [loop for _, loop in records]
+    assert {loops.count(shard.loop) for shard in pool.shards} == {10}  # 轮流放入，每个loop一样多
+    assert pool.loop is pool.shards[0].loop
+    pool.shutdown()
+
+
+def test_round_robin_skips_full_shard(wait_until):
+    pool = MultiLoopAsyncPoolExecutor(4, loop_num=2)
+    event = threading.Event()
+    _fill_shard(pool.shards[0], event)
+    records = []
+    for i in range(6):  # 轮流放入会轮到满了的分片，跳过它放入另一个分片
+        t = _submit_in_thread(pool, record_loop, i, records)
+        t.join(1)
+        assert not t.is_alive()  # 没有等待满了的分片
+        assert wait_until(lambda: len(records) == i + 1)  # 另一个分片的任务运行完了，下一次放入时候它一定不满
+    assert all(loop is pool.shards[1].loop for _, loop in records)
+    event.set()
+    pool.shutdown()
+
+
+def test_round_robin_blocks_when_all_shards_full(wait_until):
+    pool = MultiLoopAsyncPoolExecutor(4, loop_num=2)
+    event = threading.Event()
+    for shard in pool.shards:
+        _fill_shard(shard, event)
+    records = []
+    t = _submit_in_thread(pool, record_loop, 'last', records)
+    t.join(0.3)
+    assert t.is_alive()  # 全部满了才阻塞
+    event.set()
+    t.join(3)
+    assert not t.is_alive()
+    assert wait_until(lambda: len(records) == 1)
+    pool.shutdown()
+
+
+def test_keyed_same_key_same_loop(wait_until):
+    pool = MultiLoopAsyncPoolExecutor(40, loop_num=4, shard_key_func=_key_func)
+    records = []
+    keys = [f'key{i % 7}' for i in range(35)]
+    for key in keys:
+        pool.submit(record_loop, key, records)
+    assert wait_until(lambda: len(records) == 35)
+    key__loops_map = {}
+    for key, loop in records:
+        key__loops_map.setdefault(key, set()).add(loop)
+    assert all(len(loops) == 1 for loops in key__loops_map.values())  # 同一个键总是在同一个loop中运行
+    for key, loops in key__loops_map.items():
+        assert loops == {pool._get_shard_by_key(record_loop, (key,), {}).loop}
+    pool.shutdown()
+
+
+def test_keyed_waits_for_full_shard_instead_of_spilling(wait_until):
+    pool = MultiLoopAsyncPoolExecutor(4, loop_num=2, shard_key_func=_key_func)
+    key_of_shard0, key_of_shard1 = _find_keys_for_each_shard(pool)
+    event = threading.Event()
+    _fill_shard(pool.shards[0], event)
+    records = []
+    t = _submit_in_thread(pool, record_loop, key_of_shard1, records)  # 别的分片的键不受影响
+    t.join(1)
+    assert not t.is_alive()
+    assert wait_until(lambda: len(records) == 1)
+    t = _submit_in_thread(pool, record_loop, key_of_shard0, records)
+    t.join(0.3)
+    assert t.is_alive()  # 分片满了等待，另一个分片空闲也不放过去
+    event.set()
+    t.join(3)
+    assert not t.is_alive()
+    assert wait_until(lambda: len(records) == 2)
+    assert records[1] == (key_of_shard0, pool.shards[0].loop)
+    pool.shutdown()
+
+
+def test_asubmit_does_not_block_loop_when_target_shard_full(wait_until):
+    pool = MultiLoopAsyncPoolExecutor(4, loop_num=2, shard_key_func=_key_func)
+    key_of_shard0, _ = _find_keys_for_each_shard(pool)
+    event = threading.Event()
+    _fill_shard(pool.shards[0], event)
+    records = []
+    ticks = []
+
+    async def asubmit_from_shard1():
+        ticker = asyncio.ensure_future(_tick(ticks))
+        await pool.asubmit(record_loop, key_of_shard0, records)
+        ticker.cancel()
+
+    future = asyncio.run_coroutine_threadsafe(asubmit_from_shard1(), pool.shards[1].loop)
+    time.sleep(0.3)
+    assert not future.done()
+    assert len(ticks) >= 5  # 等待期间 shard1 的loop仍然在运行别的协程
+    event.set()
+    future.result(3)
+    assert wait_until(lambda: len(records) == 1)
+    assert records[0] == (key_of_shard0, pool.shards[0].loop)
+    pool.shutdown()
+
+
+async def _tick(ticks: list):
+    while True:
+        ticks.append(time.monotonic())
+        await asyncio.sleep(0.02)
+
+
+def test_shard_key_by_task_id():
+    kw = {'body': {'x': 1, 'extra': {'task_id': 'tid1'}}}
+    assert shard_key_by_task_id(None, (kw,), {}) == 'tid1'
+    assert shard_key_by_task_id(None, (), {'kw': kw}) == 'tid1'
+    assert shard_key_by_task_id(None, ({'body': '{"x": 1}'},), {}) is None  # 取不到task_id的轮流放入
+
@@ -0,0 +1,98 @@
+"""
+LocalSpool 本地落盘缓冲的测试，写入转发、转发失败重试、段文件切换、进程重启后继续转发、fork 子进程使用独立目录。
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from funboost.core.local_spool import LocalSpool
+
+
+def test_put_and_forward(call_recorder_cls):
+    recorder = call_recorder_cls()
+    spool = LocalSpool(tempfile.mkdtemp(), 'test_put_queue', recorder)
+    spool.put('msg_str')
+    spool.put(b'msg_bytes')
+    spool.put_many([f'msg{i}' for i in range(100)])
+    assert spool.wait_drained(5)
+    assert recorder.msgs == ['msg_str', b'msg_bytes'] + [f'msg{i}' for i in range(100)]  # str 和 bytes 类型原样转发，顺序不变
+
+
+def test_forward_failure_retry(call_recorder_cls):
+    recorder = call_recorder_cls(fail_times=3)
+    spool = LocalSpool(tempfile.mkdtemp(), 'test_retry_queue', recorder, forward_batch_size=10)
+    spool.put_many([f'msg{i}' for i in range(35)])
+    assert spool.wait_drained(10)
+    assert recorder.call_count >= 3 + 4
+    assert recorder.msgs == [f'msg{i}' for i in range(35)]  # 失败的批次重发，不丢不重不乱序
+
+
+def test_segment_rollover(call_recorder_cls):
+    recorder = call_recorder_cls(fail_times=1)
+    spool_dir = tempfile.mkdtemp()
+    spool = LocalSpool(spool_dir, 'test_rollover_queue', recorder, segment_max_bytes=256, forward_batch_size=7)
+    msgs = [f'{i:050d}' for i in range(100)]
+    spool.put_many(msgs)
+    spool.put('x' * 1000)  # 比段文件还大的消息单独用一个足够大的段文件
+    assert spool.wait_drained(10)
+    assert recorder.msgs == msgs + ['x' * 1000]
+    time.sleep(0.3)
+    assert len(list((Path(spool_dir) / 'test_rollover_queue').glob('*.seg'))) == 1  # 转发完的旧段文件删除了，只剩正在写入的段文件
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 os.fork')
+def test_restart_recovery(call_recorder_cls):
+    """子进程写入消息时候中间件一直不可用，子进程退出后，新的 LocalSpool 占用同一个目录，把上次没有转发的消息补发"""
+    spool_dir = tempfile.mkdtemp()
+    msgs = [f'msg{i}' for i in range(50)]
+    pid = os.fork()
+    if pid == 0:
+        try:
+            spool = LocalSpool(spool_dir, 'test_restart_queue', call_recorder_cls(fail_times=10 ** 9), segment_max_bytes=300)
+            spool.put_many(msgs)
+            spool._write_segment.mm.flush()
+        finally:
+            os._exit(0)  # 模拟进程退出，没有转发成功
+    os.waitpid(pid, 0)
+    recorder = call_recorder_cls()
+    spool = LocalSpool(spool_dir, 'test_restart_queue', recorder, segment_max_bytes=300)
+    assert spool._dir == Path(spool_dir) / 'test_restart_queue'  # 上个进程退出后文件锁释放了，重新占用原目录
+    assert spool.wait_drained(5)
+    assert recorder.msgs == msgs
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 os.fork')
+def test_fork_child_uses_own_dir(call_recorder_cls):
+    """fork 的子进程不能接着写父进程的段文件，要占用新目录并且有自己的转发线程"""
+    spool_dir = tempfile.mkdtemp()
+    recorder = call_recorder_cls()
+    spool = LocalSpool(spool_dir, 'test_fork_queue', recorder)
+    spool.put('parent_msg0')
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            child_recorder = call_recorder_cls()
+            spool._forward_func = child_recorder
+            spool.put_many([f'child_msg{i}' for i in range(20)])
+            drained = spool.wait_drained(5)
+            result = {'drained': drained, 'dir': str(spool._dir), 'msgs': child_recorder.msgs}
+            os.write(write_fd, json.dumps(result).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd, 'rb') as f:
+        result = json.loads(f.read())
+    assert result['drained']
+    assert result['dir'] == str(Path(spool_dir) / 'test_fork_queue.1')
+    assert result['msgs'] == [f'child_msg{i}' for i in range(20)]
+    spool.put('parent_msg1')
+    assert spool.wait_drained(5)
+    assert recorder.msgs == ['parent_msg0', 'parent_msg1']  # 父进程的段文件没有被子进程覆盖
+
@@ -0,0 +1,113 @@
+"""
+ProcessWorkerPool 的测试，结果和异常传回消费者进程、大消息跨多个槽、工作进程被杀死后自动重启、shutdown 后删除共享内存。
+
+工作进程本来是按队列名从 BoostersManager 取消费函数，这里替换成按名字取本模块的函数，需要 fork 方式启动子进程。
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import pytest
+
+from funboost.concurrent_pool import process_worker_pool
+from funboost.concurrent_pool.process_worker_pool import ProcessWorkerPool
+
+
+def add(x, y):
+    return x + y, os.getpid()
+
+
+def echo(data):
+    return data
+
+
+def raise_error(msg):
+    raise ValueError(msg)
+
+
+def sleep_and_return_pid(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='替换的取函数方法要靠 fork 方式的子进程继承')
+
+
+@pytest.fixture(autouse=True)
+def _function_by_name(monkeypatch):
+    monkeypatch.setattr(process_worker_pool, '_build_function_run_in_worker', lambda queue_name: globals()[queue_name])
+
+
+def _shm_exists(name: str) -> bool:
+    try:
+        shared_memory.SharedMemory(name=name).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def test_round_trip():
+    pool = ProcessWorkerPool('add', process_num=2)
+    try:
+        results = [pool.run(x=i, y=1) for i in range(20)]
+        assert [r[0] for r in results] == [i + 1 for i in range(20)]
+        assert os.getpid() not in {r[1] for r in results}  # 函数在工作进程中运行
+    finally:
+        pool.shutdown()
+
+
+def test_big_msg_across_slots():
+    pool = ProcessWorkerPool('echo', process_num=1, slot_num=4, slot_size=1024)
+    try:
+        data = os.urandom(100 * 1024)  # 远大于整个环形缓冲区，要边写边读
+        assert pool.run(data=data) == data
+    finally:
+        pool.shutdown()
+
+
+def test_exception_propagation():
+    pool = ProcessWorkerPool('raise_error', process_num=1)
+    try:
+        with pytest.raises(ValueError, match='bad param'):
+            pool.run(msg='bad param')
+    finally:
+        pool.shutdown()
+
+
+def test_restart_killed_worker():
+    pool = ProcessWorkerPool('sleep_and_return_pid', process_num=1)
+    try:
+        old_pid = pool.run(seconds=0)
+        errors = []
+
+        def run_long_task():
+            try:
+                pool.run(seconds=30)
+            except RuntimeError as e:
+                errors.append(e)
+
+        t = threading.Thread(target=run_long_task)
+        t.start()
+        time.sleep(0.5)
+        os.kill(old_pid, signal.SIGKILL)
+        t.join(10)
+        assert not t.is_alive() and len(errors) == 1  # 正在运行的任务报错，不会一直等待
+        new_pid = pool.run(seconds=0)
+        assert new_pid != old_pid  # 自动启动了新的工作进程
+    finally:
+        pool.shutdown()
+
+
+def test_shutdown_unlinks_shared_memory():
+    pool = ProcessWorkerPool('add', process_num=2)
+    pool.run(x=1, y=2)
+    shm_names = [ring._shm_name for worker in pool._workers for ring in (worker.request_ring, worker.response_ring)]
+    assert all(_shm_exists(name) for name in shm_names)
+    pool.shutdown()
+    assert not any(worker.is_alive() for worker in pool._workers)
+    assert not any(_shm_exists(name) for name in shm_names)
+    pool.shutdown()  # 重复调用没有问题，atexit 还会再调用一次
+
@@ -0,0 +1,79 @@
+"""
+TokenBucketRateLimiter 和 GcraRateLimiter 的匀速和突发行为测试。
+
+_compute_wait_seconds 传入的是虚拟时间，按返回的等待时间推进虚拟时钟，结果是确定的，不受机器快慢影响。
+最后用真实时间的 acquire 验证一下总耗时。
+"""
+import time
+
+import pytest
+
+from funboost.core.rate_limiter import GcraRateLimiter, TokenBucketRateLimiter
+
+LIMITER_CLASSES = [TokenBucketRateLimiter, GcraRateLimiter]
+
+
+def _simulate_release_times(limiter, qps: float, n: int, start: float):
+    """每次一放行马上请求下一次，返回每次放行的虚拟时刻。虚拟时钟要从构造限流器之后的 time.monotonic() 开始，令牌桶构造时候记录了当时的时间。"""
+    now = start
+    release_times = []
+    for _ in range(n):
+        now += limiter._compute_wait_seconds(qps, now)
+        release_times.append(now)
+    return release_times
+
+
+def test_pacing_is_uniform_without_burst():
+    for limiter_cls in LIMITER_CLASSES:
+        limiter = limiter_cls(burst=1)
+        release_times = _simulate_release_times(limiter, 50, 200, start=time.monotonic())
+        intervals = [b - a for a, b in zip(release_times, release_times[1:])]
+        assert all(abs(x - 0.02) < 1e-9 for x in intervals), (limiter_cls, intervals[:5])  # 每次间隔都是 1/qps，没有每秒开头的突发
+
+
+def test_burst_then_uniform():
+    for limiter_cls in LIMITER_CLASSES:
+        limiter = limiter_cls(burst=10)
+        now = time.monotonic()
+        release_times = _simulate_release_times(limiter, 50, 30, start=now)
+        assert release_times[:10] == pytest.approx([now] * 10, abs=1e-9), (limiter_cls, release_times[:10])  # 前 burst 次不等待
+        intervals = [b - a for a, b in zip(release_times[9:], release_times[10:])]
+        assert all(abs(x - 0.02) < 1e-9 for x in intervals), (limiter_cls, intervals[:5])  # 突发用完之后匀速
+
+
+def test_burst_refills_after_idle():
+    for limiter_cls in LIMITER_CLASSES:
+        limiter = limiter_cls(burst=5)
+        release_times = _simulate_release_times(limiter, 10, 20, start=time.monotonic())
+        idle_start = release_times[-1] + 10  # 空闲10秒，足够攒满 burst
+        release_times = _simulate_release_times(limiter, 10, 8, start=idle_start)
+        assert release_times[:5] == pytest.approx([idle_start] * 5, abs=1e-9), (limiter_cls, release_times)
+        assert abs(release_times[5] - idle_start - 0.1) < 1e-9, (limiter_cls, release_times)
+
+
+def test_acquire_real_time():
+    for limiter_cls in LIMITER_CLASSES:
+        limiter = limiter_cls(burst=1)
+        t_start = time.monotonic()
+        for _ in range(51):
+            limiter.acquire(100)
+        cost = time.monotonic() - t_start
+        assert 0.45 < cost < 0.8, (limiter_cls, cost)  # 51次放行有50个间隔，每个0.01秒
+
+
+def test_burst_wait_is_exactly_zero():
+    for limiter_cls in LIMITER_CLASSES:
+        limiter = limiter_cls(burst=10)
+        now = time.monotonic()
+        waits = [limiter._compute_wait_seconds(50, now) for _ in range(10)]
+        assert waits == [0] * 10, (limiter_cls, waits)  # 浮点误差不会变成极小的正数，acquire 不会去sleep
+
+
+def test_acquire_no_qps_does_not_wait():
+    for limiter_cls in LIMITER_CLASSES:
+        limiter = limiter_cls(burst=1)
+        t_start = time.monotonic()
+        for _ in range(1000):
+            limiter.acquire(0)
+        assert time.monotonic() - t_start < 0.1
+
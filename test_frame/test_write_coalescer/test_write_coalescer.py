@@ -0,0 +1,95 @@
+"""
+WriteCoalescer 按 条数 字节数 最大等待时间 三个条件写入的行为测试，以及写入失败后不丢消息不乱序。
+"""
+import threading
+import time
+
+from funboost.core.write_coalescer import WriteCoalescer
+
+
+def test_flush_on_msg_num(call_recorder_cls):
+    recorder = call_recorder_cls()
+    coalescer = WriteCoalescer(recorder, max_msg_num=100, max_bytes=10 ** 9, max_latency=5)
+    for i in range(99):
+        coalescer.put(f'msg{i}')
+    time.sleep(0.2)
+    assert recorder.chunks == []  # 没到条数也没到5秒，不写入
+    t_start = time.monotonic()
+    coalescer.put('msg99')
+    assert recorder.event.wait(1)
+    assert recorder.call_times[0] - t_start < 0.5  # 达到条数马上写入，不等 max_latency
+    assert recorder.chunks == [[f'msg{i}' for i in range(100)]]
+
+
+def test_flush_on_bytes(call_recorder_cls):
+    recorder = call_recorder_cls()
+    coalescer = WriteCoalescer(recorder, max_msg_num=10 ** 6, max_bytes=1000, max_latency=5)
+    msg = 'x' * 100
+    for _ in range(9):
+        coalescer.put(msg)
+    time.sleep(0.2)
+    assert recorder.chunks == []
+    coalescer.put(msg)
+    assert recorder.event.wait(1)
+    assert recorder.chunks == [[msg] * 10]
+
+
+def test_chunk_split_by_msg_num_and_bytes(call_recorder_cls, wait_until):
+    recorder = call_recorder_cls()
+    coalescer = WriteCoalescer(recorder, max_msg_num=10, max_bytes=350, max_latency=5)
+    with coalescer._lock_for_flush:  # 先让推送线程写不了，攒够消息后一次 flush
+        for i in range(25):
+            coalescer.put(f'{i:0100d}')
+    coalescer.flush()
+    assert wait_until(lambda: len(recorder.msgs) == 25)
+    assert all(len(chunk) <= 4 for chunk in recorder.chunks)  # 每条100字节，350字节一批最多4条
+    assert recorder.msgs == [f'{i:0100d}' for i in range(25)]
+
+
+def test_flush_on_deadline(call_recorder_cls):
+    recorder = call_recorder_cls()
+    coalescer = WriteCoalescer(recorder, max_msg_num=1000, max_bytes=10 ** 9, max_latency=0.1)
+    t_start = time.monotonic()
+    coalescer.put('only_one')
+    assert recorder.event.wait(2)
+    cost = recorder.call_times[0] - t_start
+    assert 0.08 < cost < 0.5, cost  # 不满批量，等到 max_latency 才写入
+    assert recorder.chunks == [['only_one']]
+
+
+def test_idle_flusher_wakes_up_for_new_msgs(call_recorder_cls, wait_until):
+    recorder = call_recorder_cls()
+    coalescer = WriteCoalescer(recorder, max_msg_num=1000, max_bytes=10 ** 9, max_latency=0.01)
+    for round_index in range(3):
+        time.sleep(0.2)  # 推送线程已经空闲等待了
+        coalescer.put(f'round{round_index}')
+        assert wait_until(lambda: len(recorder.msgs) == round_index + 1, timeout=1)
+    assert recorder.msgs == ['round0', 'round1', 'round2']
+
+
+def test_failed_flush_keeps_order_and_retries(call_recorder_cls, wait_until):
+    recorder = call_recorder_cls(fail_times=2)
+    coalescer = WriteCoalescer(recorder, max_msg_num=5, max_bytes=10 ** 9, max_latency=0.01)
+    for i in range(12):
+        coalescer.put(f'msg{i}')
+    assert wait_until(lambda: len(recorder.msgs) == 12)
+    assert recorder.msgs == [f'msg{i}' for i in range(12)]  # 写入失败的批次放回缓冲最前面重新写入
+
+
+def test_many_producer_threads(call_recorder_cls, wait_until):
+    recorder = call_recorder_cls()
+    coalescer = WriteCoalescer(recorder, max_msg_num=500, max_bytes=10 ** 9, max_latency=0.005)
+
+    def produce(thread_index):
+        for i in range(5000):
+            coalescer.put(f'{thread_index}-{i}')
+
+    threads = [threading.Thread(target=produce, args=(thread_index,)) for thread_index in range(8)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert wait_until(lambda: len(recorder.msgs) == 40000)
+    assert all(len(chunk) <= 500 for chunk in recorder.chunks)
+    for thread_index in range(8):  # 同一个线程发布的消息保持先后顺序
+        thread_msgs = [msg for msg in recorder.msgs if msg.startswith(f'{thread_index}-')]
+        assert thread_msgs == [f'{thread_index}-{i}' for i in range(5000)]
+